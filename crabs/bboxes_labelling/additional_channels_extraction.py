@@ -6,9 +6,14 @@ from pathlib import Path
 
 import cv2
 import numpy as np
-from bboxes_labelling.annotations_utils import read_json_file
 from PIL import Image
 
+from crabs.bboxes_labelling.annotations_utils import read_json_file
+from crabs.tracker.utils.io import (
+    get_video_keyframe_indices,
+    read_video_frames,
+)
+
 
 def apply_grayscale_and_blur(
     frame: np.ndarray,
@@ -220,15 +225,30 @@ def compute_stacked_inputs(args: argparse.Namespace) -> None:
         # save the mean
         cv2.imwrite(f"{Path(vid_file).stem}_mean.jpg", mean_blurred_frame)
 
-        # Compute channels for every frame extracted for labelling
-        for frame_idx in list_frame_indices:
-            # read the frame f from the video
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            if not ret:
+        # Read the frames extracted for labelling and the frames delta
+        # after them in a single sequential pass. Each frame f is kept
+        # until frame f+delta is read, and then its channels are computed.
+        frame_indices = set(list_frame_indices)
+        frames_to_read = sorted(
+            frame_indices | {idx + args.delta for idx in frame_indices}
+        )
+        pending_frames = {}
+        for idx, frame_read in read_video_frames(
+            cap, frames_to_read, get_video_keyframe_indices(vid_file)
+        ):
+            if frame_read is None:
                 # Break the loop if no more frames to read
-                print(f"Cannot read frame{frame_idx}. Exiting...")
+                print(f"Cannot read frame{idx}. Exiting...")
                 break
+            if idx in frame_indices:
+                pending_frames[idx] = frame_read
+
+            # compute channels for frame f once frame f+delta is read
+            frame_idx = idx - args.delta
+            if frame_idx not in pending_frames:
+                continue
+            frame = pending_frames.pop(frame_idx)
+            frame_delta = frame_read
 
             # apply transformations to the frame
             gray_frame, blurred_frame = apply_grayscale_and_blur(
@@ -244,14 +264,6 @@ def compute_stacked_inputs(args: argparse.Namespace) -> None:
                 max_abs_blurred_frame,
             )
 
-            # read frame f+delta, the frame delta after before the current one
-            cap.set(cv2.CAP_PROP_POS_FRAMES, (frame_idx + args.delta))
-            success_delta, frame_delta = cap.read()
-            if not success_delta:
-                # Break the loop if no more frames to read
-                print(f"Cannot read frame{frame_idx}+{args.delta}. Exiting...")
-                break
-
             # compute motion channel
             motion_frame = compute_motion_frame(
                 frame_delta,
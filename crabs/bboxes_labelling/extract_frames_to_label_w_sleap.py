@@ -17,12 +17,15 @@ from typing import Optional
 
 import cv2
 import typer
-from sleap import Video
-from sleap.info.feature_suggestions import (
-    FeatureSuggestionPipeline,
-    ParallelFeaturePipeline,
+
+from crabs.tracker.utils.io import (
+    get_video_keyframe_indices,
+    read_video_frames,
 )
 
+# SLEAP is imported by the functions that use it, as it takes several
+# seconds to import
+
 # instantiate Typer app
 app = typer.Typer(rich_markup_mode="rich")
 
@@ -84,6 +87,8 @@ def get_list_of_sleap_videos(  # noqa: C901
         ):
             list_video_paths.append(location_path)
 
+    from sleap import Video
+
     # Transform list of video paths to list of SLEAP videos
     list_sleap_videos = []
     for vid_path in list_video_paths:
@@ -204,6 +209,11 @@ def compute_suggested_sleap_frames(
         The frame indices are sorted in ascending order.
 
     """
+    from sleap.info.feature_suggestions import (
+        FeatureSuggestionPipeline,
+        ParallelFeaturePipeline,
+    )
+
     # Transform list of input videos to list of SLEAP Video instances
     list_sleap_videos = get_list_of_sleap_videos(
         list_video_locations,
@@ -301,16 +311,17 @@ def extract_frames_to_label_from_video(
         else:
             video_output_dir = output_subdir_path
 
-        # Go to the selected frames in the video
-        for frame_idx in map_videos_to_extracted_frames[vid_str]:
-            # Read frame
-            # TODO: are sleap suggested frame numbers indices (i.e. 0-based)
-            # or frame numbers (1-based)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            success, frame = cap.read()
-
+        # Read the selected frames sequentially, seeking only to skip
+        # to a later keyframe
+        # TODO: are sleap suggested frame numbers indices (i.e. 0-based)
+        # or frame numbers (1-based)
+        for frame_idx, frame in read_video_frames(
+            cap,
+            map_videos_to_extracted_frames[vid_str],
+            get_video_keyframe_indices(vid_str),
+        ):
             # If not read successfully: throw error
-            if not success or frame is None:
+            if frame is None:
                 msg = f"Unable to load frame {frame_idx} from {vid_str}."
                 raise KeyError(msg)
 
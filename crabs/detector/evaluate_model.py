@@ -6,11 +6,6 @@ import os
 import sys
 from pathlib import Path
 
-import lightning
-import torch
-
-from crabs.detector.datamodules import CrabsDataModule
-from crabs.detector.models import FasterRCNN
 from crabs.detector.utils.detection import (
     log_dataset_metadata_as_info,
     log_mlflow_metadata_as_info,
@@ -24,9 +19,8 @@ from crabs.detector.utils.evaluate import (
     get_config_from_ckpt,
     get_img_directories_from_ckpt,
     get_mlflow_experiment_name_from_ckpt,
-    get_mlflow_parameters_from_ckpt,
+    get_trained_model_params_from_ckpt,
 )
-from crabs.detector.utils.visualization import save_images_with_boxes
 
 
 class DetectorEvaluate:
@@ -46,12 +40,12 @@ class DetectorEvaluate:
 
         # trained model data
         self.trained_model_path = args.trained_model_path
-        trained_model_params = get_mlflow_parameters_from_ckpt(
+        trained_model_params = get_trained_model_params_from_ckpt(
             self.trained_model_path
         )
         self.trained_model_run_name = trained_model_params["run_name"]
-        self.trained_model_expt_name = trained_model_params[
-            "cli_args/experiment_name"
+        self.trained_model_expt_name = trained_model_params["cli_args"][
+            "experiment_name"
         ]
 
         # config: retrieve from ckpt if not passed as CLI argument
@@ -103,6 +97,8 @@ class DetectorEvaluate:
 
     def setup_trainer(self):
         """Set up trainer object with logging for testing."""
+        import lightning
+
         # Setup logger
         mlf_logger = setup_mlflow_logger(
             experiment_name=self.experiment_name,
@@ -140,6 +136,12 @@ class DetectorEvaluate:
 
     def evaluate_model(self) -> None:
         """Evaluate the trained model on the test dataset."""
+        # torch, torchvision and Lightning are imported when evaluating,
+        # so that parsing the arguments does not need to import them
+        from crabs.detector.datamodules import CrabsDataModule
+        from crabs.detector.models import FasterRCNN
+        from crabs.detector.utils.visualization import save_images_with_boxes
+
         # Create datamodule
         data_module = CrabsDataModule(
             list_img_dirs=self.images_dirs,
@@ -343,9 +345,14 @@ def app_wrapper():
     """Wrap function to run the evaluation."""
     logging.getLogger().setLevel(logging.INFO)
 
+    # parse the arguments before importing torch, so that `--help` and
+    # argument errors are fast
+    eval_args = evaluate_parse_args(sys.argv[1:])
+
+    import torch
+
     torch.set_float32_matmul_precision("medium")
 
-    eval_args = evaluate_parse_args(sys.argv[1:])
     main(eval_args)
 
 
@@ -0,0 +1,159 @@
+"""Script to export a trained detector as an inference bundle."""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from crabs.detector.utils.bundle import (
+    BUNDLE_DTYPES,
+    DEFAULT_POSTPROCESSING,
+    save_detector_bundle,
+)
+from crabs.detector.utils.evaluate import get_trained_model_params_from_ckpt
+
+if TYPE_CHECKING:
+    import torch
+
+# Prefix of the weights of the torchvision model in the state dict of
+# the Lightning module
+LIGHTNING_MODEL_PREFIX = "model."
+
+
+def get_model_state_dict_from_ckpt(
+    trained_model_path: str,
+) -> dict[str, "torch.Tensor"]:
+    """Get the weights of the torchvision model in a Lightning checkpoint.
+
+    Parameters
+    ----------
+    trained_model_path : str
+        Path to the checkpoint of the trained model.
+
+    Returns
+    -------
+    dict[str, torch.Tensor]
+        State dict of the torchvision Faster R-CNN model, without the
+        prefix of the Lightning module.
+
+    """
+    import torch
+
+    checkpoint = torch.load(
+        trained_model_path, map_location="cpu", mmap=True, weights_only=False
+    )
+    return {
+        name.removeprefix(LIGHTNING_MODEL_PREFIX): tensor
+        for name, tensor in checkpoint["state_dict"].items()
+        if name.startswith(LIGHTNING_MODEL_PREFIX)
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    """Export a trained detector as an inference bundle.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        An object containing the parsed command-line arguments.
+
+    Returns
+    -------
+        None
+
+    """
+    bundle_path = Path(
+        args.output_path or f"{Path(args.trained_model_path).stem}_bundle.pt"
+    )
+    bundle_path.parent.mkdir(parents=True, exist_ok=True)
+
+    bundle_hash = save_detector_bundle(
+        get_model_state_dict_from_ckpt(args.trained_model_path),
+        get_trained_model_params_from_ckpt(args.trained_model_path),
+        bundle_path,
+        dtype=args.dtype,
+        postprocessing={
+            key: getattr(args, key) for key in DEFAULT_POSTPROCESSING
+        },
+    )
+    logging.info(
+        f"Detector bundle saved to {bundle_path} "
+        f"({os.path.getsize(bundle_path) / 2**20:.1f} MB, "
+        f"sha256 {bundle_hash})"
+    )
+
+
+def export_parse_args(args):
+    """Parse command-line arguments for exporting a detector."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--trained_model_path",
+        type=str,
+        required=True,
+        help="Location of trained model (a .ckpt file)",
+    )
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default="",
+        help=(
+            "Path to the output bundle file. "
+            "Default: <checkpoint-name>_bundle.pt under the current "
+            "working directory."
+        ),
+    )
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        choices=list(BUNDLE_DTYPES),
+        default="float32",
+        help=(
+            "Data type of the weights in the bundle. Half precision "
+            "(float16 or bfloat16) halves the size of the bundle. The "
+            "weights are converted back to float32 when loaded. "
+            "Default: float32."
+        ),
+    )
+    parser.add_argument(
+        "--box_score_thresh",
+        type=float,
+        default=DEFAULT_POSTPROCESSING["box_score_thresh"],
+        help=(
+            "Minimum score of the detections returned by the detector. "
+            f"Default: {DEFAULT_POSTPROCESSING['box_score_thresh']}."
+        ),
+    )
+    parser.add_argument(
+        "--box_nms_thresh",
+        type=float,
+        default=DEFAULT_POSTPROCESSING["box_nms_thresh"],
+        help=(
+            "IOU threshold of the non-maximum suppression of the "
+            "detections. "
+            f"Default: {DEFAULT_POSTPROCESSING['box_nms_thresh']}."
+        ),
+    )
+    parser.add_argument(
+        "--box_detections_per_img",
+        type=int,
+        default=DEFAULT_POSTPROCESSING["box_detections_per_img"],
+        help=(
+            "Maximum number of detections per image. "
+            f"Default: {DEFAULT_POSTPROCESSING['box_detections_per_img']}."
+        ),
+    )
+    return parser.parse_args(args)
+
+
+def app_wrapper():
+    """Wrap function to export a detector."""
+    logging.getLogger().setLevel(logging.INFO)
+
+    export_args = export_parse_args(sys.argv[1:])
+    main(export_args)
+
+
+if __name__ == "__main__":
+    app_wrapper()
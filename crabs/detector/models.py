@@ -1,11 +1,12 @@
 """LightningModule for Faster R-CNN for object detection."""
 
 import logging
-from typing import Any, Union
+from typing import Any, Optional, Union
 
 import torch
 from lightning import LightningModule
 from torchvision.models.detection import (
+    FasterRCNN_ResNet50_FPN_V2_Weights,
     faster_rcnn,
     fasterrcnn_resnet50_fpn_v2,
 )
@@ -20,6 +21,20 @@ class FasterRCNN(LightningModule):
     ----------
     config : dict
         Configuration settings for the model.
+    optuna_log : bool
+        Whether to log the validation metrics for Optuna. Default: False.
+    cli_args : Optional[dict]
+        CLI arguments of the training job. Default: None.
+    run_name : Optional[str]
+        Name of the MLflow run of the training job. Default: None.
+    load_pretrained_weights : bool
+        Whether to initialise the model with the pretrained weights set
+        under "pretrained_weights" in the config. Set to False if the
+        weights are loaded from a checkpoint afterwards. Default: True.
+
+    The config, CLI arguments and run name are stored as hyperparameters
+    in the checkpoints, so that the trained model can be evaluated and
+    used for tracking without access to its MLflow run.
 
     Methods
     -------
@@ -45,15 +60,26 @@ class FasterRCNN(LightningModule):
 
     """
 
-    def __init__(self, config: dict[str, Any], optuna_log=False):
+    def __init__(
+        self,
+        config: dict[str, Any],
+        optuna_log=False,
+        cli_args: Optional[dict[str, Any]] = None,
+        run_name: Optional[str] = None,
+        load_pretrained_weights: bool = True,
+    ):
         """Initialise the Faster R-CNN model with the given configuration."""
         super().__init__()
         self.config = config
+        self.load_pretrained_weights = load_pretrained_weights
         self.model = self.configure_model()
         self.optuna_log = optuna_log
+        self.cli_args = cli_args
+        self.run_name = run_name
 
-        # save all arguments passed to __init__
-        self.save_hyperparameters()
+        # save all arguments passed to __init__, except those that only
+        # affect how the model is initialised
+        self.save_hyperparameters(ignore=["load_pretrained_weights"])
 
         # metrics to log during training/val/test loop
         self.training_step_outputs = {
@@ -71,13 +97,50 @@ class FasterRCNN(LightningModule):
             "num_batches": 0,
         }
 
+    @classmethod
+    def load_from_checkpoint(cls, *args: Any, **kwargs: Any) -> "FasterRCNN":
+        """Load the model from a checkpoint.
+
+        The pretrained weights are not loaded, as they are overwritten by
+        the weights in the checkpoint.
+        """
+        kwargs.setdefault("load_pretrained_weights", False)
+        return super().load_from_checkpoint(*args, **kwargs)
+
     def configure_model(self) -> torch.nn.Module:
         """Configure Faster R-CNN model.
 
-        Use default weights,
-        specified backbone, and box predictor.
+        Use pretrained weights (unless they will be loaded from a
+        checkpoint), specified backbone, and box predictor.
+
+        The pretrained weights are set under "pretrained_weights" in the
+        config, as the name of a set of torchvision weights for the model
+        (such as "DEFAULT"), or as the path to a local file with their state
+        dict, for nodes without internet access. If not set, the "DEFAULT"
+        torchvision weights are used. If None, the model is randomly
+        initialised.
         """
-        model = fasterrcnn_resnet50_fpn_v2(weights="DEFAULT")
+        pretrained_weights = self.config.get("pretrained_weights", "DEFAULT")
+        if not self.load_pretrained_weights or pretrained_weights is None:
+            model = fasterrcnn_resnet50_fpn_v2(
+                weights=None, weights_backbone=None
+            )
+        elif (
+            pretrained_weights
+            in FasterRCNN_ResNet50_FPN_V2_Weights.__members__
+        ):
+            model = fasterrcnn_resnet50_fpn_v2(weights=pretrained_weights)
+        else:
+            # local state dict of the model with its original box predictor
+            model = fasterrcnn_resnet50_fpn_v2(
+                weights=None, weights_backbone=None
+            )
+            model.load_state_dict(
+                torch.load(
+                    pretrained_weights, map_location="cpu", weights_only=True
+                )
+            )
+
         in_features = model.roi_heads.box_predictor.cls_score.in_features
         model.roi_heads.box_predictor = faster_rcnn.FastRCNNPredictor(
             in_features, self.config["num_classes"]
@@ -5,15 +5,10 @@ import logging
 import os
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import lightning
-import optuna
-import torch
 import yaml  # type: ignore
-from lightning.pytorch.callbacks import ModelCheckpoint
 
-from crabs.detector.datamodules import CrabsDataModule
-from crabs.detector.models import FasterRCNN
 from crabs.detector.utils.detection import (
     log_dataset_metadata_as_info,
     log_mlflow_metadata_as_info,
@@ -23,11 +18,12 @@ from crabs.detector.utils.detection import (
     setup_mlflow_logger,
     slurm_logs_as_artifacts,
 )
-from crabs.detector.utils.hpo import compute_optimal_hyperparameters
-from crabs.detector.utils.train import (
-    get_checkpoint_type,
-    log_data_augm_as_artifacts,
-)
+
+if TYPE_CHECKING:
+    # torch, Lightning and Optuna are imported when training, so that
+    # parsing the arguments does not need to import them
+    import lightning
+    import optuna
 
 DEFAULT_DETECTOR_CONFIG = str(
     Path(__file__).parent / "config" / "faster_rcnn.yaml"
@@ -86,6 +82,9 @@ class DetectorTrain:
 
     def setup_trainer(self):
         """Set up trainer with logging and checkpointing."""
+        import lightning
+        from lightning.pytorch.callbacks import ModelCheckpoint
+
         # Setup logger with checkpointing
         mlf_logger = setup_mlflow_logger(
             experiment_name=self.experiment_name,
@@ -135,7 +134,7 @@ class DetectorTrain:
             limit_train_batches=self.limit_train_batches,
         )
 
-    def optuna_objective_fn(self, trial: optuna.Trial) -> float:
+    def optuna_objective_fn(self, trial: "optuna.Trial") -> float:
         """Objective function for Optuna.
 
         When used with Optuna, it will maximise precision and recall on the
@@ -178,7 +177,7 @@ class DetectorTrain:
         val_recall = trainer.callback_metrics["val_recall_optuna"].item()
         return (val_precision + val_recall) / 2
 
-    def core_training(self) -> lightning.Trainer:
+    def core_training(self) -> "lightning.Trainer":
         """Create data module and model and run training.
 
         Returns
@@ -187,6 +186,13 @@ class DetectorTrain:
             The trainer object used for training.
 
         """
+        from crabs.detector.datamodules import CrabsDataModule
+        from crabs.detector.models import FasterRCNN
+        from crabs.detector.utils.train import (
+            get_checkpoint_type,
+            log_data_augm_as_artifacts,
+        )
+
         # Create data module
         data_module = CrabsDataModule(
             list_img_dirs=self.images_dirs,
@@ -200,7 +206,10 @@ class DetectorTrain:
         # (from a previous checkpoint if required)
         if not self.checkpoint_path:
             lightning_model = FasterRCNN(
-                self.config, optuna_log=self.args.optuna
+                self.config,
+                optuna_log=self.args.optuna,
+                cli_args=vars(self.args),
+                run_name=self.run_name,
             )
             checkpoint_type = None
         else:
@@ -211,8 +220,20 @@ class DetectorTrain:
                     config=self.config,
                     # overwrite hparams from ckpt with config
                     optuna_log=self.args.optuna,
+                    cli_args=vars(self.args),
+                    run_name=self.run_name,
                 )
                 # a 'weights' checkpoint is saved with `save_weights_only=True`
+            else:
+                lightning_model = FasterRCNN(
+                    self.config,
+                    optuna_log=self.args.optuna,
+                    cli_args=vars(self.args),
+                    run_name=self.run_name,
+                    load_pretrained_weights=False,
+                )
+                # the weights of a 'full' checkpoint are restored by the
+                # trainer
 
         # Get trainer
         trainer = self.setup_trainer()
@@ -238,6 +259,10 @@ class DetectorTrain:
         """Train detector."""
         # Run hyperparameter sweep with Optuna if required
         if self.args.optuna:
+            from crabs.detector.utils.hpo import (
+                compute_optimal_hyperparameters,
+            )
+
             # Optimize hyperparameters in config
             # to maximise validation precision and recall
             best_hyperparameters = compute_optimal_hyperparameters(
@@ -392,9 +417,14 @@ def app_wrapper():
     """Wrap function to run the training."""
     logging.getLogger().setLevel(logging.INFO)
 
+    # parse the arguments before importing torch, so that `--help` and
+    # argument errors are fast
+    train_args = train_parse_args(sys.argv[1:])
+
+    import torch
+
     torch.set_float32_matmul_precision("medium")
 
-    train_args = train_parse_args(sys.argv[1:])
     main(train_args)
 
 
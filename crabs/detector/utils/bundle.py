@@ -0,0 +1,256 @@
+"""Inference bundles of trained detectors.
+
+An inference bundle is a single file with the weights of the torchvision
+Faster R-CNN model of a trained detector, optionally in half precision,
+together with the config, CLI arguments and run name of its training job,
+the post-processing thresholds of the detector and a hash of its contents.
+
+Unlike a Lightning checkpoint, it has no optimizer state, and it is loaded
+with :func:`load_detector_bundle`, which only needs torch and torchvision.
+This module should not import Lightning or MLflow, and only imports torch
+and torchvision when a bundle is saved or read.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+if TYPE_CHECKING:
+    import torch
+
+# Identifier and version of the format of the bundle files
+BUNDLE_FORMAT = "crabs-detector-bundle"
+BUNDLE_FORMAT_VERSION = 1
+
+# Names of the torch data types in which the weights can be stored
+BUNDLE_DTYPES = ("float32", "float16", "bfloat16")
+
+# Post-processing thresholds of the detector, with the defaults of
+# torchvision's Faster R-CNN
+DEFAULT_POSTPROCESSING = {
+    "box_score_thresh": 0.05,
+    "box_nms_thresh": 0.5,
+    "box_detections_per_img": 100,
+}
+
+
+def compute_bundle_hash(bundle: dict[str, Any]) -> str:
+    """Compute the SHA-256 hash of the contents of a bundle.
+
+    The hash covers the metadata and the bytes of the weights, but not the
+    "sha256" entry itself, so it does not depend on how the bundle file
+    is serialised.
+
+    Parameters
+    ----------
+    bundle : dict[str, Any]
+        Contents of the bundle.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest of the hash.
+
+    """
+    import torch
+
+    bundle_hash = hashlib.sha256()
+    metadata = {
+        key: value
+        for key, value in bundle.items()
+        if key not in ("state_dict", "sha256")
+    }
+    bundle_hash.update(
+        json.dumps(metadata, sort_keys=True, default=str).encode()
+    )
+    for name in sorted(bundle["state_dict"]):
+        tensor = bundle["state_dict"][name].detach().cpu().contiguous()
+        bundle_hash.update(name.encode())
+        bundle_hash.update(str(tensor.dtype).encode())
+        bundle_hash.update(tensor.reshape(-1).view(torch.uint8).numpy())
+    return bundle_hash.hexdigest()
+
+
+def save_detector_bundle(
+    state_dict: dict[str, "torch.Tensor"],
+    trained_model_params: dict[str, Any],
+    bundle_path: Union[str, Path],
+    dtype: str = "float32",
+    postprocessing: Optional[dict[str, Any]] = None,
+) -> str:
+    """Save the weights and parameters of a detector as a bundle.
+
+    Parameters
+    ----------
+    state_dict : dict[str, torch.Tensor]
+        State dict of the torchvision Faster R-CNN model.
+    trained_model_params : dict[str, Any]
+        Dictionary with the model config under "config", the CLI arguments
+        of the training job under "cli_args" and the name of its run under
+        "run_name".
+    bundle_path : Union[str, Path]
+        Path to the output bundle file.
+    dtype : str
+        Data type of the floating point weights in the bundle, one of
+        "float32", "float16" or "bfloat16". Default: "float32".
+    postprocessing : Optional[dict[str, Any]]
+        Post-processing thresholds of the detector, overriding those in
+        `DEFAULT_POSTPROCESSING`. Default: None.
+
+    Returns
+    -------
+    str
+        Hash of the contents of the bundle.
+
+    """
+    import torch
+
+    if dtype not in BUNDLE_DTYPES:
+        raise ValueError(
+            f"Invalid dtype {dtype}. "
+            f"Valid values are: {', '.join(BUNDLE_DTYPES)}."
+        )
+    bundle = {
+        "format": BUNDLE_FORMAT,
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "dtype": dtype,
+        "postprocessing": {**DEFAULT_POSTPROCESSING, **(postprocessing or {})},
+        "config": trained_model_params["config"],
+        "cli_args": trained_model_params["cli_args"],
+        "run_name": trained_model_params["run_name"],
+        # integer buffers (such as batch norm counters) are kept as is
+        "state_dict": {
+            name: (
+                tensor.to(getattr(torch, dtype))
+                if tensor.is_floating_point()
+                else tensor
+            )
+            for name, tensor in state_dict.items()
+        },
+    }
+    bundle["sha256"] = compute_bundle_hash(bundle)
+    torch.save(bundle, bundle_path)
+    return bundle["sha256"]
+
+
+def read_detector_bundle(bundle_path: Union[str, Path]) -> dict[str, Any]:
+    """Read the contents of a bundle file.
+
+    The file is memory-mapped, so the weights are only read from disk when
+    they are used.
+
+    Parameters
+    ----------
+    bundle_path : Union[str, Path]
+        Path to the bundle file.
+
+    Returns
+    -------
+    dict[str, Any]
+        Contents of the bundle.
+
+    """
+    import torch
+
+    bundle = torch.load(
+        bundle_path, map_location="cpu", mmap=True, weights_only=True
+    )
+    if not isinstance(bundle, dict) or bundle.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"{bundle_path} is not a detector bundle.")
+    if bundle["format_version"] > BUNDLE_FORMAT_VERSION:
+        raise ValueError(
+            f"The detector bundle {bundle_path} has format version "
+            f"{bundle['format_version']}, but only versions up to "
+            f"{BUNDLE_FORMAT_VERSION} are supported. Please update crabs."
+        )
+    return bundle
+
+
+def is_detector_bundle(file_path: Union[str, Path]) -> bool:
+    """Check whether a file is a detector bundle.
+
+    Parameters
+    ----------
+    file_path : Union[str, Path]
+        Path to a bundle or to a Lightning checkpoint.
+
+    Returns
+    -------
+    bool
+        True if the file exists and is a detector bundle.
+
+    Notes
+    -----
+    Only the "format" entry of the file is checked, so that bundles of a
+    newer format version or with corrupted weights are still recognised,
+    and fail to load with an explicit error in :func:`load_detector_bundle`.
+
+    """
+    import torch
+
+    if not Path(file_path).is_file():
+        return False
+    try:
+        contents = torch.load(
+            file_path, map_location="cpu", mmap=True, weights_only=True
+        )
+    except Exception:
+        # Lightning checkpoints may fail to load with `weights_only=True`
+        return False
+    return (
+        isinstance(contents, dict) and contents.get("format") == BUNDLE_FORMAT
+    )
+
+
+def load_detector_bundle(
+    bundle_path: Union[str, Path],
+    device: Union[str, "torch.device"] = "cpu",
+    verify_hash: bool = True,
+) -> tuple["torch.nn.Module", dict[str, Any]]:
+    """Load the detector in a bundle, ready for inference.
+
+    Half precision weights are converted to float32, so the detector takes
+    the same inputs as one loaded from a Lightning checkpoint.
+
+    Parameters
+    ----------
+    bundle_path : Union[str, Path]
+        Path to the bundle file.
+    device : Union[str, torch.device]
+        Device to load the detector on. Default: "cpu".
+    verify_hash : bool
+        Whether to check the contents of the bundle match its hash.
+        Default: True.
+
+    Returns
+    -------
+    tuple[torch.nn.Module, dict[str, Any]]
+        The torchvision Faster R-CNN model in evaluation mode, and the
+        metadata of the bundle (all its contents except the weights).
+
+    """
+    from torchvision.models.detection import fasterrcnn_resnet50_fpn_v2
+
+    bundle = read_detector_bundle(bundle_path)
+    if verify_hash and compute_bundle_hash(bundle) != bundle["sha256"]:
+        raise ValueError(
+            f"The contents of the detector bundle {bundle_path} do not "
+            "match its hash. The file may be corrupted."
+        )
+
+    # build the architecture without downloading any pretrained weights
+    model = fasterrcnn_resnet50_fpn_v2(
+        weights=None,
+        weights_backbone=None,
+        num_classes=bundle["config"]["num_classes"],
+        **bundle["postprocessing"],
+    )
+    model.load_state_dict(bundle["state_dict"])
+    model.eval()
+    model.to(device)
+
+    metadata = {
+        key: value for key, value in bundle.items() if key != "state_dict"
+    }
+    return model, metadata
@@ -5,10 +5,12 @@ import datetime
 import logging
 import os
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
-import torch
-from lightning.pytorch.loggers import MLFlowLogger
+if TYPE_CHECKING:
+    # imported when used, as they are slow to import
+    import torch
+    from lightning.pytorch.loggers import MLFlowLogger
 
 DEFAULT_ANNOTATIONS_FILENAME = "VIA_JSON_combined_coco_gen.json"
 
@@ -85,9 +87,9 @@ def prep_annotation_files(
 
 
 def log_metadata_to_logger(
-    mlf_logger: MLFlowLogger,
+    mlf_logger: "MLFlowLogger",
     cli_args: argparse.Namespace,
-) -> MLFlowLogger:
+) -> "MLFlowLogger":
     """Log metadata to MLflow logger.
 
     Adds CLI arguments to logger and, if available, SLURM job information.
@@ -160,7 +162,7 @@ def setup_mlflow_logger(
     mlflow_folder: str,
     cli_args: argparse.Namespace,
     ckpt_config: dict[str, Any] = {},  # noqa: B006
-) -> MLFlowLogger:
+) -> "MLFlowLogger":
     """Set up MLflow logger and log job metadata.
 
     Setup MLflow logger for a given experiment and run name. If a
@@ -188,6 +190,8 @@ def setup_mlflow_logger(
         A logger to record data for MLflow
 
     """
+    from lightning.pytorch.loggers import MLFlowLogger
+
     # Setup MLflow logger for a given experiment and run name
     # (with checkpointing if required)
     mlf_logger = MLFlowLogger(
@@ -216,7 +220,7 @@ def setup_mlflow_logger(
     return mlf_logger
 
 
-def slurm_logs_as_artifacts(logger: MLFlowLogger, slurm_job_id: str):
+def slurm_logs_as_artifacts(logger: "MLFlowLogger", slurm_job_id: str):
     """Add slurm logs as an MLflow artifacts of the current run.
 
     The filenaming convention from the training scripts at
@@ -246,7 +250,7 @@ def slurm_logs_as_artifacts(logger: MLFlowLogger, slurm_job_id: str):
 
 
 def bbox_tensors_to_COCO_dict(
-    bbox_tensors: torch.Tensor, list_img_filenames: Optional[list] = None
+    bbox_tensors: "torch.Tensor", list_img_filenames: Optional[list] = None
 ) -> dict:
     """Convert list of bounding boxes as tensors to COCO-crab format.
 
@@ -2,11 +2,12 @@
 
 import argparse
 import ast
+import copy
+import functools
 import sys
 from pathlib import Path
 from typing import Optional
 
-import torchvision
 import yaml  # type: ignore
 
 from crabs.detector.utils.detection import (
@@ -14,6 +15,9 @@ from crabs.detector.utils.detection import (
     prep_img_directories,
 )
 
+# Parameters of the training job stored in the checkpoint hyperparameters
+TRAINED_MODEL_PARAMS = ("config", "cli_args", "run_name")
+
 
 def compute_precision_recall(class_stats: dict) -> tuple[float, float, dict]:
     """Compute precision and recall.
@@ -62,60 +66,82 @@ def compute_confusion_matrix_elements(
         precision and recall
 
     """
-    class_stats = {"crab": {"tp": 0, "fp": 0, "fn": 0}}
+    import torch
+    import torchvision
+
+    # counts are accumulated as tensors on the device of the detections,
+    # and copied to the host once all images are processed
+    counts = []
     for target, detection in zip(targets, detections):
         gt_boxes = target["boxes"]
         pred_boxes = detection["boxes"]
         pred_labels = detection["labels"]
 
-        ious = torchvision.ops.box_iou(pred_boxes, gt_boxes)
+        if len(gt_boxes) == 0:
+            # all detections are false positives
+            zero = torch.zeros((), dtype=torch.int64, device=pred_boxes.device)
+            counts.append(torch.stack([zero, zero + len(pred_boxes), zero]))
+            continue
 
+        ious = torchvision.ops.box_iou(pred_boxes, gt_boxes)
         max_ious, max_indices = ious.max(dim=1)
 
-        # Identify true positives, false positives, and false negatives
-        for idx, iou in enumerate(max_ious):
-            if iou.item() > ious_threshold:
-                pred_class_idx = pred_labels[idx].item()
-                true_label = target["labels"][max_indices[idx]].item()
-
-                if pred_class_idx == true_label:
-                    class_stats["crab"]["tp"] += 1
-                else:
-                    class_stats["crab"]["fp"] += 1
-            else:
-                class_stats["crab"]["fp"] += 1
-
-        for target_box_index, _target_box in enumerate(gt_boxes):
-            found_match = False
-            for idx, iou in enumerate(max_ious):
-                if (
-                    iou.item() > ious_threshold
-                    # we need this condition because the max overlap
-                    # is not necessarily above the threshold
-                    and max_indices[idx] == target_box_index
-                    # the matching index is the index of the GT
-                    # box with which it has max overlap
-                ):
-                    # There's an IoU match and the matched index corresponds
-                    # to the current target_box_index
-                    found_match = True
-                    break  # Exit loop, a match was found
-
-            if not found_match:
-                # print(found_match)
-                class_stats["crab"]["fn"] += (
-                    1  # Ground truth box has no corresponding detection
-                )
+        # a detection is a true positive if its max overlap is above the
+        # threshold, and its label matches that of the GT box with which
+        # it has max overlap. Otherwise it is a false positive
+        above_threshold = max_ious > ious_threshold
+        true_positives = (
+            above_threshold
+            & (pred_labels == target["labels"].to(pred_labels)[max_indices])
+        ).sum()
+        false_positives = len(pred_boxes) - true_positives
+
+        # a ground truth box is a false negative if it is not the box of
+        # max overlap of any detection above the threshold
+        matched_gt = torch.zeros(
+            len(gt_boxes), dtype=torch.bool, device=max_indices.device
+        )
+        matched_gt[max_indices[above_threshold]] = True
+        false_negatives = len(gt_boxes) - matched_gt.sum()
+
+        counts.append(
+            torch.stack([true_positives, false_positives, false_negatives])
+        )
+
+    tp, fp, fn = (
+        torch.stack(counts).sum(dim=0).tolist() if counts else [0, 0, 0]
+    )
+    class_stats = {"crab": {"tp": tp, "fp": fp, "fn": fn}}
 
     precision, recall, class_stats = compute_precision_recall(class_stats)
 
     return precision, recall, class_stats
 
 
-def get_mlflow_parameters_from_ckpt(trained_model_path: str) -> dict:
-    """Get MLflow client from ckpt path and associated params."""
+@functools.lru_cache
+def _get_mlflow_run_parameters(mlruns_path: str, run_id: str) -> dict:
+    """Get the parameters and name of an MLflow run.
+
+    The result is memoised, so that the MLflow run is only fetched once per
+    process. Callers should copy it before modifying it.
+    """
     from mlflow.tracking import MlflowClient
 
+    # create an Mlflow client to interface with mlflow runs
+    mlrun_client = MlflowClient(
+        tracking_uri=mlruns_path,
+    )
+
+    # get parameters of the run
+    run = mlrun_client.get_run(run_id)
+    params = run.data.params
+    params["run_name"] = run.info.run_name
+
+    return params
+
+
+def get_mlflow_parameters_from_ckpt(trained_model_path: str) -> dict:
+    """Get MLflow client from ckpt path and associated params."""
     # roughly assert the format of the path is correct
     # Note: to check if this is an MLflow chekcpoint,
     # we simply check if the parent directory is called
@@ -133,17 +159,124 @@ def get_mlflow_parameters_from_ckpt(trained_model_path: str) -> dict:
     # ckpt_experimentID = Path(trained_model_path).parents[2].stem
     ckpt_runID = Path(trained_model_path).parents[1].stem
 
-    # create an Mlflow client to interface with mlflow runs
-    mlrun_client = MlflowClient(
-        tracking_uri=ckpt_mlruns_path,
+    return dict(_get_mlflow_run_parameters(ckpt_mlruns_path, ckpt_runID))
+
+
+def parse_mlflow_parameters(params: dict) -> dict:
+    """Parse the MLflow parameters of a training run.
+
+    Parameters
+    ----------
+    params : dict
+        MLflow parameters of the training run, as returned by
+        :func:`get_mlflow_parameters_from_ckpt`. Their values are strings,
+        and the keys of nested parameters are separated by forward slashes.
+
+    Returns
+    -------
+    dict
+        Dictionary with the model config under "config", the CLI arguments
+        under "cli_args" and the name of the run under "run_name".
+
+    """
+    # create a 1-level dict
+    config_dict = {}
+    for p in params:
+        if p.startswith("config"):
+            config_dict[p.replace("config/", "")] = ast.literal_eval(params[p])
+
+    # format as a 2-levels nested dict
+    # forward slashes in a key indicate a nested dict
+    for key in list(config_dict):  # list makes a copy of original keys
+        if "/" in key:
+            key_parts = key.split("/")
+            assert len(key_parts) == 2
+            if key_parts[0] not in config_dict:
+                config_dict[key_parts[0]] = {
+                    key_parts[1]: config_dict.pop(key)
+                }
+            else:
+                config_dict[key_parts[0]].update(
+                    {key_parts[1]: config_dict.pop(key)}
+                )
+
+    # check there are no more levels
+    assert all(["/" not in key for key in config_dict])
+
+    # CLI arguments that are not Python literals (such as the experiment
+    # name or paths) are kept as strings
+    cli_args = {}
+    for p in params:
+        if p.startswith("cli_args/"):
+            try:
+                cli_args[p.replace("cli_args/", "")] = ast.literal_eval(
+                    params[p]
+                )
+            except (ValueError, SyntaxError):
+                cli_args[p.replace("cli_args/", "")] = params[p]
+
+    return {
+        "config": config_dict,
+        "cli_args": cli_args,
+        "run_name": params.get("run_name"),
+    }
+
+
+@functools.lru_cache
+def _get_ckpt_hyperparameters(trained_model_path: str) -> dict:
+    """Get the hyperparameters stored in a Lightning checkpoint or bundle.
+
+    The checkpoint is memory-mapped, so that the weights are not read.
+    The result is memoised, so callers should copy it before modifying it.
+    """
+    import torch
+
+    from crabs.detector.utils.bundle import BUNDLE_FORMAT
+
+    checkpoint = torch.load(
+        trained_model_path, map_location="cpu", mmap=True, weights_only=False
     )
+    # detector bundles store the parameters at the top level
+    if checkpoint.get("format") == BUNDLE_FORMAT:
+        return {key: checkpoint[key] for key in TRAINED_MODEL_PARAMS}
+    return checkpoint.get("hyper_parameters", {})
 
-    # get parameters of the run
-    run = mlrun_client.get_run(ckpt_runID)
-    params = run.data.params
-    params["run_name"] = run.info.run_name
 
-    return params
+def get_trained_model_params_from_ckpt(trained_model_path: str) -> dict:
+    """Get the config, CLI arguments and run name of a trained model.
+
+    They are read from the hyperparameters stored in the checkpoint by
+    :class:`crabs.detector.models.FasterRCNN`. Checkpoints saved before the
+    CLI arguments and run name were stored in them get the missing values
+    from the parameters of the MLflow run, which requires the checkpoint
+    to be in its MLflow folder. Both lookups are memoised per checkpoint.
+
+    Parameters
+    ----------
+    trained_model_path : str
+        Path to the checkpoint of the trained model.
+
+    Returns
+    -------
+    dict
+        Dictionary with the model config under "config", the CLI arguments
+        of the training job under "cli_args" and the name of its MLflow run
+        under "run_name".
+
+    """
+    hparams = _get_ckpt_hyperparameters(str(trained_model_path))
+    params = {key: hparams.get(key) for key in TRAINED_MODEL_PARAMS}
+
+    # fill in the parameters missing from older checkpoints
+    if any(value is None for value in params.values()):
+        mlflow_params = parse_mlflow_parameters(
+            get_mlflow_parameters_from_ckpt(trained_model_path)
+        )
+        params = {
+            key: mlflow_params[key] if value is None else value
+            for key, value in params.items()
+        }
+    return copy.deepcopy(params)
 
 
 def get_config_from_ckpt(
@@ -157,35 +290,9 @@ def get_config_from_ckpt(
 
     # If not: used config from ckpt
     else:
-        params = get_mlflow_parameters_from_ckpt(
-            trained_model_path
-        )  # string-dict
-
-        # create a 1-level dict
-        config_dict = {}
-        for p in params:
-            if p.startswith("config"):
-                config_dict[p.replace("config/", "")] = ast.literal_eval(
-                    params[p]
-                )
-
-        # format as a 2-levels nested dict
-        # forward slashes in a key indicate a nested dict
-        for key in list(config_dict):  # list makes a copy of original keys
-            if "/" in key:
-                key_parts = key.split("/")
-                assert len(key_parts) == 2
-                if key_parts[0] not in config_dict:
-                    config_dict[key_parts[0]] = {
-                        key_parts[1]: config_dict.pop(key)
-                    }
-                else:
-                    config_dict[key_parts[0]].update(
-                        {key_parts[1]: config_dict.pop(key)}
-                    )
-
-        # check there are no more levels
-        assert all(["/" not in key for key in config_dict])
+        config_dict = get_trained_model_params_from_ckpt(trained_model_path)[
+            "config"
+        ]
 
     return config_dict
 
@@ -197,8 +304,8 @@ def get_cli_arg_from_ckpt(
     if getattr(args, cli_arg_str):
         cli_arg = getattr(args, cli_arg_str)
     else:
-        params = get_mlflow_parameters_from_ckpt(trained_model_path)
-        cli_arg = ast.literal_eval(params[f"cli_args/{cli_arg_str}"])
+        params = get_trained_model_params_from_ckpt(trained_model_path)
+        cli_arg = params["cli_args"][cli_arg_str]
 
     return cli_arg
 
@@ -255,8 +362,8 @@ def get_mlflow_experiment_name_from_ckpt(
     if args.experiment_name:
         experiment_name = args.experiment_name
     else:
-        params = get_mlflow_parameters_from_ckpt(trained_model_path)
-        trained_model_expt_name = params["cli_args/experiment_name"]
-        experiment_name = trained_model_expt_name + "_evaluation"
+        params = get_trained_model_params_from_ckpt(trained_model_path)
+        trained_model_expt_name = params["cli_args"]["experiment_name"]
+        experiment_name = f"{trained_model_expt_name}_evaluation"
 
     return experiment_name
@@ -8,6 +8,11 @@ import ffmpeg  # type: ignore
 import typer
 from timecode import Timecode
 
+from crabs.tracker.utils.io import (
+    get_video_keyframe_indices,
+    read_video_frames,
+)
+
 
 def compute_timecode_params_per_video(list_paths: list[Path]) -> dict:
     """Compute timecode parameters per video.
@@ -295,25 +300,23 @@ def extract_chessboard_frames_from_video(
             "The total number of frames from ffmpeg and opencv don't match"
         )
 
-    # set capture index to desired starting point
-    # ATT! Opencv is 0-based indexed (aka first frame is index 0)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, video_dict["opencv_start_idx"])
-
     # create output dir for this video
     output_dir_one_camera = Path(output_parent_dir) / Path(video_path_str).stem
     output_dir_one_camera.mkdir(parents=True, exist_ok=True)
 
     # extract frames between start index and end index
     # if a chessboard pattern is detected
+    # ATT! Opencv is 0-based indexed (aka first frame is index 0)
     pair_count = 0  # for consistency, pair_count is also 0-based
-    for frame_idx0 in range(
-        video_dict["opencv_start_idx"], video_dict["opencv_end_idx"] + 1
+    for frame_idx0, frame in read_video_frames(
+        cap,
+        range(
+            video_dict["opencv_start_idx"], video_dict["opencv_end_idx"] + 1
+        ),
+        get_video_keyframe_indices(video_path_str),
     ):
-        # read frame
-        success, frame = cap.read()
-
         # if frame is read successfully
-        if success:
+        if frame is not None:
             # ---------------
             # Find the chessboard corners
             # If desired number of corners are found in the image then
@@ -1,16 +1,81 @@
-"""Evaluate tracker using the Multi-Object Tracking Accuracy (MOTA) metric."""
+"""Evaluate tracker using MOTA, identity and HOTA tracking metrics."""
 
-import csv
+import argparse
 import logging
+import os
+import sys
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional, Union
 
 import numpy as np
 
-from crabs.tracker.utils.tracking import (
-    extract_bounding_box_info,
-    save_tracking_mota_metrics,
+from crabs.tracker.utils.box_index import sparse_iou
+from crabs.tracker.utils.io import (
+    get_file_paths,
+    get_via_tracks_frame_slices,
+    read_tracks_npz,
+    read_via_tracks_csv,
 )
+from crabs.tracker.utils.sort import sparse_linear_assignment
+from crabs.tracker.utils.tracking import save_tracking_mota_metrics
+from crabs.tracker.utils.tracking_metrics import TrackingMetrics
+
+if TYPE_CHECKING:
+    # imported when used, as it is slow to import
+    import pandas as pd
+
+# Methods to match tracked boxes to ground truth boxes in each frame
+MATCHING_METHODS = ("optimal", "greedy")
+
+# Endings of the names of the tracks files written by
+# `detect-and-track-video`, after the name of the video
+TRACKS_FILE_ENDINGS = ("_tracks.csv", "_tracks.npz")
+
+# Totals across frames reported with the mean MOTA
+MOTA_TOTALS = (
+    "Total Ground Truth",
+    "True Positives",
+    "Missed Detections",
+    "False Positives",
+    "Number of Switches",
+)
+
+
+def compute_iou_matrix(
+    gt_boxes: np.ndarray, pred_boxes: np.ndarray
+) -> np.ndarray:
+    """Compute the IoU between all ground truth and predicted boxes.
+
+    The IoU is computed as in :meth:`TrackerEvaluate.calculate_iou`, taking
+    the coordinates as inclusive pixel indices, but only for the pairs of
+    boxes that overlap.
+
+    Parameters
+    ----------
+    gt_boxes : np.ndarray
+        Ground truth bounding boxes with shape (N, 4), in the format
+        [x1, y1, x2, y2].
+    pred_boxes : np.ndarray
+        Predicted bounding boxes with shape (M, 4), in the format
+        [x1, y1, x2, y2].
+
+    Returns
+    -------
+    np.ndarray
+        IoU matrix with shape (N, M).
+
+    """
+    iou_matrix = np.zeros((len(gt_boxes), len(pred_boxes)))
+    rows, cols, ious = sparse_iou(
+        np.asarray(gt_boxes, dtype=float),
+        np.asarray(pred_boxes, dtype=float),
+        pixel_inclusive=True,
+    )
+    iou_matrix[rows, cols] = ious
+    return iou_matrix
 
 
 class TrackerEvaluate:
@@ -19,9 +84,11 @@ class TrackerEvaluate:
     def __init__(
         self,
         gt_dir: str,  # annotations_file
-        predicted_boxes_dict: dict,
+        predicted_boxes_dict: Union[dict, str, Path],
         iou_threshold: float,
         tracking_output_dir: Path,
+        matching: str = "optimal",
+        use_cache: bool = False,
     ):
         """Initialize the TrackerEvaluate class.
 
@@ -32,23 +99,43 @@ class TrackerEvaluate:
         ----------
         gt_dir : str
             Directory path of the ground truth CSV file.
-        predicted_boxes_dict : dict
+        predicted_boxes_dict : dict | str | Path
             Dictionary mapping frame indices to bounding boxes arrays
             (under "tracked_boxes"), ids (under "ids") and detection scores
             (under "scores"). The bounding boxes array have shape (n, 4) where
             n is the number of boxes in the frame and the 4 columns are (xmin,
-            ymin, xmax, ymax).
+            ymin, xmax, ymax). Alternatively, the path to a csv file with the
+            tracked bounding boxes in VIA-tracks format, or to an npz file,
+            as written by `detect-and-track-video`.
         iou_threshold : float
             Intersection over Union (IoU) threshold for evaluating
             tracking performance.
         tracking_output_dir : Path
             Path to the directory where the tracking output will be saved.
+        matching : str
+            Method to match tracked boxes to ground truth boxes in each
+            frame. "optimal" maximises the total IoU of the matched pairs;
+            "greedy" matches each tracked box in turn to the unmatched
+            ground truth box with the highest IoU, as in earlier versions,
+            to reproduce historical results. Default: "optimal".
+        use_cache : bool
+            If True, the csv files of ground truth annotations and tracked
+            bounding boxes are parsed once and cached next to them, so that
+            later evaluations skip parsing (see
+            :func:`read_via_tracks_csv`). Default: False.
 
         """
+        if matching not in MATCHING_METHODS:
+            raise ValueError(
+                f"Matching method should be one of {MATCHING_METHODS}, "
+                f"but got '{matching}'."
+            )
         self.gt_dir = gt_dir
         self.predicted_boxes_dict = predicted_boxes_dict
         self.iou_threshold = iou_threshold
         self.tracking_output_dir = tracking_output_dir
+        self.matching = matching
+        self.use_cache = use_cache
         self.last_known_predicted_ids: dict = {}
 
     def get_ground_truth_data(self) -> dict[int, dict[str, Any]]:
@@ -65,50 +152,93 @@ class TrackerEvaluate:
             - 'id': The ground truth ID
 
         """
-        # TODO: refactor with pandas
-
-        with open(self.gt_dir) as csvfile:
-            csvreader = csv.reader(csvfile)
-            next(csvreader)  # Skip the header row
-            ground_truth_data = [
-                extract_bounding_box_info(row) for row in csvreader
-            ]
+        via_tracks = read_via_tracks_csv(self.gt_dir, use_cache=self.use_cache)
+        bboxes = np.stack(
+            [
+                via_tracks["x"],
+                via_tracks["y"],
+                via_tracks["x"] + via_tracks["w"],
+                via_tracks["y"] + via_tracks["h"],
+            ],
+            axis=1,
+        ).astype(np.float32)
+        # IDs are truncated to integers
+        ids = np.trunc(via_tracks["id"]).astype(np.float32)
 
         # Format as a dictionary with key = frame number
-        ground_truth_dict: dict = {}
-
-        # loop thru annotations
-        for data in ground_truth_data:
-            # Get frame, bbox, id
-            frame_number = data["frame_number"]
-            bbox = np.array(
-                [
-                    data["x"],
-                    data["y"],
-                    data["x"] + data["width"],
-                    data["y"] + data["height"],
-                ],
-                dtype=np.float32,
-            )
-            track_id = int(float(data["id"]))
+        return {
+            frame_number: {"bbox": bboxes[rows], "id": ids[rows]}
+            for frame_number, rows in get_via_tracks_frame_slices(
+                via_tracks
+            ).items()
+        }
 
-            # If frame does not exist in dict: initialise
-            if frame_number not in ground_truth_dict:
-                ground_truth_dict[frame_number] = {"bbox": [], "id": []}
+    def get_predicted_data(
+        self, frame_numbers: Iterable[int]
+    ) -> dict[int, dict[str, np.ndarray]]:
+        """Format predicted bounding box data as dict with key frame index.
 
-            # Append bbox and id to the dictionary
-            ground_truth_dict[frame_number]["bbox"].append(bbox)
-            ground_truth_dict[frame_number]["id"].append(track_id)
+        If the predictions were passed as a dictionary, the required frames
+        are selected from it. If they were passed as a path to a file,
+        only the rows of the required frames are kept in memory (see
+        :func:`read_via_tracks_csv`). Frames without rows in the file
+        have no tracked bounding boxes.
 
-        # format as numpy arrays
-        for frame_number in ground_truth_dict:
-            ground_truth_dict[frame_number]["bbox"] = np.array(
-                ground_truth_dict[frame_number]["bbox"], dtype=np.float32
-            )
-            ground_truth_dict[frame_number]["id"] = np.array(
-                ground_truth_dict[frame_number]["id"], dtype=np.float32
+        Parameters
+        ----------
+        frame_numbers : Iterable[int]
+            Frame indices (0-based) for which to return the predictions.
+
+        Returns
+        -------
+        dict[int, dict[str, np.ndarray]]:
+            A dictionary where the key is the frame index and the value is
+            another dictionary containing:
+            - 'tracked_boxes': A numpy array with shape of (N, 4) containing
+                the coordinates of the bounding box [xmin, ymin, xmax, ymax]
+                for every tracked crab in the frame.
+            - 'ids': A numpy array with shape (N,) with the predicted IDs.
+            - 'scores': A numpy array with shape (N,) with the
+                detection scores.
+
+        """
+        frame_numbers = set(frame_numbers)
+
+        # If predictions were passed as dict: select required frames
+        if isinstance(self.predicted_boxes_dict, dict):
+            return {
+                frame_number: self.predicted_boxes_dict[frame_number]
+                for frame_number in frame_numbers
+                if frame_number in self.predicted_boxes_dict
+            }
+
+        # If predictions were passed as a file: read required frames
+        if Path(self.predicted_boxes_dict).suffix == ".npz":
+            via_tracks = read_tracks_npz(self.predicted_boxes_dict)
+        else:
+            via_tracks = read_via_tracks_csv(
+                self.predicted_boxes_dict, use_cache=self.use_cache
             )
-        return ground_truth_dict
+        frame_slices = get_via_tracks_frame_slices(via_tracks)
+        tracked_boxes = np.stack(
+            [
+                via_tracks["x"],
+                via_tracks["y"],
+                via_tracks["x"] + via_tracks["w"],
+                via_tracks["y"] + via_tracks["h"],
+            ],
+            axis=1,
+        )
+        predicted_data: dict = {}
+        for frame_number in frame_numbers:
+            rows = frame_slices.get(frame_number, slice(0, 0))
+            # copy the rows, so that the arrays of all frames can be freed
+            predicted_data[frame_number] = {
+                "tracked_boxes": tracked_boxes[rows].copy(),
+                "ids": via_tracks["id"][rows].copy(),
+                "scores": via_tracks["confidence"][rows].copy(),
+            }
+        return predicted_data
 
     def calculate_iou(self, box1: np.ndarray, box2: np.ndarray) -> float:
         """Calculate IoU (Intersection over Union) of two bounding boxes.
@@ -254,15 +384,145 @@ class TrackerEvaluate:
 
         return switch_counter
 
+    def match_greedy(
+        self,
+        iou_matrix: np.ndarray,
+        gt_ids: np.ndarray,
+        pred_ids: np.ndarray,
+        iou_threshold: float,
+    ) -> tuple[np.ndarray, dict[int, int]]:
+        """Match tracked boxes to ground truth boxes greedily.
+
+        Each tracked box, in order, is matched to the unmatched ground truth
+        box with the highest IoU above the threshold. For each tracked box,
+        the last unmatched ground truth box that is not its best match is
+        mapped to a NaN predicted ID, unless a later tracked box matches it.
+
+        Parameters
+        ----------
+        iou_matrix : np.ndarray
+            IoU between ground truth and predicted boxes, with shape (N, M).
+        gt_ids : np.ndarray
+            Ground truth IDs with shape (N,).
+        pred_ids : np.ndarray
+            Predicted IDs with shape (M,).
+        iou_threshold : float
+            Intersection over Union (IoU) threshold for considering a match.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (K, 2) with the indices of the matched ground
+            truth and predicted boxes.
+        dict[int, int]
+            A dictionary mapping ground truth IDs to predicted IDs for the
+            current frame.
+
+        """
+        available = np.ones(len(gt_ids), dtype=bool)
+        matched = []
+        gt_to_tracked_id_current_frame: dict[int, int] = {}
+        for i, pred_id in enumerate(pred_ids):
+            candidates = np.flatnonzero(available)
+            ious = iou_matrix[candidates, i]
+
+            # a box improves on the best match so far if its IoU is above
+            # the threshold and above the IoU of all previous candidates
+            ious_above = np.where(ious > iou_threshold, ious, 0.0)
+            best_iou_so_far = np.maximum.accumulate(
+                np.concatenate([[0.0], ious_above[:-1]])
+            )
+            improves = ious_above > best_iou_so_far
+
+            # the matched ID is mapped before the unmatched one, as in
+            # earlier versions: the order of the mapping changes the order
+            # in which identity switches are counted
+            if improves.any():
+                # Map ground truth ID to tracked ID
+                index_gt_best_match = candidates[improves][-1]
+                available[index_gt_best_match] = False
+                matched.append((index_gt_best_match, i))
+                gt_to_tracked_id_current_frame[
+                    int(gt_ids[index_gt_best_match])
+                ] = int(pred_id)
+            if (~improves).any():
+                index_gt_not_match = candidates[~improves][-1]
+                gt_to_tracked_id_current_frame[
+                    int(gt_ids[index_gt_not_match])
+                ] = np.nan  # type: ignore
+
+        return (
+            np.array(matched, dtype=int).reshape(-1, 2),
+            gt_to_tracked_id_current_frame,
+        )
+
+    def match_optimal(
+        self,
+        iou_matrix: np.ndarray,
+        gt_ids: np.ndarray,
+        pred_ids: np.ndarray,
+        iou_threshold: float,
+    ) -> tuple[np.ndarray, dict[int, int]]:
+        """Match tracked boxes to ground truth boxes optimally.
+
+        The pairs with an IoU above the threshold are matched so that the
+        number of matches is maximised and, among those matchings, the total
+        IoU of the matches. Unmatched ground truth boxes are left out of
+        the mapping of ground truth IDs to predicted IDs, so that their last
+        known predicted ID is kept when counting identity switches.
+
+        Parameters
+        ----------
+        iou_matrix : np.ndarray
+            IoU between ground truth and predicted boxes, with shape (N, M).
+        gt_ids : np.ndarray
+            Ground truth IDs with shape (N,).
+        pred_ids : np.ndarray
+            Predicted IDs with shape (M,).
+        iou_threshold : float
+            Intersection over Union (IoU) threshold for considering a match.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (K, 2) with the indices of the matched ground
+            truth and predicted boxes.
+        dict[int, int]
+            A dictionary mapping ground truth IDs to predicted IDs for the
+            current frame.
+
+        """
+        rows, cols = np.nonzero(
+            (iou_matrix > iou_threshold) & (iou_matrix > 0)
+        )
+        # adding the maximum number of matches to each IoU makes any extra
+        # match worth more than any difference in total IoU
+        matched = sparse_linear_assignment(
+            rows,
+            cols,
+            -(iou_matrix[rows, cols] + min(iou_matrix.shape)),
+            iou_matrix.shape,
+        )
+
+        gt_to_tracked_id_current_frame = {
+            int(gt_ids[j]): int(pred_ids[i]) for j, i in matched
+        }
+        return matched, gt_to_tracked_id_current_frame
+
     def compute_mota_one_frame(
         self,
         gt_data: dict[str, np.ndarray],
         pred_data: dict[str, np.ndarray],
         iou_threshold: float,
         gt_to_tracked_id_previous_frame: Optional[dict[int, int]],
+        metrics: Optional[TrackingMetrics] = None,
     ) -> tuple[float, int, int, int, int, int, dict[int, int]]:
         """Evaluate MOTA (Multiple Object Tracking Accuracy).
 
+        Tracked boxes are matched to ground truth boxes with the method
+        selected in `matching` (see :meth:`match_optimal` and
+        :meth:`match_greedy`).
+
         Parameters
         ----------
         gt_data : dict[str, np.ndarray]
@@ -278,6 +538,10 @@ class TrackerEvaluate:
         gt_to_tracked_id_previous_frame : Optional[dict[int, int]]
             A dictionary mapping ground truth IDs to predicted IDs from the
             previous frame.
+        metrics : Optional[TrackingMetrics]
+            If passed, the IoU matrix and the matches of the frame are
+            added to it, to compute the identity and HOTA metrics without
+            computing the IoU matrix again. Default: None.
 
         Returns
         -------
@@ -290,48 +554,26 @@ class TrackerEvaluate:
 
         """
         total_gt = len(gt_data["bbox"])
-        false_positive = 0
-        true_positive = 0
-        indices_of_matched_gt_boxes = set()
-        gt_to_tracked_id_current_frame = {}
-
-        pred_boxes = pred_data["tracked_boxes"]
         pred_ids = pred_data["ids"]
-
-        gt_boxes = gt_data["bbox"]
         gt_ids = gt_data["id"]
 
-        for _i, (pred_box, pred_id) in enumerate(zip(pred_boxes, pred_ids)):
-            best_iou = 0.0
-            index_gt_best_match = None
-            index_gt_not_match = None
-
-            for j, gt_box in enumerate(gt_boxes):
-                if j not in indices_of_matched_gt_boxes:
-                    iou = self.calculate_iou(gt_box, pred_box)
-                    if iou > iou_threshold and iou > best_iou:
-                        best_iou = iou
-                        index_gt_best_match = j
-                    else:
-                        index_gt_not_match = j
-
-            if index_gt_best_match is not None:
-                true_positive += 1
-                # Successfully found a matching ground truth box for the
-                # tracked box.
-                indices_of_matched_gt_boxes.add(index_gt_best_match)
-                # Map ground truth ID to tracked ID
-                gt_to_tracked_id_current_frame[
-                    int(gt_ids[index_gt_best_match])
-                ] = int(pred_id)
-            else:
-                false_positive += 1
-            if index_gt_not_match is not None:
-                gt_to_tracked_id_current_frame[
-                    int(gt_ids[index_gt_not_match])
-                ] = np.nan  # type: ignore
+        iou_matrix = compute_iou_matrix(
+            gt_data["bbox"], pred_data["tracked_boxes"]
+        )
+        if self.matching == "greedy":
+            matched, gt_to_tracked_id_current_frame = self.match_greedy(
+                iou_matrix, gt_ids, pred_ids, iou_threshold
+            )
+        else:
+            matched, gt_to_tracked_id_current_frame = self.match_optimal(
+                iou_matrix, gt_ids, pred_ids, iou_threshold
+            )
+        if metrics is not None:
+            metrics.update(gt_ids, pred_ids, iou_matrix, matched)
 
-        missed_detections = total_gt - len(indices_of_matched_gt_boxes)
+        true_positive = len(matched)
+        false_positive = len(pred_ids) - true_positive
+        missed_detections = total_gt - true_positive
         num_switches = self.count_identity_switches(
             gt_to_tracked_id_previous_frame, gt_to_tracked_id_current_frame
         )
@@ -349,12 +591,13 @@ class TrackerEvaluate:
             gt_to_tracked_id_current_frame,
         )
 
-    def evaluate_tracking(
+    def compute_mota_per_frame(
         self,
         ground_truth_dict: dict[int, dict[str, Any]],
         predicted_dict: dict[int, dict[str, Any]],
-    ) -> list[float]:
-        """Evaluate tracking with the Multi-Object Tracking Accuracy metric.
+        metrics: Optional[TrackingMetrics] = None,
+    ) -> dict[str, list]:
+        """Compute the MOTA metric and its components for each frame.
 
         Parameters
         ----------
@@ -363,66 +606,596 @@ class TrackerEvaluate:
             frame, organized by frame number.
         predicted_dict : dict
             Dictionary containing predicted bounding boxes and IDs for each
-            frame, organized by frame _index_.
+            frame, organized by frame _index_. Ground truth frames that are
+            not in this dictionary are not evaluated.
+        metrics : Optional[TrackingMetrics]
+            If passed, the evaluated frames are added to it (see
+            :meth:`compute_mota_one_frame`). Default: None.
 
         Returns
         -------
-        list[float]:
-            The computed MOTA (Multi-Object Tracking Accuracy) score for the
-            tracking performance.
+        dict[str, list]:
+            Dictionary with the frame numbers (under "Frame Number"), and for
+            each frame the total number of ground truth boxes, true
+            positives, missed detections, false positives, number of
+            identity switches, and MOTA value.
 
         """
-        mota_values = []
         prev_frame_id_map: Optional[dict] = None
-        results: dict[str, Any] = {
-            "Frame Number": [],
-            "Total Ground Truth": [],
-            "True Positives": [],
-            "Missed Detections": [],
-            "False Positives": [],
-            "Number of Switches": [],
-            "MOTA": [],
-        }
+        results = create_mota_results()
 
         for frame_number in sorted(ground_truth_dict.keys()):
             gt_data_frame = ground_truth_dict[frame_number]
 
-            if frame_number < len(predicted_dict):
+            if frame_number in predicted_dict:
                 pred_data_frame = predicted_dict[frame_number]
 
-                (
-                    mota,
-                    true_positives,
-                    missed_detections,
-                    false_positives,
-                    num_switches,
-                    total_gt,
-                    prev_frame_id_map,
-                ) = self.compute_mota_one_frame(
+                frame_results = self.compute_mota_one_frame(
                     gt_data_frame,
                     pred_data_frame,
                     self.iou_threshold,
                     prev_frame_id_map,
+                    metrics,
                 )
-                mota_values.append(mota)
-                results["Frame Number"].append(frame_number)
-                results["Total Ground Truth"].append(total_gt)
-                results["True Positives"].append(true_positives)
-                results["Missed Detections"].append(missed_detections)
-                results["False Positives"].append(false_positives)
-                results["Number of Switches"].append(num_switches)
-                results["MOTA"].append(mota)
+                prev_frame_id_map = frame_results[-1]
+                append_mota_results(results, frame_number, frame_results)
+
+        return results
+
+    def compute_metrics(
+        self,
+        ground_truth_dict: dict[int, dict[str, Any]],
+        predicted_dict: dict[int, dict[str, Any]],
+    ) -> tuple[dict[str, list], dict[str, float]]:
+        """Compute the MOTA per frame and the metrics across frames.
+
+        The IoU matrix of each frame is computed once and used for all the
+        metrics.
+
+        Parameters
+        ----------
+        ground_truth_dict : dict
+            Dictionary containing ground truth bounding boxes and IDs for each
+            frame, organized by frame number.
+        predicted_dict : dict
+            Dictionary containing predicted bounding boxes and IDs for each
+            frame, organized by frame _index_. Ground truth frames that are
+            not in this dictionary are not evaluated.
+
+        Returns
+        -------
+        dict[str, list]:
+            MOTA metrics per frame, as returned by
+            :meth:`compute_mota_per_frame`.
+        dict[str, float]:
+            MOTP, identity and HOTA metrics across frames, as returned by
+            :meth:`TrackingMetrics.compute`.
+
+        """
+        metrics = TrackingMetrics(self.iou_threshold)
+        results = self.compute_mota_per_frame(
+            ground_truth_dict, predicted_dict, metrics
+        )
+        return results, metrics.compute()
+
+    def evaluate_tracking(
+        self,
+        ground_truth_dict: dict[int, dict[str, Any]],
+        predicted_dict: dict[int, dict[str, Any]],
+    ) -> list[float]:
+        """Evaluate tracking with the Multi-Object Tracking Accuracy metric.
+
+        The metrics per frame are saved to a csv file in the tracking
+        output directory.
+
+        Parameters
+        ----------
+        ground_truth_dict : dict
+            Dictionary containing ground truth bounding boxes and IDs for each
+            frame, organized by frame number.
+        predicted_dict : dict
+            Dictionary containing predicted bounding boxes and IDs for each
+            frame, organized by frame _index_. Ground truth frames that are
+            not in this dictionary are not evaluated.
+
+        Returns
+        -------
+        list[float]:
+            The computed MOTA (Multi-Object Tracking Accuracy) score for the
+            tracking performance.
+
+        """
+        results, summary_metrics = self.compute_metrics(
+            ground_truth_dict, predicted_dict
+        )
 
         save_tracking_mota_metrics(self.tracking_output_dir, results)
+        for metric, value in summary_metrics.items():
+            logging.info(f"{metric}: {value:f}")
+
+        return results["MOTA"]
+
+    def start_online_evaluation(
+        self, ground_truth_dict: Optional[dict[int, dict[str, Any]]] = None
+    ) -> None:
+        """Start evaluating tracked detections fed frame by frame.
+
+        The tracked detections of each frame are passed to :meth:`update`
+        as they are computed, so they do not need to be kept in memory
+        until the end of tracking. Only the metrics of the annotated frames
+        are kept. The state of the evaluation is kept in `online_state`,
+        which can be saved and restored to resume it.
+
+        Parameters
+        ----------
+        ground_truth_dict : Optional[dict[int, dict[str, Any]]]
+            Ground truth data, as returned by :meth:`get_ground_truth_data`.
+            By default, None, which means it is read from the annotations
+            file.
+
+        """
+        if ground_truth_dict is None:
+            ground_truth_dict = self.get_ground_truth_data()
+        self.ground_truth_dict = ground_truth_dict
+        self.last_known_predicted_ids = {}
+        self.online_state: dict[str, Any] = {
+            "next_frame_number": None,
+            "prev_frame_id_map": None,
+            "last_known_predicted_ids": self.last_known_predicted_ids,
+            "results": create_mota_results(),
+            "metrics": TrackingMetrics(self.iou_threshold),
+        }
+
+    def load_online_state(self, online_state: dict) -> None:
+        """Restore the state of an online evaluation.
+
+        Parameters
+        ----------
+        online_state : dict
+            State of an online evaluation started with the same ground
+            truth data, as held in `online_state`.
+
+        """
+        self.online_state = online_state
+        self.last_known_predicted_ids = online_state[
+            "last_known_predicted_ids"
+        ]
+
+    def update(
+        self, frame_number: int, pred_data: dict[str, np.ndarray]
+    ) -> Optional[float]:
+        """Evaluate the tracked detections of the next frame.
+
+        Parameters
+        ----------
+        frame_number : int
+            Frame index (0-based) of the tracked detections. Frames must be
+            passed in increasing order, as identity switches are counted
+            with respect to the previous frames.
+        pred_data : dict[str, np.ndarray]
+            Tracked detections of the frame, with the tracked boxes (under
+            "tracked_boxes") and their IDs (under "ids").
+
+        Returns
+        -------
+        Optional[float]
+            MOTA of the frame, or None if the frame is not annotated.
+
+        """
+        state = self.online_state
+        if (
+            state["next_frame_number"] is not None
+            and frame_number < state["next_frame_number"]
+        ):
+            raise ValueError(
+                f"Frames should be evaluated in increasing order, but got "
+                f"frame {frame_number} after frame "
+                f"{state['next_frame_number'] - 1}."
+            )
+        state["next_frame_number"] = frame_number + 1
+        if frame_number not in self.ground_truth_dict:
+            return None
+
+        frame_results = self.compute_mota_one_frame(
+            self.ground_truth_dict[frame_number],
+            pred_data,
+            self.iou_threshold,
+            state["prev_frame_id_map"],
+            state["metrics"],
+        )
+        state["prev_frame_id_map"] = frame_results[-1]
+        append_mota_results(state["results"], frame_number, frame_results)
+        return frame_results[0]
+
+    def get_running_mota(self) -> float:
+        """Get the MOTA averaged across the frames evaluated so far.
+
+        Returns
+        -------
+        float
+            Mean MOTA of the annotated frames evaluated with
+            :meth:`update`, or NaN if none has been evaluated.
+
+        """
+        mota_values = self.online_state["results"]["MOTA"]
+        return float(np.mean(mota_values)) if mota_values else np.nan
 
-        return mota_values
+    def finish_online_evaluation(self) -> list[float]:
+        """Save and log the metrics of an online evaluation.
+
+        The metrics per frame are saved to a csv file in the tracking
+        output directory, as in :meth:`evaluate_tracking`.
+
+        Returns
+        -------
+        list[float]:
+            The MOTA of each annotated frame evaluated.
+
+        """
+        results = self.online_state["results"]
+        save_tracking_mota_metrics(self.tracking_output_dir, results)
+        for metric, value in self.online_state["metrics"].compute().items():
+            logging.info(f"{metric}: {value:f}")
+        logging.info(f"Overall MOTA: {self.get_running_mota():f}")
+        return results["MOTA"]
 
     def run_evaluation(self) -> None:
         """Run evaluation of tracking based on tracking ground truth."""
         ground_truth_dict = self.get_ground_truth_data()
-        mota_values = self.evaluate_tracking(
-            ground_truth_dict, self.predicted_boxes_dict
-        )
+        predicted_dict = self.get_predicted_data(ground_truth_dict.keys())
+        mota_values = self.evaluate_tracking(ground_truth_dict, predicted_dict)
 
         overall_mota = np.mean(mota_values)
         logging.info("Overall MOTA: %f" % overall_mota)  # noqa: UP031
+
+
+def create_mota_results() -> dict[str, list]:
+    """Create an empty dictionary of MOTA metrics per frame.
+
+    Returns
+    -------
+    dict[str, list]
+        Dictionary with an empty list per metric, as returned by
+        :meth:`TrackerEvaluate.compute_mota_per_frame`.
+
+    """
+    return {
+        "Frame Number": [],
+        **{key: [] for key in MOTA_TOTALS},
+        "MOTA": [],
+    }
+
+
+def append_mota_results(
+    results: dict[str, list], frame_number: int, frame_results: tuple
+) -> None:
+    """Append the MOTA metrics of a frame to the metrics per frame.
+
+    Parameters
+    ----------
+    results : dict[str, list]
+        MOTA metrics per frame, as returned by :func:`create_mota_results`.
+    frame_number : int
+        Frame number.
+    frame_results : tuple
+        MOTA metrics of the frame, as returned by
+        :meth:`TrackerEvaluate.compute_mota_one_frame`.
+
+    """
+    (
+        mota,
+        true_positives,
+        missed_detections,
+        false_positives,
+        num_switches,
+        total_gt,
+        _,
+    ) = frame_results
+    results["Frame Number"].append(frame_number)
+    results["Total Ground Truth"].append(total_gt)
+    results["True Positives"].append(true_positives)
+    results["Missed Detections"].append(missed_detections)
+    results["False Positives"].append(false_positives)
+    results["Number of Switches"].append(num_switches)
+    results["MOTA"].append(mota)
+
+
+def summarise_mota_results(results: dict[str, list]) -> dict:
+    """Summarise the MOTA metrics per frame of a video.
+
+    Parameters
+    ----------
+    results : dict[str, list]
+        MOTA metrics per frame, as returned by
+        :meth:`TrackerEvaluate.compute_mota_per_frame`.
+
+    Returns
+    -------
+    dict
+        Dictionary with the MOTA averaged across frames (NaN if no frame
+        was evaluated), and the total number of ground truth boxes, true
+        positives, missed detections, false positives and identity
+        switches across frames.
+
+    """
+    return {
+        "MOTA": np.mean(results["MOTA"]) if results["MOTA"] else np.nan,
+        **{key: int(np.sum(results[key])) for key in MOTA_TOTALS},
+    }
+
+
+def get_video_name(tracks_file: str) -> str:
+    """Get the name of the video from the name of its tracks file.
+
+    Parameters
+    ----------
+    tracks_file : str
+        Path to a tracks file named `<video-name>_tracks.csv` or
+        `<video-name>_tracks.npz`. For other names, the video name is the
+        stem of the file.
+
+    Returns
+    -------
+    str
+        Name of the video.
+
+    """
+    name = Path(tracks_file).name
+    for ending in TRACKS_FILE_ENDINGS:
+        if name.lower().endswith(ending):
+            return name[: -len(ending)]
+    return Path(tracks_file).stem
+
+
+def pair_tracks_and_annotations(
+    tracks_files: list[str], annotations_files: list[str]
+) -> list[tuple[str, str]]:
+    """Pair each tracks file with its ground truth annotations file.
+
+    If there is a single annotations file, all tracks files are evaluated
+    against it. Otherwise, each tracks file is paired with the annotations
+    file whose name starts with the name of the video, followed by the end
+    of the name or a separator ("_", "-" or ".").
+
+    Parameters
+    ----------
+    tracks_files : list[str]
+        List of tracks files.
+    annotations_files : list[str]
+        List of ground truth annotations files.
+
+    Returns
+    -------
+    list[tuple[str, str]]
+        List of (tracks file, annotations file) pairs, in the order of
+        `tracks_files`.
+
+    Raises
+    ------
+    ValueError
+        If a tracks file does not match exactly one annotations file.
+
+    """
+    if len(annotations_files) == 1:
+        return [(t, annotations_files[0]) for t in tracks_files]
+
+    pairs = []
+    for tracks_file in tracks_files:
+        video_name = get_video_name(tracks_file)
+        matches = [
+            a
+            for a in annotations_files
+            if Path(a).stem == video_name
+            or any(
+                Path(a).stem.startswith(video_name + separator)
+                for separator in "_-."
+            )
+        ]
+        if len(matches) != 1:
+            raise ValueError(
+                f"Expected one annotations file for video '{video_name}' "
+                f"({tracks_file}), but found {len(matches)}: {matches}."
+            )
+        pairs.append((tracks_file, matches[0]))
+    return pairs
+
+
+def evaluate_tracks_file(
+    tracks_file: str,
+    annotations_file: str,
+    iou_threshold: float,
+    matching: str = "optimal",
+    use_cache: bool = False,
+) -> dict:
+    """Compute the MOTA metrics of a tracks file.
+
+    Parameters
+    ----------
+    tracks_file : str
+        Path to the tracks file, in VIA tracks format (.csv) or as written
+        by `detect-and-track-video --output_format npz` (.npz).
+    annotations_file : str
+        Path to the ground truth annotations, in VIA tracks format.
+    iou_threshold : float
+        IoU threshold to match tracked and ground truth boxes.
+    matching : str
+        Method to match tracked and ground truth boxes, "optimal" or
+        "greedy". Default: "optimal".
+    use_cache : bool
+        Whether to cache the parsed csv files next to them (see
+        :func:`read_via_tracks_csv`). Default: False.
+
+    Returns
+    -------
+    dict
+        Dictionary with the video name, the tracks and annotations files,
+        the metrics returned by :func:`summarise_mota_results`, and the
+        MOTP, identity and HOTA metrics (see :class:`TrackingMetrics`).
+
+    """
+    evaluation = TrackerEvaluate(
+        annotations_file,
+        tracks_file,
+        iou_threshold,
+        tracking_output_dir=Path(),
+        matching=matching,
+        use_cache=use_cache,
+    )
+    ground_truth_dict = evaluation.get_ground_truth_data()
+    predicted_dict = evaluation.get_predicted_data(ground_truth_dict.keys())
+    results, summary_metrics = evaluation.compute_metrics(
+        ground_truth_dict, predicted_dict
+    )
+    return {
+        "Video": get_video_name(tracks_file),
+        "Tracks File": tracks_file,
+        "Annotations File": annotations_file,
+        **summarise_mota_results(results),
+        **summary_metrics,
+    }
+
+
+def main(args: argparse.Namespace) -> "pd.DataFrame":
+    """Evaluate tracks files and save a table with the metrics per video.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Command-line arguments.
+
+    Returns
+    -------
+    pd.DataFrame
+        Metrics of each tracks file, in the order of the input files.
+
+    """
+    tracks_files = get_file_paths(
+        args.tracks_files, TRACKS_FILE_ENDINGS, "tracks"
+    )
+    annotations_files = get_file_paths(
+        args.annotations_files, (".csv",), "annotations"
+    )
+    pairs = pair_tracks_and_annotations(tracks_files, annotations_files)
+
+    # Evaluate each tracks file in a pool of processes
+    with ProcessPoolExecutor(
+        max_workers=max(min(args.n_workers, len(pairs)), 1)
+    ) as executor:
+        results = list(
+            executor.map(
+                partial(
+                    evaluate_tracks_file,
+                    iou_threshold=args.evaluation_iou_threshold,
+                    matching=args.evaluation_matching,
+                    use_cache=args.cache_annotations,
+                ),
+                *zip(*pairs),
+            )
+        )
+
+    import pandas as pd
+
+    results_df = pd.DataFrame(results)
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    output_file = Path(args.output_dir) / "tracker_evaluation.csv"
+    results_df.to_csv(output_file, index=False)
+
+    logging.info(
+        "Tracker evaluation:\n"
+        f"{results_df.drop(columns=['Tracks File', 'Annotations File'])}"
+    )
+    logging.info(f"Mean MOTA across videos: {results_df['MOTA'].mean():f}")
+    logging.info(f"Tracker evaluation saved to {output_file}")
+    return results_df
+
+
+def evaluate_parse_args(args):
+    """Parse command-line arguments for the tracker evaluation."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--tracks_files",
+        type=str,
+        nargs="+",
+        required=True,
+        help=(
+            "Location of the tracks files to evaluate, as written by "
+            "`detect-and-track-video`. Each path can be a file, a directory "
+            "or a glob pattern. For a directory, all the files in it named "
+            "`<video-name>_tracks.csv` or `<video-name>_tracks.npz` are "
+            "evaluated."
+        ),
+    )
+    parser.add_argument(
+        "--annotations_files",
+        type=str,
+        nargs="+",
+        required=True,
+        help=(
+            "Location of the csv files with the ground truth annotations, "
+            "in VIA-tracks format. Each path can be a file, a directory or "
+            "a glob pattern. If a single file is passed, all tracks files "
+            "are evaluated against it. Otherwise, the name of the "
+            "annotations file of each video must start with the name of "
+            "the video."
+        ),
+    )
+    parser.add_argument(
+        "--evaluation_iou_threshold",
+        type=float,
+        default=0.1,
+        help=(
+            "Minimum IoU between a tracked box and a ground truth box to "
+            "consider them a match. Default: 0.1."
+        ),
+    )
+    parser.add_argument(
+        "--evaluation_matching",
+        type=str,
+        choices=MATCHING_METHODS,
+        default="optimal",
+        help=(
+            "Method to match tracked and ground truth boxes: 'optimal' "
+            "maximises the total IoU of the matches in each frame, 'greedy' "
+            "reproduces the results of earlier versions. Default: optimal."
+        ),
+    )
+    parser.add_argument(
+        "--cache_annotations",
+        action="store_true",
+        help=(
+            "Cache the parsed csv files in a file next to each of them "
+            "(<csv-file>.cache.npz), so that later evaluations with the "
+            "same files skip parsing them."
+        ),
+    )
+    parser.add_argument(
+        "--n_workers",
+        type=int,
+        default=os.cpu_count(),
+        help=(
+            "Number of processes to evaluate tracks files in parallel. "
+            "Default: the number of CPUs."
+        ),
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default="tracker_evaluation_output",
+        help=(
+            "Directory to save the table of metrics per video, named "
+            "tracker_evaluation.csv. Default: tracker_evaluation_output."
+        ),
+    )
+    return parser.parse_args(args)
+
+
+def app_wrapper():
+    """Wrap function to run the tracker evaluation."""
+    logging.getLogger().setLevel(logging.INFO)
+
+    evaluate_args = evaluate_parse_args(sys.argv[1:])
+    main(evaluate_args)
+
+
+if __name__ == "__main__":
+    app_wrapper()
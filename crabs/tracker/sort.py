@@ -16,33 +16,63 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+from typing import Any
+
 import numpy as np
 from filterpy.kalman import KalmanFilter
 
 from crabs.tracker.utils.sort import (
     associate_detections_to_trackers,
     convert_bbox_to_z,
+    convert_bboxes_to_z,
     convert_x_to_bbox,
+    convert_x_to_bboxes,
 )
 
 
 class KalmanBoxTracker:
     """Class for the internal state of individual tracked objects.
 
+    :class:`Sort` tracks all objects with a :class:`KalmanBoxTrackerBank`.
+    This class is kept as the reference implementation with one Kalman
+    filter per object, against which the bank is tested and benchmarked,
+    and to define the Kalman filter model shared by both.
+
     Parameters
     ----------
     bbox : np.ndarray
         Initial bounding box coordinates in the format [x1, y1, x2, y2].
+    track_id : int
+        Identifier of the track (0-based).
 
     """
 
-    count = 0
-
-    def __init__(self, bbox):
+    def __init__(self, bbox: np.ndarray, track_id: int):
         """Initialise a tracker using initial bounding box."""
+        self.kf = self.create_kalman_filter()
+        self.kf.x[:4] = convert_bbox_to_z(bbox)
+        self.time_since_update = 0
+        self.id = track_id
+        self.history: list = []
+        self.hits = 0
+        self.hit_streak = 0
+        self.age = 0
+
+    @staticmethod
+    def create_kalman_filter() -> KalmanFilter:
+        """Create a Kalman filter with a constant velocity model.
+
+        Returns
+        -------
+        KalmanFilter
+            Kalman filter with a 7-dimensional state [x, y, s, r, vx, vy, vs]
+            and a 4-dimensional measurement [x, y, s, r], with the state
+            at the origin.
+
+        """
         # define constant velocity model
-        self.kf = KalmanFilter(dim_x=7, dim_z=4)
-        self.kf.F = np.array(
+        kf = KalmanFilter(dim_x=7, dim_z=4)
+        kf.F = np.array(
             [
                 [1, 0, 0, 0, 1, 0, 0],
                 [0, 1, 0, 0, 0, 1, 0],
@@ -53,7 +83,7 @@ class KalmanBoxTracker:
                 [0, 0, 0, 0, 0, 0, 1],
             ]
         )
-        self.kf.H = np.array(
+        kf.H = np.array(
             [
                 [1, 0, 0, 0, 0, 0, 0],
                 [0, 1, 0, 0, 0, 0, 0],
@@ -62,23 +92,15 @@ class KalmanBoxTracker:
             ]
         )
 
-        self.kf.R[2:, 2:] *= 10.0
-        self.kf.P[4:, 4:] *= (
+        kf.R[2:, 2:] *= 10.0
+        kf.P[4:, 4:] *= (
             1000.0
             # give high uncertainty to the unobservable initial velocities
         )
-        self.kf.P *= 10.0
-        self.kf.Q[-1, -1] *= 0.01
-        self.kf.Q[4:, 4:] *= 0.01
-
-        self.kf.x[:4] = convert_bbox_to_z(bbox)
-        self.time_since_update = 0
-        self.id = KalmanBoxTracker.count
-        KalmanBoxTracker.count += 1
-        self.history = []
-        self.hits = 0
-        self.hit_streak = 0
-        self.age = 0
+        kf.P *= 10.0
+        kf.Q[-1, -1] *= 0.01
+        kf.Q[4:, 4:] *= 0.01
+        return kf
 
     def update(self, bbox: np.ndarray) -> None:
         """Update the state vector with an observed bounding box.
@@ -126,9 +148,222 @@ class KalmanBoxTracker:
         return convert_x_to_bbox(self.kf.x)
 
 
+class KalmanBoxTrackerBank:
+    """Internal state of a set of tracked objects, stored as arrays.
+
+    Each tracked object follows the same constant velocity model as
+    :class:`KalmanBoxTracker`, but the Kalman filter states and covariances
+    of all objects are stored in arrays of shape (N, 7) and (N, 7, 7), so
+    that they are predicted and updated in a few batched NumPy operations
+    rather than a Python loop over the objects. The operations follow those
+    of `filterpy.kalman.KalmanFilter`, so the results match those of a
+    :class:`KalmanBoxTracker` per object.
+
+    The counters of the trackers (`time_since_update`, `hits`,
+    `hit_streak` and `age`) are stored as integer arrays of shape (N,).
+    """
+
+    def __init__(self):
+        """Initialise an empty bank of trackers."""
+        # model matrices, shared by all trackers
+        kf = KalmanBoxTracker.create_kalman_filter()
+        self.F = kf.F.astype(float)
+        self.H = kf.H.astype(float)
+        self.Q = kf.Q
+        self.R = kf.R
+        self.initial_P = kf.P
+
+        # state of each tracker
+        self.x = np.empty((0, 7))
+        self.P = np.empty((0, 7, 7))
+        self.id = np.empty(0, dtype=int)
+        self.time_since_update = np.empty(0, dtype=int)
+        self.hits = np.empty(0, dtype=int)
+        self.hit_streak = np.empty(0, dtype=int)
+        self.age = np.empty(0, dtype=int)
+
+    def __len__(self) -> int:
+        """Return the number of trackers."""
+        return len(self.id)
+
+    def add(self, bboxes: np.ndarray, track_ids: np.ndarray) -> None:
+        """Add trackers initialised with the given bounding boxes.
+
+        Parameters
+        ----------
+        bboxes : np.ndarray
+            Array of shape (M, 4) with the initial bounding boxes in the
+            format [x1, y1, x2, y2].
+        track_ids : np.ndarray
+            Array of shape (M,) with the identifiers of the new tracks
+            (0-based).
+
+        """
+        x = np.zeros((len(bboxes), 7))
+        x[:, :4] = convert_bboxes_to_z(bboxes)
+        zeros = np.zeros(len(bboxes), dtype=int)
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate(
+            [self.P, np.broadcast_to(self.initial_P, (len(bboxes), 7, 7))]
+        )
+        self.id = np.concatenate([self.id, track_ids])
+        self.time_since_update = np.concatenate(
+            [self.time_since_update, zeros]
+        )
+        self.hits = np.concatenate([self.hits, zeros])
+        self.hit_streak = np.concatenate([self.hit_streak, zeros])
+        self.age = np.concatenate([self.age, zeros])
+
+    def keep(self, mask: np.ndarray) -> None:
+        """Keep only the selected trackers, in the same order.
+
+        Parameters
+        ----------
+        mask : np.ndarray
+            Boolean array of shape (N,), True for the trackers to keep.
+
+        """
+        self.x = self.x[mask]
+        self.P = self.P[mask]
+        self.id = self.id[mask]
+        self.time_since_update = self.time_since_update[mask]
+        self.hits = self.hits[mask]
+        self.hit_streak = self.hit_streak[mask]
+        self.age = self.age[mask]
+
+    def _predict_kalman_filters(self) -> None:
+        """Advance the Kalman filter states by one frame."""
+        # stop the scale from becoming negative
+        self.x[self.x[:, 6] + self.x[:, 2] <= 0, 6] *= 0.0
+        self.x = self.x @ self.F.T
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def predict(self) -> np.ndarray:
+        """Advance the state vectors and return the predicted boxes.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (N, 4) with the predicted bounding boxes in the
+            format [x1, y1, x2, y2].
+
+        """
+        self._predict_kalman_filters()
+        self.age += 1
+        self.hit_streak[self.time_since_update > 0] = 0
+        self.time_since_update += 1
+        return self.get_state()
+
+    def advance(self) -> np.ndarray:
+        """Advance the state vectors by one frame without a detection step.
+
+        Unlike :meth:`predict`, the counters of the trackers are not
+        modified, so that a skipped frame is not counted as a missed
+        detection.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (N, 4) with the predicted bounding boxes in the
+            format [x1, y1, x2, y2].
+
+        """
+        self._predict_kalman_filters()
+        return self.get_state()
+
+    def update(self, indices: np.ndarray, bboxes: np.ndarray) -> None:
+        """Update the state vectors of some trackers with observed boxes.
+
+        Parameters
+        ----------
+        indices : np.ndarray
+            Array of shape (M,) with the indices of the trackers to update.
+        bboxes : np.ndarray
+            Array of shape (M, 4) with the observed bounding boxes in the
+            format [x1, y1, x2, y2].
+
+        """
+        if len(indices) == 0:
+            return
+        x = self.x[indices, :, np.newaxis]
+        P = self.P[indices]
+        H, R = self.H, self.R
+
+        # same steps as `filterpy.kalman.KalmanFilter.update`,
+        # with column vectors stacked along the first axis
+        z = convert_bboxes_to_z(bboxes)[:, :, np.newaxis]
+        y = z - H @ x
+        PHT = P @ H.T
+        S = H @ PHT + R
+        SI = np.linalg.inv(S)
+        K = PHT @ SI
+        x = x + K @ y
+        I_KH = np.eye(7) - K @ H
+        P = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ R @ K.transpose(0, 2, 1)
+
+        self.x[indices] = x[:, :, 0]
+        self.P[indices] = P
+        self.time_since_update[indices] = 0
+        self.hits[indices] += 1
+        self.hit_streak[indices] += 1
+
+    def get_state(self) -> np.ndarray:
+        """Return the current bounding box estimates.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (N, 4) with the current bounding boxes in the
+            format [x1, y1, x2, y2].
+
+        """
+        return convert_x_to_bboxes(self.x)
+
+    def state_dict(self) -> dict[str, np.ndarray]:
+        """Return the internal state of the trackers.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            Dictionary with the track IDs, the Kalman filter states "x" and
+            covariances "P", and the counters of the trackers.
+
+        """
+        return {
+            "id": self.id.copy(),
+            "x": self.x.copy(),
+            "P": self.P.copy(),
+            "time_since_update": self.time_since_update.copy(),
+            "hits": self.hits.copy(),
+            "hit_streak": self.hit_streak.copy(),
+            "age": self.age.copy(),
+        }
+
+    def load_state_dict(self, state: dict[str, np.ndarray]) -> None:
+        """Restore the internal state of the trackers.
+
+        Parameters
+        ----------
+        state : dict[str, np.ndarray]
+            Internal state returned by :meth:`state_dict`.
+
+        """
+        self.id = state["id"].copy()
+        self.x = state["x"].copy()
+        self.P = state["P"].copy()
+        self.time_since_update = state["time_since_update"].copy()
+        self.hits = state["hits"].copy()
+        self.hit_streak = state["hit_streak"].copy()
+        self.age = state["age"].copy()
+
+
 class Sort:  # noqa: D101
     def __init__(
-        self, max_age: int = 1, min_hits: int = 3, iou_threshold: float = 0.3
+        self,
+        max_age: int = 1,
+        min_hits: int = 3,
+        iou_threshold: float = 0.3,
+        gated_association: bool = False,
     ):
         """Set key parameters for SORT.
 
@@ -143,13 +378,57 @@ class Sort:  # noqa: D101
         iou_threshold : float, optional
             IOU threshold for associating detections with trackers.
             Default is 0.3.
+        gated_association : bool, optional
+            If True, only detections and trackers whose boxes overlap are
+            considered for association, and the assignment is solved
+            separately for each group of overlapping boxes. This is faster
+            in crowded frames. The tracked boxes are the same as with the
+            full assignment, but new tracks may be created in a different
+            order, so track IDs may be permuted. Default is False.
 
         """
         self.max_age = max_age
         self.min_hits = min_hits
         self.iou_threshold = iou_threshold
-        self.trackers: list = []
+        self.gated_association = gated_association
+        self.trackers = KalmanBoxTrackerBank()
         self.frame_count = 0
+        self.track_id_count = 0
+        # detection scores of the boxes returned by the last call to
+        # `update` or `advance`, NaN for boxes without a detection
+        self.output_scores = np.empty(0)
+
+    def state_dict(self) -> dict[str, Any]:
+        """Return the internal state of the SORT tracker.
+
+        The state can be saved to resume tracking later with
+        :meth:`load_state_dict`. The tracking parameters are not included.
+
+        Returns
+        -------
+        dict[str, Any]
+            Dictionary with the frame count, the number of tracks created
+            so far, and the state of the active trackers.
+
+        """
+        return {
+            "frame_count": self.frame_count,
+            "track_id_count": self.track_id_count,
+            "trackers": self.trackers.state_dict(),
+        }
+
+    def load_state_dict(self, state: dict[str, Any]) -> None:
+        """Restore the internal state of the SORT tracker.
+
+        Parameters
+        ----------
+        state : dict[str, Any]
+            Internal state returned by :meth:`state_dict`.
+
+        """
+        self.frame_count = state["frame_count"]
+        self.track_id_count = state["track_id_count"]
+        self.trackers.load_state_dict(state["trackers"])
 
     def update(
         self,
@@ -169,50 +448,110 @@ class Sort:  # noqa: D101
         np.ndarray
             Array of tracked objects with object IDs added as the last column.
             The shape of the array is (M, 5), where M is the number of tracked
-            objects.
+            objects. The scores of the detections each tracked object was
+            updated with are stored in `output_scores`, in the same order.
 
         """
+        dets = np.asarray(dets)
         self.frame_count += 1
-        # get predicted locations from existing trackers.
-        trks = np.zeros((len(self.trackers), 5))
-        to_del = []
-        ret = []
-        for t, trk in enumerate(trks):
-            pos = self.trackers[t].predict()[0]
-            trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
-            if np.any(np.isnan(pos)):
-                to_del.append(t)
-        trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
-        for t in reversed(to_del):
-            self.trackers.pop(t)
+        # get predicted locations from existing trackers,
+        # and remove those with invalid predictions
+        trks = self.trackers.predict()
+        valid = np.isfinite(trks).all(axis=1)
+        self.trackers.keep(valid)
+        trks = trks[valid]
         (
             matched,
             unmatched_dets,
             unmatched_trks,
-        ) = associate_detections_to_trackers(dets, trks, self.iou_threshold)
+        ) = associate_detections_to_trackers(
+            dets, trks, self.iou_threshold, gated=self.gated_association
+        )
 
         # update matched trackers with assigned detections
-        for m in matched:
-            self.trackers[m[1]].update(dets[m[0], :])
+        self.trackers.update(matched[:, 1], dets[matched[:, 0], :4])
 
         # create and initialise new trackers for unmatched detections
-        for i in unmatched_dets:
-            trk = KalmanBoxTracker(dets[i, :])
-            self.trackers.append(trk)
-        i = len(self.trackers)
-        for trk in reversed(self.trackers):
-            d = trk.get_state()[0]
-            if (trk.time_since_update < 1) and (
-                trk.hit_streak >= self.min_hits
-                or self.frame_count <= self.min_hits
-            ):
-                ret.append(
-                    np.concatenate((d, [trk.id + 1])).reshape(1, -1)
-                )  # +1 as MOT benchmark requires positive
-            i -= 1
-            # remove dead tracklet
-            if trk.time_since_update > self.max_age:
-                self.trackers.pop(i)
-        if len(ret) > 0:
-            return np.concatenate(ret)
-        return np.empty((0, 5))
+        unmatched_dets = unmatched_dets.astype(int)
+        self.trackers.add(
+            dets[unmatched_dets, :4],
+            self.track_id_count + np.arange(len(unmatched_dets)),
+        )
+        self.track_id_count += len(unmatched_dets)
+
+        # score of the detection assigned to each tracker in this step
+        scores = np.full(len(self.trackers), np.nan)
+        scores[matched[:, 1]] = dets[matched[:, 0], 4]
+        scores[len(scores) - len(unmatched_dets) :] = dets[unmatched_dets, 4]
+
+        ret = self.get_output(self.trackers.get_state())
+        self.output_scores = scores[self.get_output_mask()][::-1]
+
+        # remove dead tracklets
+        self.trackers.keep(self.trackers.time_since_update <= self.max_age)
+        return ret
+
+    def get_output(self, boxes: np.ndarray) -> np.ndarray:
+        """Select the boxes of the tracks to output.
+
+        Only tracks updated in the last detection step are output, and
+        only once they have been hit `min_hits` times in a row (except in
+        the first `min_hits` frames).
+
+        Parameters
+        ----------
+        boxes : np.ndarray
+            Array of shape (N, 4) with the current boxes of all trackers.
+
+        Returns
+        -------
+        np.ndarray
+            Array of the selected boxes with object IDs added as the last
+            column, in reverse order of creation of the tracks. The shape of
+            the array is (M, 5), where M is the number of tracks output.
+
+        """
+        # +1 as MOT benchmark requires positive IDs
+        return np.hstack([boxes, self.trackers.id[:, np.newaxis] + 1])[
+            self.get_output_mask()
+        ][::-1]
+
+    def get_output_mask(self) -> np.ndarray:
+        """Return which tracks to output (see :meth:`get_output`).
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array of shape (N,), True for the tracks to output.
+
+        """
+        return (self.trackers.time_since_update < 1) & (
+            (self.trackers.hit_streak >= self.min_hits)
+            | (self.frame_count <= self.min_hits)
+        )
+
+    def advance(self) -> np.ndarray:
+        """Advance the SORT tracker by one frame without detections.
+
+        Used for frames on which the detector is not run. The trackers'
+        states are predicted for the next frame, but the frame is not
+        counted as a missed detection: the frame count and the trackers'
+        counters (such as `time_since_update`) are not modified, so
+        `max_age` and `min_hits` are measured in detection steps.
+
+        Returns
+        -------
+        np.ndarray
+            Array of predicted boxes with object IDs added as the last
+            column, for the same tracks that :meth:`update` would return
+            after the last detection step. The shape of the array is (M, 5),
+            where M is the number of tracked objects. As no detections are
+            used, `output_scores` is set to NaN for all of them.
+
+        """
+        boxes = self.trackers.advance()
+        valid = np.isfinite(boxes).all(axis=1)
+        self.trackers.keep(valid)
+        ret = self.get_output(boxes[valid])
+        self.output_scores = np.full(len(ret), np.nan)
+        return ret
@@ -0,0 +1,470 @@
+"""Sweep the SORT tracker parameters over stored detections."""
+
+import argparse
+import itertools
+import logging
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import yaml  # type: ignore
+
+from crabs.tracker.evaluate_tracker import (
+    MATCHING_METHODS,
+    TrackerEvaluate,
+    summarise_mota_results,
+)
+from crabs.tracker.sort import Sort
+from crabs.tracker.utils.detections_store import read_detections_store
+from crabs.tracker.utils.tracking import (
+    format_and_filter_bbox_predictions_for_sort,
+)
+
+if TYPE_CHECKING:
+    # imported when used, as they are slow to import
+    import optuna
+    import pandas as pd
+
+DEFAULT_SWEEP_CONFIG = str(
+    Path(__file__).parent / "config" / "sweep_config.yaml"
+)
+
+# SORT parameters that can be swept, and whether they are integers
+SORT_PARAMETERS = {
+    "max_age": int,
+    "min_hits": int,
+    "iou_threshold": float,
+    "score_threshold": float,
+}
+
+# Data shared by all the evaluations in a worker process,
+# set by `init_worker`
+_worker_data: dict[str, Any] = {}
+
+
+def track_stored_detections(
+    stored_detections: list[tuple[int, dict]],
+    sort_config: dict,
+    frames_to_keep: set[int],
+) -> dict:
+    """Run the SORT tracker on stored detections.
+
+    The detections are formatted and filtered as in `detect-and-track-video`,
+    so the tracks are the same as those of a full detection and tracking run
+    with the same parameters.
+
+    Parameters
+    ----------
+    stored_detections : list[tuple[int, dict]]
+        List of frame indices (0-based) and detections per frame, as read
+        from a detections store.
+    sort_config : dict
+        Dictionary with the SORT parameters "max_age", "min_hits",
+        "iou_threshold" and "score_threshold".
+    frames_to_keep : set[int]
+        Frame indices (0-based) whose tracked detections are returned.
+
+    Returns
+    -------
+    dict
+        A nested dictionary that maps the frame indices in `frames_to_keep`
+        to a dictionary with the tracked boxes (under "tracked_boxes"), the
+        track IDs (under "ids") and the scores of the detections the
+        boxes were updated with (under "scores").
+
+    """
+    sort_tracker = Sort(
+        max_age=sort_config["max_age"],
+        min_hits=sort_config["min_hits"],
+        iou_threshold=sort_config["iou_threshold"],
+    )
+    tracked_detections_to_keep = {}
+    for frame_idx, detections_dict in stored_detections:
+        prediction_tensor = format_and_filter_bbox_predictions_for_sort(
+            detections_dict, sort_config["score_threshold"]
+        )
+        tracked_boxes_array = sort_tracker.update(prediction_tensor.numpy())
+        if frame_idx in frames_to_keep:
+            tracked_detections_to_keep[frame_idx] = {
+                "tracked_boxes": tracked_boxes_array[:, :-1],
+                "ids": tracked_boxes_array[:, -1],
+                "scores": sort_tracker.output_scores,
+            }
+    return tracked_detections_to_keep
+
+
+def init_worker(
+    detections_path: str,
+    ground_truth_dict: dict,
+    evaluation_iou_threshold: float,
+    evaluation_matching: str = "optimal",
+) -> None:
+    """Load the data shared by all evaluations in a worker process.
+
+    Parameters
+    ----------
+    detections_path : str
+        Path to the detections store.
+    ground_truth_dict : dict
+        Ground truth data, as returned by
+        :meth:`TrackerEvaluate.get_ground_truth_data`.
+    evaluation_iou_threshold : float
+        IoU threshold to match tracked and ground truth boxes.
+    evaluation_matching : str
+        Method to match tracked and ground truth boxes, "optimal" or
+        "greedy". Default: "optimal".
+
+    """
+    import torch
+
+    # avoid oversubscribing the cores with several threads per worker
+    torch.set_num_threads(1)
+
+    _worker_data["stored_detections"] = list(
+        read_detections_store(Path(detections_path))
+    )
+    _worker_data["ground_truth_dict"] = ground_truth_dict
+    _worker_data["evaluation_iou_threshold"] = evaluation_iou_threshold
+    _worker_data["evaluation_matching"] = evaluation_matching
+
+
+def evaluate_sort_config(sort_config: dict) -> dict:
+    """Track the stored detections and compute the MOTA metrics.
+
+    Uses the data loaded in the worker process by :func:`init_worker`.
+
+    Parameters
+    ----------
+    sort_config : dict
+        Dictionary with the SORT parameters "max_age", "min_hits",
+        "iou_threshold" and "score_threshold".
+
+    Returns
+    -------
+    dict
+        Dictionary with the SORT parameters, the MOTA averaged across the
+        ground truth frames, and the total number of ground truth boxes,
+        true positives, missed detections, false positives and identity
+        switches across frames, followed by the MOTP, identity and HOTA
+        metrics (see :class:`TrackingMetrics`).
+
+    """
+    ground_truth_dict = _worker_data["ground_truth_dict"]
+    predicted_dict = track_stored_detections(
+        _worker_data["stored_detections"],
+        sort_config,
+        frames_to_keep=set(ground_truth_dict.keys()),
+    )
+
+    evaluation = TrackerEvaluate(
+        gt_dir="",  # ground truth is already loaded
+        predicted_boxes_dict=predicted_dict,
+        iou_threshold=_worker_data["evaluation_iou_threshold"],
+        tracking_output_dir=Path(),
+        matching=_worker_data["evaluation_matching"],
+    )
+    results, summary_metrics = evaluation.compute_metrics(
+        ground_truth_dict, predicted_dict
+    )
+
+    return {
+        **sort_config,
+        **summarise_mota_results(results),
+        **summary_metrics,
+    }
+
+
+def get_grid_configs(sweep_config: dict) -> list[dict]:
+    """Get all combinations of the SORT parameters values to sweep.
+
+    Parameters
+    ----------
+    sweep_config : dict
+        Sweep config, with a list of values per SORT parameter.
+
+    Returns
+    -------
+    list[dict]
+        List of SORT configs.
+
+    """
+    return [
+        dict(zip(SORT_PARAMETERS, values))
+        for values in itertools.product(
+            *(sweep_config[param] for param in SORT_PARAMETERS)
+        )
+    ]
+
+
+def suggest_sort_config(trial: "optuna.Trial", sweep_config: dict) -> dict:
+    """Sample a SORT config with Optuna.
+
+    Each parameter is sampled between the minimum and maximum of its
+    values in the sweep config.
+
+    Parameters
+    ----------
+    trial : optuna.Trial
+        Optuna trial.
+    sweep_config : dict
+        Sweep config, with a list of values per SORT parameter.
+
+    Returns
+    -------
+    dict
+        SORT config.
+
+    """
+    sort_config: dict = {}
+    for param, param_type in SORT_PARAMETERS.items():
+        low, high = min(sweep_config[param]), max(sweep_config[param])
+        if param_type is int:
+            sort_config[param] = trial.suggest_int(param, low, high)
+        else:
+            sort_config[param] = trial.suggest_float(param, low, high)
+    return sort_config
+
+
+def run_grid_search(executor: Executor, sweep_config: dict) -> list[dict]:
+    """Evaluate all combinations of the SORT parameters in the sweep config.
+
+    Parameters
+    ----------
+    executor : Executor
+        Pool of worker processes initialised with :func:`init_worker`.
+    sweep_config : dict
+        Sweep config, with a list of values per SORT parameter.
+
+    Returns
+    -------
+    list[dict]
+        Metrics of each SORT config, as returned by
+        :func:`evaluate_sort_config`.
+
+    """
+    return list(
+        executor.map(evaluate_sort_config, get_grid_configs(sweep_config))
+    )
+
+
+def run_optuna_search(
+    executor: Executor, sweep_config: dict, n_workers: int, seed: int
+) -> list[dict]:
+    """Search the SORT parameters that maximise MOTA with Optuna.
+
+    The trials are run in batches of `n_workers`, so that all workers
+    evaluate a config at the same time.
+
+    Parameters
+    ----------
+    executor : Executor
+        Pool of worker processes initialised with :func:`init_worker`.
+    sweep_config : dict
+        Sweep config, with a list of values per SORT parameter and the
+        number of trials under "optuna".
+    n_workers : int
+        Number of worker processes.
+    seed : int
+        Seed of the Optuna sampler.
+
+    Returns
+    -------
+    list[dict]
+        Metrics of each SORT config, as returned by
+        :func:`evaluate_sort_config`.
+
+    """
+    import optuna
+
+    study = optuna.create_study(
+        direction="maximize", sampler=optuna.samplers.TPESampler(seed=seed)
+    )
+    n_trials = sweep_config["optuna"]["n_trials"]
+    results: list[dict] = []
+    while len(results) < n_trials:
+        trials = [
+            study.ask() for _ in range(min(n_workers, n_trials - len(results)))
+        ]
+        sort_configs = [
+            suggest_sort_config(trial, sweep_config) for trial in trials
+        ]
+        for trial, metrics in zip(
+            trials, executor.map(evaluate_sort_config, sort_configs)
+        ):
+            study.tell(trial, metrics["MOTA"])
+            results.append(metrics)
+    return results
+
+
+def main(args: argparse.Namespace) -> "pd.DataFrame":
+    """Sweep the SORT parameters and save a table ranked by MOTA.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Command-line arguments.
+
+    Returns
+    -------
+    pd.DataFrame
+        Metrics of each SORT config evaluated, sorted by decreasing MOTA.
+
+    """
+    with open(args.config_file) as f:
+        sweep_config = yaml.safe_load(f)
+
+    # Load ground truth once for all workers
+    ground_truth_dict = TrackerEvaluate(
+        args.annotations_file,
+        {},
+        args.evaluation_iou_threshold,
+        Path(args.output_dir),
+        use_cache=args.cache_annotations,
+    ).get_ground_truth_data()
+
+    # Evaluate SORT configs in a pool of processes
+    with ProcessPoolExecutor(
+        max_workers=args.n_workers,
+        initializer=init_worker,
+        initargs=(
+            args.detections_path,
+            ground_truth_dict,
+            args.evaluation_iou_threshold,
+            args.evaluation_matching,
+        ),
+    ) as executor:
+        if args.search == "grid":
+            results = run_grid_search(executor, sweep_config)
+        else:
+            results = run_optuna_search(
+                executor, sweep_config, args.n_workers, args.seed
+            )
+
+    import pandas as pd
+
+    # Rank configs by MOTA and save
+    results_df = pd.DataFrame(results).sort_values(
+        "MOTA", ascending=False, ignore_index=True, kind="stable"
+    )
+    results_df.index = pd.RangeIndex(1, len(results_df) + 1, name="Rank")
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    output_file = Path(args.output_dir) / "sweep_results.csv"
+    results_df.to_csv(output_file)
+
+    logging.info(f"Best SORT configs:\n{results_df.head(10).to_string()}")
+    logging.info(f"Sweep results saved to {output_file}")
+    return results_df
+
+
+def sweep_parse_args(args):
+    """Parse command-line arguments for the tracker sweep."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--detections_path",
+        type=str,
+        required=True,
+        help=(
+            "Location of the detections stored for a video with "
+            "`detect-and-track-video --detection_only` (a .npz file)."
+        ),
+    )
+    parser.add_argument(
+        "--annotations_file",
+        type=str,
+        required=True,
+        help=(
+            "Location of the csv file with the ground truth annotations "
+            "of the video, in VIA-tracks format."
+        ),
+    )
+    parser.add_argument(
+        "--config_file",
+        type=str,
+        default=DEFAULT_SWEEP_CONFIG,
+        help=(
+            "Location of YAML config with the values of the SORT "
+            "parameters to sweep. Default: "
+            "crabs-exploration/crabs/tracker/config/sweep_config.yaml. "
+        ),
+    )
+    parser.add_argument(
+        "--search",
+        type=str,
+        choices=["grid", "optuna"],
+        default="grid",
+        help=(
+            "Type of search: 'grid' evaluates all combinations of the "
+            "parameters values in the config, 'optuna' samples the number "
+            "of trials in the config within the range of each parameter. "
+            "Default: grid."
+        ),
+    )
+    parser.add_argument(
+        "--evaluation_iou_threshold",
+        type=float,
+        default=0.1,
+        help=(
+            "Minimum IoU between a tracked box and a ground truth box to "
+            "consider them a match. It is fixed across the sweep, so that "
+            "the MOTA values of all configs are comparable. Default: 0.1."
+        ),
+    )
+    parser.add_argument(
+        "--evaluation_matching",
+        type=str,
+        choices=MATCHING_METHODS,
+        default="optimal",
+        help=(
+            "Method to match tracked and ground truth boxes: 'optimal' "
+            "maximises the total IoU of the matches in each frame, 'greedy' "
+            "reproduces the results of earlier versions. Default: optimal."
+        ),
+    )
+    parser.add_argument(
+        "--cache_annotations",
+        action="store_true",
+        help=(
+            "Cache the parsed ground truth annotations in a file next to "
+            "the annotations file (<annotations-file>.cache.npz), so that "
+            "later evaluations with the same file skip parsing it."
+        ),
+    )
+    parser.add_argument(
+        "--n_workers",
+        type=int,
+        default=os.cpu_count(),
+        help=(
+            "Number of processes to evaluate configs in parallel. "
+            "Default: the number of CPUs."
+        ),
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Seed of the Optuna sampler. Default: 42.",
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default="sweep_output",
+        help=(
+            "Directory to save the table of results, named "
+            "sweep_results.csv. Default: sweep_output."
+        ),
+    )
+    return parser.parse_args(args)
+
+
+def app_wrapper():
+    """Wrap function to run the tracker sweep."""
+    logging.getLogger().setLevel(logging.INFO)
+
+    sweep_args = sweep_parse_args(sys.argv[1:])
+    main(sweep_args)
+
+
+if __name__ == "__main__":
+    app_wrapper()
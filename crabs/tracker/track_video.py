@@ -1,35 +1,68 @@
 """Track crabs in a video using a trained detector."""
 
 import argparse
+import copy
 import logging
+import math
+import os
+import pickle
+import queue
 import sys
+import threading
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
 
 import cv2
 import numpy as np
-import torch
-import torchvision.transforms.v2 as transforms
 import yaml  # type: ignore
 
-from crabs.detector.models import FasterRCNN
 from crabs.detector.utils.evaluate import (
     get_config_from_ckpt,
-    get_mlflow_parameters_from_ckpt,
+    get_trained_model_params_from_ckpt,
 )
-from crabs.tracker.evaluate_tracker import TrackerEvaluate
+from crabs.tracker.evaluate_tracker import MATCHING_METHODS, TrackerEvaluate
 from crabs.tracker.sort import Sort
+from crabs.tracker.utils.detections_store import (
+    DetectionsStoreWriter,
+    compute_file_hash,
+    get_detections_store_path,
+    read_detections_store,
+)
 from crabs.tracker.utils.io import (
-    generate_tracked_video,
+    VIDEO_EXTENSIONS,
+    TrackedDetectionsCSVWriter,
+    TrackedDetectionsNPZWriter,
+    get_video_parameters,
+    get_video_paths,
     open_video,
     parse_video_frame_reading_error_and_log,
-    write_all_video_frames_as_images,
-    write_tracked_detections_to_csv,
+    setup_video_writer_from_input_video,
+    write_frame_as_image,
+    write_frame_to_output_video,
+)
+from crabs.tracker.utils.pipeline import (
+    END_OF_STREAM,
+    PipelineStage,
+    PipelineStopped,
+    StageTimer,
+    get_from_queue,
+    put_in_queue,
 )
 from crabs.tracker.utils.tracking import (
+    compute_inference_frame_size,
     format_and_filter_bbox_predictions_for_sort,
+    rescale_detections_to_frame_size,
 )
 
+if TYPE_CHECKING:
+    # torch, torchvision and Lightning are imported when the detector is
+    # prepared, so that parsing the arguments and tracking stored
+    # detections do not need to import them
+    import torch
+
 DEFAULT_TRACKING_CONFIG = str(
     Path(__file__).parent / "config" / "tracking_config.yaml"
 )
@@ -42,10 +75,15 @@ class Tracking:
     ----------
     args : argparse.Namespace
         Command-line arguments containing configuration settings.
+    video_path : Optional[str]
+        Path to the input video. By default, None, which means
+        `args.video_path` is used.
 
     """
 
-    def __init__(self, args: argparse.Namespace) -> None:
+    def __init__(
+        self, args: argparse.Namespace, video_path: Optional[str] = None
+    ) -> None:
         """Initialise the tracking interface with the given arguments."""
         # CLI inputs and config file
         self.args = args
@@ -54,13 +92,13 @@ class Tracking:
 
         # trained model data
         self.trained_model_path = args.trained_model_path
-        trained_model_params = get_mlflow_parameters_from_ckpt(
+        trained_model_params = get_trained_model_params_from_ckpt(
             self.trained_model_path
         )
         # to log later in MLflow:
         self.trained_model_run_name = trained_model_params["run_name"]
-        self.trained_model_expt_name = trained_model_params[
-            "cli_args/experiment_name"
+        self.trained_model_expt_name = trained_model_params["cli_args"][
+            "experiment_name"
         ]
         self.trained_model_config = get_config_from_ckpt(
             config_file=None,
@@ -68,15 +106,119 @@ class Tracking:
         )
 
         # input video data
-        self.input_video_path = args.video_path
+        self.input_video_path = video_path or args.video_path
         self.input_video_file_root = Path(self.input_video_path).stem
 
         # tracking output directory root name
         self.tracking_output_dir_root = args.output_dir
         self.frame_name_format_str = "frame_{frame_idx:08d}.png"
 
+        # decoded frames are only kept in the tracking loop
+        # if they are written to the output
+        self.keep_decoded_frames = args.save_video or args.save_frames
+
         # hardware
         self.accelerator = "cuda" if args.accelerator == "gpu" else "cpu"
+        self.detection_batch_size = args.detection_batch_size
+        if self.detection_batch_size < 1:
+            raise ValueError(
+                "--detection_batch_size should be a positive integer."
+            )
+        self.decoded_frames_queue_size = args.decoded_frames_queue_size
+        self.detections_queue_size = args.detections_queue_size
+        if min(self.decoded_frames_queue_size, self.detections_queue_size) < 1:
+            # a queue of size 0 or less would have no limit
+            raise ValueError(
+                "--decoded_frames_queue_size and --detections_queue_size "
+                "should be positive integers."
+            )
+        self.flush_every_n_frames = args.flush_every_n_frames
+
+        # format of the output file(s) with the tracked bounding boxes
+        self.output_format = args.output_format
+
+        # frame stride of the detector: the tracker predicts the boxes in
+        # the frames in between (defaults to 1 for older config files)
+        self.detect_every_n_frames = self.config.get(
+            "detect_every_n_frames", 1
+        )
+        if (
+            not isinstance(self.detect_every_n_frames, int)
+            or isinstance(self.detect_every_n_frames, bool)
+            or self.detect_every_n_frames < 1
+        ):
+            raise ValueError(
+                "detect_every_n_frames in the tracking config should be a "
+                f"positive integer, got {self.detect_every_n_frames!r}."
+            )
+
+        # checkpoints to resume tracking: we round the interval up to a
+        # multiple of the frames spanned by a detection batch, so that
+        # after resuming the frames are batched as in an uninterrupted run
+        frames_per_batch = (
+            self.detection_batch_size * self.detect_every_n_frames
+        )
+        self.checkpoint_every_n_frames = (
+            math.ceil(args.checkpoint_every_n_frames / frames_per_batch)
+            * frames_per_batch
+        )
+        if args.resume and args.save_video:
+            raise ValueError(
+                "Resuming tracking is not supported when saving the "
+                "tracked video. Please run without --save_video."
+            )
+
+        # detection-only and tracking-only modes, using a store of
+        # raw detections per video and trained model
+        self.detection_only = args.detection_only
+        self.tracking_only = args.tracking_only
+        self.detections_dir = args.detections_dir
+        if self.detection_only and (
+            args.save_video
+            or args.save_frames
+            or args.annotations_file
+            or args.resume
+        ):
+            raise ValueError(
+                "--detection_only does not support --save_video, "
+                "--save_frames, --annotations_file or --resume."
+            )
+        # the checkpoint is hashed once per run, as it is shared by all
+        # the videos
+        self.trained_model_hash = (
+            compute_file_hash(self.trained_model_path)
+            if self.detection_only or self.tracking_only
+            else None
+        )
+
+        # reduced-resolution inference: frames are downscaled right after
+        # decoding, and the detected boxes are mapped back to the original
+        # frame size. The sizes are set per video in `prep_inference_size`
+        self.inference_scale = args.inference_scale
+        self.max_inference_side = args.max_inference_side
+        if not 0 < self.inference_scale <= 1 or (
+            self.max_inference_side is not None
+            and self.max_inference_side <= 0
+        ):
+            raise ValueError(
+                "--inference_scale should be in the interval (0, 1], and "
+                "--max_inference_side should be a positive integer."
+            )
+        self.frame_size: Optional[tuple[int, int]] = None
+        self.inference_frame_size: Optional[tuple[int, int]] = None
+
+        # online evaluation during tracking, if ground truth is passed
+        self.evaluation_log_every_n_frames = args.evaluation_log_every_n_frames
+        self.early_stop_mota = args.early_stop_mota
+        self.early_stop_min_frames = args.early_stop_min_frames
+        if self.early_stop_mota is not None and not args.annotations_file:
+            raise ValueError("--early_stop_mota requires --annotations_file.")
+        self.stopped_early = False
+
+        # first frame to track (0-based), and offset of the csv file
+        # to resume writing from; updated if resuming from a checkpoint
+        self.start_frame_idx = 0
+        self.csv_file_offset: Optional[int] = None
 
         # Prepare outputs:
         # output directory, csv, and if required video and frames
@@ -92,13 +234,12 @@ class Tracking:
 
         This method:
         - creates a timestamped directory to store the tracking output.
-          Optionally the timestamp can be omitted.
-        - sets the name of the output csv file for the tracked bounding boxes.
-        - sets up the output video path if required.
-        - sets up the frames subdirectory path if required.
+          Optionally the timestamp can be omitted. The timestamp is always
+          omitted when resuming, to continue tracking in the same directory.
+        - sets up the output file paths for the input video.
         """
         # Create output directory
-        if self.args.output_dir_no_timestamp:
+        if self.args.output_dir_no_timestamp or self.args.resume:
             self.tracking_output_dir = Path(self.tracking_output_dir_root)
         else:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -107,11 +248,37 @@ class Tracking:
             )
         self.tracking_output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Set name of output csv file
+        # Set up output file paths for the input video
+        self.prep_video_outputs()
+
+    def prep_video_outputs(self):
+        """Prepare the output file paths for the input video.
+
+        This method:
+        - sets the names of the output csv and npz files for the tracked
+          bounding boxes.
+        - sets the name of the checkpoint file to resume tracking.
+        - sets up the output video path if required.
+        - sets up the frames subdirectory path if required.
+
+        The output files are named after the input video, so that the output
+        of several videos can be saved in the same output directory.
+        """
+        # Set names of output csv and npz files
         self.csv_file_path = str(
             self.tracking_output_dir
             / f"{self.input_video_file_root}_tracks.csv"
         )
+        self.npz_file_path = str(
+            self.tracking_output_dir
+            / f"{self.input_video_file_root}_tracks.npz"
+        )
+
+        # Set name of checkpoint file
+        self.checkpoint_path = (
+            self.tracking_output_dir
+            / f"{self.input_video_file_root}_tracking_checkpoint.pkl"
+        )
 
         # Set up output video path if required
         if self.args.save_video:
@@ -130,15 +297,37 @@ class Tracking:
 
     def prep_detector_and_tracker(self):
         """Prepare the trained detector and the tracker for inference."""
+        self.prep_detector()
+        self.prep_tracker()
+
+    def prep_detector(self):
+        """Load the trained detector and define the inference transforms."""
         # TODO: use Lightning's Trainer?
+        import torch
+        import torchvision.transforms.v2 as transforms
 
-        # Load trained model
-        self.trained_model = FasterRCNN.load_from_checkpoint(
-            self.trained_model_path,
-            config=self.trained_model_config,  # config of trained model!
+        from crabs.detector.utils.bundle import (
+            is_detector_bundle,
+            load_detector_bundle,
         )
-        self.trained_model.eval()
-        self.trained_model.to(self.accelerator)
+
+        torch.set_float32_matmul_precision("medium")
+
+        # Load trained model, from an inference bundle exported with
+        # `export-detector` if possible, as it is faster to load
+        if is_detector_bundle(self.trained_model_path):
+            self.trained_model, _ = load_detector_bundle(
+                self.trained_model_path, device=self.accelerator
+            )
+        else:
+            from crabs.detector.models import FasterRCNN
+
+            self.trained_model = FasterRCNN.load_from_checkpoint(
+                self.trained_model_path,
+                config=self.trained_model_config,  # config of trained model!
+            )
+            self.trained_model.eval()
+            self.trained_model.to(self.accelerator)
 
         # Define transforms to apply to input frames
         self.inference_transforms = transforms.Compose(
@@ -148,22 +337,128 @@ class Tracking:
             ]
         )
 
-        # Initialise SORT tracker
+    def prep_inference_size(self):
+        """Set the size of the frames passed to the detector.
+
+        If a reduced inference resolution is requested, the frames of the
+        input video are downscaled to `inference_frame_size` before
+        detection. Otherwise `inference_frame_size` is None, and the frames
+        are passed to the detector at their original size. In tracking-only
+        mode the detector is not run, so it is always None.
+        """
+        self.frame_size = None
+        self.inference_frame_size = None
+        if self.tracking_only or (
+            self.inference_scale == 1 and self.max_inference_side is None
+        ):
+            return
+
+        video_parameters = get_video_parameters(self.input_video_path)
+        self.frame_size = (
+            video_parameters["frame_width"],
+            video_parameters["frame_height"],
+        )
+        self.inference_frame_size = compute_inference_frame_size(
+            self.frame_size, self.inference_scale, self.max_inference_side
+        )
+        if self.inference_frame_size is not None:
+            logging.info(
+                f"Frames of size {self.frame_size} are downscaled to "
+                f"{self.inference_frame_size} for detection"
+            )
+
+    def get_inference_size_suffix(self) -> str:
+        """Get the suffix identifying the inference resolution in filenames.
+
+        Returns
+        -------
+        str
+            An empty string if the frames are detected at their original
+            size, or a suffix with the requested inference scale or maximum
+            side otherwise.
+
+        """
+        if self.max_inference_side is not None:
+            return f"_maxside{self.max_inference_side}"
+        if self.inference_scale != 1:
+            return f"_scale{self.inference_scale:g}"
+        return ""
+
+    def prep_tracker(self):
+        """Initialise the SORT tracker.
+
+        A new tracker is created for every video, so that the track IDs of
+        each video start from 1.
+        """
         self.sort_tracker = Sort(
             max_age=self.config["max_age"],
             min_hits=self.config["min_hits"],
             iou_threshold=self.config["iou_threshold"],
+            gated_association=self.config.get("gated_association", False),
         )
 
-    def run_tracking(self, prediction_dict: dict) -> np.ndarray:
+    def for_video(self, video_path: str) -> "Tracking":
+        """Return a tracking interface for another input video.
+
+        The new interface shares the configuration, the output directory
+        and, if already loaded, the trained detector with this one, so that
+        several videos can be processed with a single model load.
+
+        Parameters
+        ----------
+        video_path : str
+            Path to the input video.
+
+        Returns
+        -------
+        Tracking
+            Tracking interface for the input video, with its own output
+            file paths and tracking state.
+
+        """
+        tracking = copy.copy(self)
+        tracking.input_video_path = video_path
+        tracking.input_video_file_root = Path(video_path).stem
+        tracking.start_frame_idx = 0
+        tracking.csv_file_offset = None
+        tracking.frame_size = None
+        tracking.inference_frame_size = None
+        tracking.prep_video_outputs()
+        return tracking
+
+    def is_detection_frame(self, frame_idx: int) -> bool:
+        """Return whether the detector runs on a frame.
+
+        The detector runs every `detect_every_n_frames` frames, except in
+        detection-only mode, where it runs on all frames so that the stored
+        detections can be tracked with any stride.
+
+        Parameters
+        ----------
+        frame_idx : int
+            Frame index (0-based).
+
+        Returns
+        -------
+        bool
+            True if the detector runs on the frame.
+
+        """
+        return (
+            self.detection_only or frame_idx % self.detect_every_n_frames == 0
+        )
+
+    def run_tracking(self, prediction_dict: Optional[dict]) -> np.ndarray:
         """Update the tracker with the latest prediction.
 
         Parameters
         ----------
-        prediction_dict : dict
+        prediction_dict : Optional[dict]
             Dictionary with data of the predicted bounding boxes.
             The keys are: "boxes", "scores", and "labels". The labels
             refer to the class of the object detected, and not its ID.
+            If None, the frame was skipped by the detector, and the tracker
+            predicts the boxes without updating.
 
         Returns
         -------
@@ -174,6 +469,10 @@ class Tracking:
             xmax, ymax, id).
 
         """
+        # if frame skipped by detector: only predict
+        if prediction_dict is None:
+            return self.sort_tracker.advance()
+
         # format predictions for SORT
         prediction_tensor = format_and_filter_bbox_predictions_for_sort(
             prediction_dict, self.config["score_threshold"]
@@ -186,6 +485,30 @@ class Tracking:
 
         return tracked_boxes_id_per_frame
 
+    def transform_frame(self, frame: np.ndarray) -> "torch.Tensor":
+        """Prepare a decoded frame for detection.
+
+        If a reduced inference resolution is set, the frame is first
+        downscaled, so that the inference transforms run on the smaller
+        frame.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            Decoded frame, as returned by OpenCV.
+
+        Returns
+        -------
+        torch.Tensor
+            Image tensor to pass to the detector.
+
+        """
+        if self.inference_frame_size is not None:
+            frame = cv2.resize(
+                frame, self.inference_frame_size, interpolation=cv2.INTER_AREA
+            )
+        return self.inference_transforms(frame)
+
     def run_detection(self, frame: np.ndarray) -> dict:
         """Run detection on a single frame.
 
@@ -198,131 +521,849 @@ class Tracking:
             The data is stored as torch tensors.
 
         """
-        # Apply transforms to frame and place tensor on devide
-        image_tensor = self.inference_transforms(frame).to(self.accelerator)
+        # Apply transforms to frame
+        image_tensor = self.transform_frame(frame)
+
+        # use [0] to select the one image in the batch
+        return self.run_detection_batch([image_tensor])[0]
+
+    def run_detection_batch(
+        self, images_tensors: list["torch.Tensor"]
+    ) -> list[dict]:
+        """Run detection on a batch of frames.
+
+        The frames are passed to the detector as a list of image tensors,
+        so that they are processed in a single forward pass.
+
+        Parameters
+        ----------
+        images_tensors : list[torch.Tensor]
+            List of frames to run detection on, prepared with
+            :meth:`transform_frame`.
+
+        Returns
+        -------
+        list[dict]:
+            List of dictionaries with data of the predicted bounding boxes,
+            one per input frame and in the same order. The keys are "boxes",
+            "scores", and "labels". The labels refer to the class of the
+            object detected, and not its ID. The data is stored as torch
+            tensors. The boxes are in the pixel coordinates of the original
+            frames, also if they were downscaled for detection.
+
+        """
+        import torch
 
-        # Add batch dimension
-        image_tensor = image_tensor.unsqueeze(0)
+        # Place tensors on device
+        images_tensors = [
+            image_tensor.to(self.accelerator)
+            for image_tensor in images_tensors
+        ]
 
         # Run detection
         with torch.no_grad():
-            # use [0] to select the one image in the batch
-            detections_dict = self.trained_model(image_tensor)[0]
+            detections_dicts = self.trained_model(images_tensors)
+
+        # Map boxes back to the original frame size if downscaled
+        if self.inference_frame_size is not None and self.frame_size:
+            detections_dicts = [
+                rescale_detections_to_frame_size(
+                    detections_dict,
+                    self.inference_frame_size,
+                    self.frame_size,
+                )
+                for detections_dict in detections_dicts
+            ]
 
-        return detections_dict
+        return detections_dicts
 
-    def core_detection_and_tracking(self):
-        """Run detection and tracking loop through all video frames.
+    def save_checkpoint(
+        self,
+        next_frame_idx: int,
+        tracks_writers: dict,
+        tracked_detections_to_keep: dict,
+        evaluation: Optional[TrackerEvaluate] = None,
+    ) -> None:
+        """Save a checkpoint to resume tracking from the next frame.
+
+        The output files with the tracked bounding boxes are written to disk
+        first. The checkpoint holds the state of the SORT tracker, the
+        offset of the csv file written so far, the tracked detections
+        kept for evaluation and the state of the online evaluation, if any.
+        It is written to a temporary file first, so that an interruption
+        while saving does not corrupt the previous checkpoint.
+
+        Parameters
+        ----------
+        next_frame_idx : int
+            Index (0-based) of the next frame to track.
+        tracks_writers : dict
+            Writers of the output files with the tracked detections of all
+            frames before `next_frame_idx`, as returned by
+            :meth:`prep_tracks_writers`.
+        tracked_detections_to_keep : dict
+            Tracked detections kept so far for evaluation.
+        evaluation : Optional[TrackerEvaluate]
+            Online evaluation of the tracked detections, if any.
+            Default: None.
+
+        """
+        # size in bytes of the csv file, or frames in the npz file
+        file_offsets = {
+            file_path: writer.tell()
+            for file_path, writer in tracks_writers.items()
+        }
+        checkpoint = {
+            "video_path": self.input_video_path,
+            "config": self.config,
+            "inference_frame_size": self.inference_frame_size,
+            "output_format": self.output_format,
+            "next_frame_idx": next_frame_idx,
+            "csv_file_offset": file_offsets.get(self.csv_file_path),
+            "sort_state": self.sort_tracker.state_dict(),
+            "tracked_detections_to_keep": tracked_detections_to_keep,
+            "evaluation_state": (
+                evaluation.online_state if evaluation is not None else None
+            ),
+        }
+        tmp_checkpoint_path = self.checkpoint_path.with_suffix(".tmp")
+        with open(tmp_checkpoint_path, "wb") as f:
+            pickle.dump(checkpoint, f)
+        os.replace(tmp_checkpoint_path, self.checkpoint_path)
+
+    def load_checkpoint(
+        self, evaluation: Optional[TrackerEvaluate] = None
+    ) -> dict:
+        """Load a checkpoint to resume tracking.
+
+        The state of the SORT tracker, the first frame to track and the
+        offset of the csv file are restored from the checkpoint.
 
-        Returns a dictionary with tracked bounding boxes per frame, and
-        with scores for each detection.
+        Parameters
+        ----------
+        evaluation : Optional[TrackerEvaluate]
+            Online evaluation of the tracked detections, whose state is
+            restored from the checkpoint. Default: None.
 
         Returns
         -------
-        dict:
-            A nested dictionary that maps frame indices (0-based) to a
-            dictionary with the following keys:
-            - "tracked_boxes", which contains the tracked bounding boxes as a
-            numpy array of shape (n, 5), where n is the number of tracked
-            boxes, and the 5 columns correspond to the values (xmin, ymin,
-            xmax, ymax, id).
-            - "scores", which contains the scores for each bounding box,
-            as a numpu array of shape (nboxes,)
+        dict
+            Tracked detections kept for evaluation up to the checkpoint.
 
         """
-        # Initialise dict to store tracked bboxes
-        tracked_detections_all_frames = {}
+        with open(self.checkpoint_path, "rb") as f:
+            checkpoint = pickle.load(f)
+
+        # Check checkpoint matches the current run
+        if Path(checkpoint["video_path"]).name != Path(
+            self.input_video_path
+        ).name or (
+            checkpoint["config"] != self.config
+            or checkpoint.get("inference_frame_size")
+            != self.inference_frame_size
+            or checkpoint.get("output_format", "csv") != self.output_format
+        ):
+            raise ValueError(
+                f"Checkpoint {self.checkpoint_path} was saved for a "
+                "different video, tracking config, inference resolution "
+                "or output format."
+            )
+        if (
+            evaluation is not None
+            and checkpoint.get("evaluation_state") is None
+        ):
+            raise ValueError(
+                f"Checkpoint {self.checkpoint_path} was saved without "
+                "evaluation. Please run without --annotations_file, or "
+                "without --resume."
+            )
+
+        if evaluation is not None:
+            evaluation.load_online_state(checkpoint["evaluation_state"])
 
+        self.start_frame_idx = checkpoint["next_frame_idx"]
+        self.csv_file_offset = checkpoint["csv_file_offset"]
+        self.sort_tracker.load_state_dict(checkpoint["sort_state"])
+        logging.info(
+            f"Resuming tracking from frame {self.start_frame_idx} "
+            f"using checkpoint {self.checkpoint_path}"
+        )
+        return checkpoint["tracked_detections_to_keep"]
+
+    def decode_frames(
+        self,
+        decoded_frames_queue: queue.Queue,
+        timer: StageTimer,
+        stop_event: threading.Event,
+    ) -> None:
+        """Decode the input video frames and apply the inference transforms.
+
+        This is the first stage of the tracking pipeline. If a reduced
+        inference resolution is set, the frames are downscaled right after
+        decoding. The transformed frames are put in the decoded frames
+        queue, followed by an end-of-stream sentinel. If the output video
+        or frames are required, the decoded frames are also passed down the
+        pipeline, so that the input video is decoded only once. If resuming,
+        the frames before `start_frame_idx` are skipped.
+        """
         # Open input video
         input_video_object = open_video(self.input_video_path)
         total_n_frames = int(input_video_object.get(cv2.CAP_PROP_FRAME_COUNT))
 
-        # Loop over frames
-        frame_idx = 0
-        while input_video_object.isOpened():
-            # Read frame
-            ret, frame = input_video_object.read()
-            if not ret:
-                parse_video_frame_reading_error_and_log(
-                    frame_idx, total_n_frames
+        try:
+            # Skip frames already tracked. We grab the frames sequentially
+            # rather than setting the position, as seeking is not
+            # frame-accurate for all codecs.
+            frame_idx = 0
+            with timer.busy():
+                while (
+                    frame_idx < self.start_frame_idx
+                    and input_video_object.grab()
+                ):
+                    frame_idx += 1
+
+            # Loop over frames
+            while input_video_object.isOpened():
+                with timer.busy():
+                    # Read frame
+                    ret, frame = input_video_object.read()
+                    if not ret:
+                        parse_video_frame_reading_error_and_log(
+                            frame_idx, total_n_frames
+                        )
+                        break
+
+                    # Apply transforms to frame if running detection
+                    image_tensor = (
+                        self.transform_frame(frame)
+                        if not self.tracking_only
+                        and self.is_detection_frame(frame_idx)
+                        else None
+                    )
+
+                put_in_queue(
+                    decoded_frames_queue,
+                    (
+                        frame_idx,
+                        frame if self.keep_decoded_frames else None,
+                        image_tensor,
+                    ),
+                    timer,
+                    stop_event,
                 )
+
+                # Update frame index
+                frame_idx += 1
+
+            put_in_queue(
+                decoded_frames_queue, END_OF_STREAM, timer, stop_event
+            )
+
+        finally:
+            # Release video object
+            input_video_object.release()
+
+    def detect_frames(
+        self,
+        decoded_frames_queue: queue.Queue,
+        detections_queue: queue.Queue,
+        timer: StageTimer,
+        stop_event: threading.Event,
+    ) -> None:
+        """Run detection on batches of decoded frames.
+
+        This is the second stage of the tracking pipeline. Decoded frames
+        are accumulated in batches of `detection_batch_size` frames to
+        detect, and the detections are put in the detections queue in frame
+        order, followed by an end-of-stream sentinel. Frames skipped by the
+        detector are passed down the pipeline in order, with None detections.
+        """
+        frames_idcs_batch: list[int] = []
+        frames_batch: list[Optional[np.ndarray]] = []
+        images_tensors_batch: list[Optional[torch.Tensor]] = []
+        n_images_to_detect = 0
+        end_of_stream = False
+        while not end_of_stream:
+            item = get_from_queue(decoded_frames_queue, timer, stop_event)
+            end_of_stream = item is END_OF_STREAM
+            if not end_of_stream:
+                frames_idcs_batch.append(item[0])
+                frames_batch.append(item[1])
+                images_tensors_batch.append(item[2])
+                n_images_to_detect += item[2] is not None
+
+            # Run detection on batch, or pass skipped frames through
+            if frames_idcs_batch and (
+                end_of_stream
+                or n_images_to_detect in (0, self.detection_batch_size)
+            ):
+                with timer.busy():
+                    detections_dicts = iter(
+                        self.run_detection_batch(
+                            [t for t in images_tensors_batch if t is not None]
+                        )
+                        if n_images_to_detect > 0
+                        else []
+                    )
+                for frame_idx, frame, image_tensor in zip(
+                    frames_idcs_batch, frames_batch, images_tensors_batch
+                ):
+                    put_in_queue(
+                        detections_queue,
+                        (
+                            frame_idx,
+                            frame,
+                            None
+                            if image_tensor is None
+                            else next(detections_dicts),
+                        ),
+                        timer,
+                        stop_event,
+                    )
+                frames_idcs_batch = []
+                frames_batch = []
+                images_tensors_batch = []
+                n_images_to_detect = 0
+
+        put_in_queue(detections_queue, END_OF_STREAM, timer, stop_event)
+
+    def load_detections(
+        self,
+        decoded_frames_queue: queue.Queue,
+        detections_queue: queue.Queue,
+        timer: StageTimer,
+        stop_event: threading.Event,
+    ) -> None:
+        """Load the detections of each frame from the detections store.
+
+        This replaces the detection stage of the pipeline in tracking-only
+        mode. The stored detections are put in the detections queue in frame
+        order, followed by an end-of-stream sentinel. If the output video or
+        frames are required, each frame is taken from the decoded frames
+        queue and passed down the pipeline with its detections.
+        """
+        stored_detections = read_detections_store(
+            self.detections_store_path, self.start_frame_idx
+        )
+        item = None
+        for frame_idx, detections_dict in stored_detections:
+            frame = None
+            if self.keep_decoded_frames:
+                item = get_from_queue(decoded_frames_queue, timer, stop_event)
+                if item is END_OF_STREAM:
+                    break
+                frame = item[1]
+            put_in_queue(
+                detections_queue,
+                (
+                    frame_idx,
+                    frame,
+                    detections_dict
+                    if self.is_detection_frame(frame_idx)
+                    else None,
+                ),
+                timer,
+                stop_event,
+            )
+
+        # Drain decoded frames queue, so that the decoding stage can finish
+        if self.keep_decoded_frames:
+            while item is not END_OF_STREAM:
+                item = get_from_queue(decoded_frames_queue, timer, stop_event)
+
+        put_in_queue(detections_queue, END_OF_STREAM, timer, stop_event)
+
+    def store_detections(
+        self,
+        detections_queue: queue.Queue,
+        timer: StageTimer,
+        stop_event: threading.Event,
+    ) -> None:
+        """Save the detections of all frames to the detections store.
+
+        This replaces the tracking stage of the pipeline in detection-only
+        mode. The store is only written once the detections of all frames
+        are collected.
+        """
+        detections_store = DetectionsStoreWriter(self.detections_store_path)
+        while True:
+            item = get_from_queue(detections_queue, timer, stop_event)
+            if item is END_OF_STREAM:
                 break
+            with timer.busy():
+                frame_idx, _, detections_dict = item
+                detections_store.add_frame(frame_idx, detections_dict)
 
-            # Run detection per frame
-            detections_dict = self.run_detection(frame)
+        with timer.busy():
+            detections_store.save()
 
-            # Update tracking
-            tracked_boxes_array = self.run_tracking(detections_dict)
+    def get_tracks_file_paths(self) -> list[str]:
+        """Get the paths of the output files with the tracked bounding boxes.
 
-            # Add data to dict; key is frame index (0-based) for input clip
-            tracked_detections_all_frames[frame_idx] = {
-                "tracked_boxes": tracked_boxes_array[:, :-1],
-                "ids": tracked_boxes_array[:, -1],  # IDs are the last column
-                "scores": detections_dict["scores"],
-            }
+        Returns
+        -------
+        list[str]
+            Paths of the csv and/or npz files, depending on the output
+            format.
 
-            # Update frame index
-            frame_idx += 1
+        """
+        return {
+            "csv": [self.csv_file_path],
+            "npz": [self.npz_file_path],
+            "both": [self.csv_file_path, self.npz_file_path],
+        }[self.output_format]
+
+    def prep_tracks_writers(
+        self,
+    ) -> dict[
+        str, Union[TrackedDetectionsCSVWriter, TrackedDetectionsNPZWriter]
+    ]:
+        """Set up the writers of the output files with the tracked boxes.
+
+        If resuming from a checkpoint, the writers append to the existing
+        files after the frames already tracked.
 
-        # Release video object
-        input_video_object.release()
+        Returns
+        -------
+        dict[str, TrackedDetectionsCSVWriter | TrackedDetectionsNPZWriter]
+            Writer of each output file, with the file path as key.
 
-        return tracked_detections_all_frames
+        """
+        tracks_writers: dict = {}
+        for file_path in self.get_tracks_file_paths():
+            if file_path == self.csv_file_path:
+                tracks_writers[file_path] = TrackedDetectionsCSVWriter(
+                    file_path,
+                    frame_name_regexp=self.frame_name_format_str,
+                    flush_every_n_frames=self.flush_every_n_frames,
+                    file_offset=self.csv_file_offset,
+                )
+            else:
+                tracks_writers[file_path] = TrackedDetectionsNPZWriter(
+                    file_path, resume_n_frames=self.start_frame_idx or None
+                )
+        return tracks_writers
+
+    def track_detections(  # noqa: C901
+        self,
+        detections_queue: queue.Queue,
+        tracked_detections_to_keep: dict,
+        frames_to_keep: set[int],
+        timer: StageTimer,
+        stop_event: threading.Event,
+        evaluation: Optional[TrackerEvaluate] = None,
+    ) -> None:
+        """Update the tracker with the detections of each frame.
+
+        This is the last stage of the tracking pipeline. The tracked
+        detections of each frame are written to the output csv file as
+        they are computed, and/or collected and saved to the output npz
+        file. The tracked detections of the frames in
+        `frames_to_keep` are also added to the input dictionary, with the
+        frame index (0-based) as key. If required, each frame is also
+        written to the output video with its tracked bounding boxes, and as
+        an image file to the frames subdirectory. If required, a checkpoint
+        to resume tracking is saved every `checkpoint_every_n_frames`
+        frames. If an online evaluation is passed, the tracked detections
+        of each frame are evaluated as they are computed (see
+        :meth:`evaluate_frame`), and the pipeline is stopped if tracking
+        should stop early.
+        """
+        # Set up csv and/or npz writers (appending to the existing files
+        # if resuming)
+        tracks_writers = self.prep_tracks_writers()
 
-    def detect_and_track_video(self) -> None:
-        """Run detection and tracking on input video."""
-        # Prepare detector and tracker
-        # - Load trained model
-        # - Define transforms
-        # - Initialise SORT tracker
-        self.prep_detector_and_tracker()
+        # Set up output video writer following input video parameters
+        if self.args.save_video:
+            output_video_writer = setup_video_writer_from_input_video(
+                self.input_video_path, self.output_video_path
+            )
 
-        # Run detection and tracking over all frames in video
-        tracked_bboxes_dict = self.core_detection_and_tracking()
+        try:
+            while True:
+                item = get_from_queue(detections_queue, timer, stop_event)
+                if item is END_OF_STREAM:
+                    break
+
+                with timer.busy():
+                    frame_idx, frame, detections_dict = item
+
+                    # Update tracking
+                    tracked_boxes_array = self.run_tracking(detections_dict)
+
+                    # Format tracked detections of this frame, with the
+                    # score of the detection each box was updated with
+                    # (NaN if the frame was skipped by the detector)
+                    tracked_detections_one_frame = {
+                        "tracked_boxes": tracked_boxes_array[:, :-1],
+                        "ids": tracked_boxes_array[:, -1],  # IDs: last col
+                        "scores": self.sort_tracker.output_scores,
+                    }
+
+                    # Write tracked detections to csv and/or npz file
+                    for writer in tracks_writers.values():
+                        writer.write_frame(
+                            frame_idx, **tracked_detections_one_frame
+                        )
+
+                    # Evaluate tracked detections if required
+                    stop_early = (
+                        evaluation is not None
+                        and self.evaluate_frame(
+                            evaluation, frame_idx, tracked_detections_one_frame
+                        )
+                    )
+
+                    # Add data to dict if required; key is frame index
+                    # (0-based) for input clip
+                    if frame_idx in frames_to_keep:
+                        tracked_detections_to_keep[frame_idx] = (
+                            tracked_detections_one_frame
+                        )
+
+                    # Write frame to output video if required
+                    if self.args.save_video:
+                        write_frame_to_output_video(
+                            frame,
+                            tracked_detections_one_frame,
+                            output_video_writer,
+                        )
+
+                    # Write frame to file if required
+                    if self.args.save_frames:
+                        write_frame_as_image(
+                            frame,
+                            str(
+                                self.frames_subdir
+                                / self.frame_name_format_str.format(
+                                    frame_idx=frame_idx
+                                )
+                            ),
+                        )
+
+                    # Save checkpoint if required
+                    if (
+                        self.checkpoint_every_n_frames > 0
+                        and (frame_idx + 1) % self.checkpoint_every_n_frames
+                        == 0
+                    ):
+                        self.save_checkpoint(
+                            frame_idx + 1,
+                            tracks_writers,
+                            tracked_detections_to_keep,
+                            evaluation,
+                        )
+
+                # Stop the other stages of the pipeline if stopping early
+                if stop_early:
+                    self.stopped_early = True
+                    stop_event.set()
+                    break
+        finally:
+            # Flush remaining rows and close csv file, and save npz file
+            for writer in tracks_writers.values():
+                writer.close()
+
+            # Release output video object
+            if self.args.save_video:
+                output_video_writer.release()
+
+    def evaluate_frame(
+        self,
+        evaluation: TrackerEvaluate,
+        frame_idx: int,
+        tracked_detections_one_frame: dict,
+    ) -> bool:
+        """Evaluate the tracked detections of a frame during tracking.
+
+        The running MOTA is logged every `evaluation_log_every_n_frames`
+        frames, and checked against `early_stop_mota` after each
+        annotated frame.
+
+        Parameters
+        ----------
+        evaluation : TrackerEvaluate
+            Online evaluation, started with
+            :meth:`TrackerEvaluate.start_online_evaluation`.
+        frame_idx : int
+            Frame index (0-based) of the tracked detections.
+        tracked_detections_one_frame : dict
+            Tracked detections of the frame.
+
+        Returns
+        -------
+        bool
+            Whether tracking should stop early, because the running MOTA
+            is below `early_stop_mota`.
+
+        """
+        mota = evaluation.update(frame_idx, tracked_detections_one_frame)
+        if (
+            self.evaluation_log_every_n_frames > 0
+            and (frame_idx + 1) % self.evaluation_log_every_n_frames == 0
+        ):
+            logging.info(
+                f"Running MOTA at frame {frame_idx}: "
+                f"{evaluation.get_running_mota():f}"
+            )
+
+        if mota is None or self.early_stop_mota is None:
+            return False
+        n_evaluated_frames = len(evaluation.online_state["results"]["MOTA"])
+        running_mota = evaluation.get_running_mota()
+        if (
+            n_evaluated_frames >= self.early_stop_min_frames
+            and running_mota < self.early_stop_mota
+        ):
+            logging.warning(
+                f"Stopping tracking early at frame {frame_idx}: running "
+                f"MOTA {running_mota:f} over {n_evaluated_frames} annotated "
+                f"frames is below {self.early_stop_mota}. The output only "
+                "includes the frames tracked until now."
+            )
+            return True
+        return False
+
+    def core_detection_and_tracking(  # noqa: C901
+        self,
+        frames_to_keep: Optional[Iterable[int]] = None,
+        evaluation: Optional[TrackerEvaluate] = None,
+    ) -> dict:
+        """Run detection and tracking loop through all video frames.
+
+        The loop runs as a pipeline of three stages connected by bounded
+        queues, so that decoding, detection and tracking overlap:
+        - a decoding thread reads the frames and applies the inference
+          transforms,
+        - the main thread runs detection on batches of frames, and
+        - a tracking thread updates the tracker in frame order, and
+          writes the tracked detections to the output csv file, and the
+          output video and frames if required.
+
+        The tracked detections are streamed to the csv file, so memory use
+        does not grow with the length of the video. Only the tracked
+        detections of the frames in `frames_to_keep` are returned.
+
+        If resuming and a checkpoint exists, tracking continues from the
+        checkpointed frame, and the output is identical to that of an
+        uninterrupted run. The checkpoint is removed once all frames are
+        tracked, but kept if tracking stops early.
+
+        Parameters
+        ----------
+        frames_to_keep : Optional[Iterable[int]]
+            Frame indices (0-based) whose tracked detections are returned.
+            By default, None, which means no frames are kept in memory.
+        evaluation : Optional[TrackerEvaluate]
+            If passed, an online evaluation started with
+            :meth:`TrackerEvaluate.start_online_evaluation`, which is fed
+            the tracked detections of each frame during tracking. Tracking
+            stops early if required (see :meth:`evaluate_frame`).
+            Default: None.
+
+        Returns
+        -------
+        dict:
+            A nested dictionary that maps the frame indices (0-based) in
+            `frames_to_keep` to a dictionary with the following keys:
+            - "tracked_boxes", which contains the tracked bounding boxes as a
+            numpy array of shape (n, 5), where n is the number of tracked
+            boxes, and the 5 columns correspond to the values (xmin, ymin,
+            xmax, ymax, id).
+            - "scores", which contains the scores for each bounding box,
+            as a numpy array of shape (nboxes,)
+
+        """
+        # Initialise dict to store tracked bboxes of the required frames
+        tracked_detections_to_keep: dict = {}
+        frames_to_keep = set(frames_to_keep or [])
+
+        # Set size of the frames passed to the detector
+        self.prep_inference_size()
+
+        # Restore state from checkpoint if resuming
+        if self.args.resume and self.checkpoint_path.exists():
+            tracked_detections_to_keep = self.load_checkpoint(evaluation)
+        elif self.args.resume:
+            logging.info(
+                f"No checkpoint found at {self.checkpoint_path}, "
+                "tracking from the first frame"
+            )
 
-        # Write list of tracked bounding boxes to csv
-        write_tracked_detections_to_csv(
-            self.csv_file_path,
-            tracked_bboxes_dict,
-            frame_name_regexp=self.frame_name_format_str,
+        # Set up queues between stages
+        decoded_frames_queue: queue.Queue = queue.Queue(
+            maxsize=self.decoded_frames_queue_size
+        )
+        detections_queue: queue.Queue = queue.Queue(
+            maxsize=self.detections_queue_size
         )
 
-        # Generate tracked video if required
-        # (it loops again thru frames)
-        if self.args.save_video:
-            generate_tracked_video(
-                self.input_video_path,
-                self.output_video_path,
-                tracked_bboxes_dict,
+        # Set up timers and threads for the stages. The first and last
+        # stages run in threads, and the middle stage in the main thread.
+        # In detection-only mode, the last stage stores the detections;
+        # in tracking-only mode, the middle stage loads them, and frames
+        # are only decoded if they are written to the output.
+        stop_event = threading.Event()
+        run_decoding = not self.tracking_only or self.keep_decoded_frames
+        middle_stage_name = "loading" if self.tracking_only else "detection"
+        stage_names = [
+            *(["decoding"] if run_decoding else []),
+            middle_stage_name,
+            "storing" if self.detection_only else "tracking",
+        ]
+        timers = {stage: StageTimer(stage) for stage in stage_names}
+        threaded_stages = []
+        if run_decoding:
+            threaded_stages.append(
+                PipelineStage(
+                    "decoding",
+                    lambda: self.decode_frames(
+                        decoded_frames_queue, timers["decoding"], stop_event
+                    ),
+                    stop_event,
+                )
+            )
+        if self.detection_only:
+            threaded_stages.append(
+                PipelineStage(
+                    "storing",
+                    lambda: self.store_detections(
+                        detections_queue, timers["storing"], stop_event
+                    ),
+                    stop_event,
+                )
+            )
+        else:
+            threaded_stages.append(
+                PipelineStage(
+                    "tracking",
+                    lambda: self.track_detections(
+                        detections_queue,
+                        tracked_detections_to_keep,
+                        frames_to_keep,
+                        timers["tracking"],
+                        stop_event,
+                        evaluation,
+                    ),
+                    stop_event,
+                )
             )
-            logging.info(f"Tracked video saved to {self.output_video_path}")
 
-        # Write frames if required
-        # (it loops again thru frames)
-        if self.args.save_frames:
-            write_all_video_frames_as_images(
+        # Run detection (or loading) stage in the main thread
+        middle_stage = (
+            self.load_detections if self.tracking_only else self.detect_frames
+        )
+        for stage in threaded_stages:
+            stage.start()
+        try:
+            middle_stage(
+                decoded_frames_queue,
+                detections_queue,
+                timers[middle_stage_name],
+                stop_event,
+            )
+        except PipelineStopped:
+            pass
+        except BaseException:
+            stop_event.set()
+            raise
+        finally:
+            for stage in threaded_stages:
+                stage.join_and_raise()
+
+        # Log time each stage was busy or waiting
+        for timer in timers.values():
+            timer.log()
+
+        # Remove checkpoint once all frames are tracked. If the pipeline
+        # was stopped (early, or by an error), the checkpoint is kept so
+        # that tracking can be resumed from it.
+        if not stop_event.is_set():
+            self.checkpoint_path.unlink(missing_ok=True)
+
+        return tracked_detections_to_keep
+
+    def detect_and_track_video(self) -> None:
+        """Run detection and tracking on input video.
+
+        In detection-only mode, the raw detections are saved to the
+        detections store and no tracking is run. In tracking-only mode, the
+        detections are loaded from the store and the detector is not run.
+        """
+        # Set path to detections store if required
+        if self.detection_only or self.tracking_only:
+            # the checkpoint is hashed in these two modes (see __init__)
+            assert self.trained_model_hash is not None
+            self.detections_store_path = get_detections_store_path(
+                self.detections_dir,
                 self.input_video_path,
-                self.frames_subdir,
-                self.frame_name_format_str,
+                self.trained_model_hash,
+                suffix=self.get_inference_size_suffix(),
             )
-            logging.info(
-                "Input frames saved to "
-                f"{self.tracking_output_dir / self.frames_subdir}"
+        if self.tracking_only and not self.detections_store_path.exists():
+            raise FileNotFoundError(
+                f"No stored detections found at {self.detections_store_path}."
+                " Please run with --detection_only first."
             )
 
-        # Evaluate tracker if ground truth is passed
+        # Prepare detector if required and not loaded yet
+        # (it is shared across videos)
+        # - Load trained model
+        # - Define transforms
+        if not self.tracking_only and not hasattr(self, "trained_model"):
+            self.prep_detector()
+
+        # Initialise a new SORT tracker for this video
+        self.prep_tracker()
+
+        # In detection-only mode: store detections of all frames
+        if self.detection_only:
+            self.core_detection_and_tracking()
+            logging.info(f"Detections saved to {self.detections_store_path}")
+            return
+
+        # If ground truth is passed: load it before tracking, to
+        # evaluate the tracked detections of each frame during tracking
+        evaluation = None
         if self.args.annotations_file:
             evaluation = TrackerEvaluate(
                 self.args.annotations_file,
-                tracked_bboxes_dict,
+                {},
                 self.config["iou_threshold"],
                 self.tracking_output_dir,
+                matching=self.args.evaluation_matching,
+                use_cache=self.args.cache_annotations,
             )
-            evaluation.run_evaluation()
+            evaluation.start_online_evaluation()
+
+        # Run detection and tracking over all frames in video
+        # (tracked bounding boxes are written to csv during the loop)
+        self.core_detection_and_tracking(evaluation=evaluation)
+        for tracks_file_path in self.get_tracks_file_paths():
+            logging.info(f"Tracked bounding boxes saved to {tracks_file_path}")
+
+        # Tracked video and frames are written during the
+        # detection and tracking loop
+        if self.args.save_video:
+            logging.info(f"Tracked video saved to {self.output_video_path}")
+        if self.args.save_frames:
+            logging.info(
+                "Input frames saved to "
+                f"{self.tracking_output_dir / self.frames_subdir}"
+            )
+
+        # Save and log evaluation metrics if ground truth is passed
+        if evaluation is not None:
+            evaluation.finish_online_evaluation()
 
 
 def main(args) -> None:
-    """Run detection+tracking inference on video.
+    """Run detection+tracking inference on one or more videos.
+
+    The trained detector is loaded once and used for all videos. Each video
+    is tracked with its own SORT tracker, so track IDs start from 1 in
+    every video. If `n_concurrent_videos` is larger than 1, several videos
+    are processed concurrently in separate threads sharing the detector.
 
     Parameters
     ----------
@@ -334,9 +1375,30 @@ def main(args) -> None:
         None
 
     """
-    inference = Tracking(args)
+    # Get list of input videos
+    video_paths = get_video_paths(args.video_path)
+    if args.annotations_file and len(video_paths) > 1:
+        raise ValueError(
+            "Ground truth annotations can only be passed "
+            "for a single input video."
+        )
+
+    # Load trained detector once for all videos
+    inference = Tracking(args, video_path=video_paths[0])
+    if not args.tracking_only:
+        inference.prep_detector()
 
-    inference.detect_and_track_video()
+    def _detect_and_track_one_video(video_path: str) -> None:
+        logging.info(f"Tracking video {video_path}")
+        inference.for_video(video_path).detect_and_track_video()
+
+    if args.n_concurrent_videos > 1:
+        with ThreadPoolExecutor(args.n_concurrent_videos) as executor:
+            # consume the results to re-raise any exception
+            list(executor.map(_detect_and_track_one_video, video_paths))
+    else:
+        for video_path in video_paths:
+            _detect_and_track_one_video(video_path)
 
 
 def tracking_parse_args(args):
@@ -346,13 +1408,24 @@ def tracking_parse_args(args):
         "--trained_model_path",
         type=str,
         required=True,
-        help="Location of trained model (a .ckpt file). ",
+        help=(
+            "Location of trained model (a .ckpt file), or of an inference "
+            "bundle exported from it with `export-detector`."
+        ),
     )
     parser.add_argument(
         "--video_path",
         type=str,
+        nargs="+",
         required=True,
-        help="Location of the video to be tracked.",
+        help=(
+            "Location of the video(s) to be tracked. "
+            "It can be one or more video files, directories or glob "
+            "patterns (in quotes). For a directory, all the "
+            f"{', '.join(VIDEO_EXTENSIONS)} files in it are tracked. "
+            "All videos are tracked with a single load of the trained model, "
+            "and their output is saved in the same output directory."
+        ),
     )
     parser.add_argument(
         "--config_file",
@@ -417,6 +1490,60 @@ def tracking_parse_args(args):
             "If passed, the evaluation metrics for the tracker are computed."
         ),
     )
+    parser.add_argument(
+        "--evaluation_matching",
+        type=str,
+        choices=MATCHING_METHODS,
+        default="optimal",
+        help=(
+            "Method to match tracked and ground truth boxes when computing "
+            "the evaluation metrics: 'optimal' maximises the total IoU of "
+            "the matches in each frame, 'greedy' reproduces the results of "
+            "earlier versions. Default: optimal."
+        ),
+    )
+    parser.add_argument(
+        "--cache_annotations",
+        action="store_true",
+        help=(
+            "Cache the parsed ground truth annotations in a file next to "
+            "the annotations file (<annotations-file>.cache.npz), so that "
+            "later evaluations with the same file skip parsing it."
+        ),
+    )
+    parser.add_argument(
+        "--evaluation_log_every_n_frames",
+        type=int,
+        default=1000,
+        help=(
+            "Number of frames after which the MOTA averaged across the "
+            "annotated frames tracked so far is logged. The tracked "
+            "detections are evaluated during tracking, so they are not "
+            "kept in memory. If 0, the running MOTA is not logged. "
+            "Only relevant if --annotations_file is passed. Default: 1000."
+        ),
+    )
+    parser.add_argument(
+        "--early_stop_mota",
+        type=float,
+        default=None,
+        help=(
+            "If passed, tracking stops early if the MOTA averaged across "
+            "the annotated frames tracked so far is below this value, "
+            "after at least --early_stop_min_frames annotated frames. "
+            "Requires --annotations_file. Default: None (no early stop)."
+        ),
+    )
+    parser.add_argument(
+        "--early_stop_min_frames",
+        type=int,
+        default=10,
+        help=(
+            "Minimum number of annotated frames tracked before tracking "
+            "can stop early. Only relevant if --early_stop_mota is passed. "
+            "Default: 10."
+        ),
+    )
     parser.add_argument(
         "--accelerator",
         type=str,
@@ -426,6 +1553,155 @@ def tracking_parse_args(args):
             "Valid inputs are: cpu or gpu. Default: gpu."
         ),
     )
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument(
+        "--detection_only",
+        action="store_true",
+        help=(
+            "Only run the detector, and save the raw detections of all "
+            "frames to the detections directory. The stored detections are "
+            "identified by the hashes of the trained model and the video, "
+            "and can be tracked later with --tracking_only. "
+        ),
+    )
+    mode_group.add_argument(
+        "--tracking_only",
+        action="store_true",
+        help=(
+            "Only run the tracker, using the detections stored for the "
+            "trained model and video in the detections directory by a "
+            "previous run with --detection_only. The detector is not loaded, "
+            "so this mode can run quickly on a CPU. "
+        ),
+    )
+    parser.add_argument(
+        "--detections_dir",
+        type=str,
+        default="detections",
+        help=(
+            "Directory for the raw detections stored in detection-only mode "
+            "and loaded in tracking-only mode. Default: detections. "
+        ),
+    )
+    parser.add_argument(
+        "--n_concurrent_videos",
+        type=int,
+        default=1,
+        help=(
+            "Number of videos to track concurrently, sharing the trained "
+            "model. Only relevant if several videos are passed. Default: 1."
+        ),
+    )
+    inference_size_group = parser.add_mutually_exclusive_group()
+    inference_size_group.add_argument(
+        "--inference_scale",
+        type=float,
+        default=1.0,
+        help=(
+            "Factor in the interval (0, 1] to downscale the frames by "
+            "before detection. The frames are downscaled right after "
+            "decoding, which reduces the cost of preparing them for the "
+            "detector, and the detected boxes are mapped back to the "
+            "original frame size. Stored detections are identified by "
+            "this value. Default: 1.0 (no downscaling)."
+        ),
+    )
+    inference_size_group.add_argument(
+        "--max_inference_side",
+        type=int,
+        default=None,
+        help=(
+            "Maximum size in pixels of the longest side of the frames "
+            "passed to the detector. Larger frames are downscaled keeping "
+            "their aspect ratio, as with --inference_scale. "
+            "Default: None (no downscaling)."
+        ),
+    )
+    parser.add_argument(
+        "--detection_batch_size",
+        type=int,
+        default=1,
+        help=(
+            "Number of frames to pass to the detector at once. "
+            "The detections of each batch are passed to the tracker "
+            "in frame order. "
+            "Larger values reduce the per-call overhead of the detector "
+            "at the cost of memory on the accelerator. Default: 1."
+        ),
+    )
+    parser.add_argument(
+        "--decoded_frames_queue_size",
+        type=int,
+        default=8,
+        help=(
+            "Maximum number of decoded frames waiting for detection "
+            "(the maximum depth of the queue, at least 1). "
+            "Frames are decoded in a separate thread, so that decoding "
+            "overlaps with detection. Larger values use more memory. "
+            "Default: 8."
+        ),
+    )
+    parser.add_argument(
+        "--detections_queue_size",
+        type=int,
+        default=8,
+        help=(
+            "Maximum number of frames' detections waiting for tracking "
+            "(the maximum depth of the queue, at least 1). "
+            "Tracking runs in a separate thread, so that it overlaps with "
+            "detection. Default: 8."
+        ),
+    )
+    parser.add_argument(
+        "--output_format",
+        type=str,
+        choices=["csv", "npz", "both"],
+        default="csv",
+        help=(
+            "Format of the output file with the tracked bounding boxes. "
+            "'csv' writes a csv file in VIA tracks format, which can be "
+            "loaded in the VIA tool to correct the tracks. 'npz' writes a "
+            "compressed numpy file with the tracks as arrays and an index "
+            "of the rows of each frame, which is much smaller and faster "
+            "to read for analysis. 'both' writes both files. "
+            "Default: csv."
+        ),
+    )
+    parser.add_argument(
+        "--flush_every_n_frames",
+        type=int,
+        default=100,
+        help=(
+            "Number of frames after which the tracked bounding boxes are "
+            "written to the output csv file. The tracked bounding boxes are "
+            "written during tracking, so memory use does not grow with the "
+            "length of the video. Default: 100."
+        ),
+    )
+    parser.add_argument(
+        "--checkpoint_every_n_frames",
+        type=int,
+        default=0,
+        help=(
+            "Number of frames after which a checkpoint is saved to the "
+            "output directory, to resume tracking with --resume if the "
+            "run is interrupted. The value is rounded up to a multiple of "
+            "the number of frames spanned by a detection batch, i.e. "
+            "--detection_batch_size times the detect_every_n_frames "
+            "parameter of the tracking config. If 0, no checkpoints are "
+            "saved. Default: 0."
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Resume tracking from the checkpoint in the output directory, "
+            "if it exists. The output directory is used without appending "
+            "a timestamp. The output is identical to that of an "
+            "uninterrupted run. Not supported with --save_video. "
+        ),
+    )
     parser.add_argument(
         "--max_frames_to_read",
         type=int,
@@ -445,8 +1721,6 @@ def app_wrapper():
     """Wrap function to run the tracking application."""
     logging.getLogger().setLevel(logging.INFO)
 
-    torch.set_float32_matmul_precision("medium")
-
     tracking_args = tracking_parse_args(sys.argv[1:])
     main(tracking_args)
 
@@ -0,0 +1,310 @@
+"""Spatial index to find pairs of overlapping bounding boxes."""
+
+from typing import Optional
+
+import numpy as np
+
+# Multiplier to combine the column and row of a grid cell in a single key.
+# Cell rows must be smaller than this value in absolute terms.
+CELL_KEY_MULTIPLIER = 2**32
+
+# Maximum number of grid cells a box is registered in or looked up in.
+# Larger boxes, such as a few boxes much larger than the median, are
+# compared with all the boxes instead, so that the number of cell entries
+# does not grow with the square of their size.
+MAX_CELLS_PER_BOX = 64
+
+
+def iou_pairs(
+    boxes_a: np.ndarray, boxes_b: np.ndarray, pixel_inclusive: bool = False
+) -> np.ndarray:
+    """Compute the IOU between pairs of bounding boxes.
+
+    Parameters
+    ----------
+    boxes_a : np.ndarray
+        Array of shape (K, 4) with bounding boxes in the format
+        [x1, y1, x2, y2].
+    boxes_b : np.ndarray
+        Array of shape (K, 4) with bounding boxes in the format
+        [x1, y1, x2, y2].
+    pixel_inclusive : bool
+        If True, the coordinates are taken as inclusive pixel indices, so
+        that the width of a box is x2 - x1 + 1, as in
+        :meth:`TrackerEvaluate.calculate_iou`. Otherwise the width of a box
+        is x2 - x1, as in :func:`crabs.tracker.utils.sort.iou_batch`.
+        Default: False.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (K,) with the IOU between `boxes_a[k]` and
+        `boxes_b[k]`.
+
+    """
+    offset = 1 if pixel_inclusive else 0
+    xx1 = np.maximum(boxes_a[:, 0], boxes_b[:, 0])
+    yy1 = np.maximum(boxes_a[:, 1], boxes_b[:, 1])
+    xx2 = np.minimum(boxes_a[:, 2], boxes_b[:, 2])
+    yy2 = np.minimum(boxes_a[:, 3], boxes_b[:, 3])
+    w = np.maximum(0.0, xx2 - xx1 + offset)
+    h = np.maximum(0.0, yy2 - yy1 + offset)
+    wh = w * h
+    return wh / (
+        (boxes_a[:, 2] - boxes_a[:, 0] + offset)
+        * (boxes_a[:, 3] - boxes_a[:, 1] + offset)
+        + (boxes_b[:, 2] - boxes_b[:, 0] + offset)
+        * (boxes_b[:, 3] - boxes_b[:, 1] + offset)
+        - wh
+    )
+
+
+def _count_cells(cells: np.ndarray) -> np.ndarray:
+    """Count the grid cells in each range of cells.
+
+    The counts are floats, so that they do not overflow for huge boxes.
+    """
+    n_cols = np.maximum(cells[:, 2] - cells[:, 0] + 1, 0).astype(float)
+    n_rows = np.maximum(cells[:, 3] - cells[:, 1] + 1, 0).astype(float)
+    return n_cols * n_rows
+
+
+def _expand_to_cells(
+    cells: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Expand ranges of grid cells to one entry per cell.
+
+    Parameters
+    ----------
+    cells : np.ndarray
+        Array of shape (N, 4) with the first and last columns and rows of
+        the grid cells covered by each box, as
+        [col_start, row_start, col_end, row_end]. Boxes whose last column
+        or row is before the first one cover no cells.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The index of the box and the key of the cell of each entry.
+
+    """
+    n_cols = np.maximum(cells[:, 2] - cells[:, 0] + 1, 0)
+    n_rows = np.maximum(cells[:, 3] - cells[:, 1] + 1, 0)
+    n_cells = n_cols * n_rows
+    box_idx = np.repeat(np.arange(len(cells)), n_cells)
+
+    # position of each entry among the cells of its box
+    cell_idx_in_box = np.arange(n_cells.sum()) - np.repeat(
+        np.cumsum(n_cells) - n_cells, n_cells
+    )
+    n_rows_per_entry = n_rows[box_idx]
+    col = cells[box_idx, 0] + cell_idx_in_box // n_rows_per_entry
+    row = cells[box_idx, 1] + cell_idx_in_box % n_rows_per_entry
+    return box_idx, col * CELL_KEY_MULTIPLIER + row
+
+
+class BoxGridIndex:
+    """Uniform grid index over a set of bounding boxes.
+
+    Each box is registered in all the square cells of the grid that it
+    covers, so that the boxes that may overlap with a query box are found
+    by looking up only the cells covered by the query box. If the cells are
+    about the size of the boxes, each box covers a few cells, and finding
+    the overlapping pairs between N query boxes and M indexed boxes takes
+    about O(N + M) time and memory, rather than O(N * M) for a full IOU
+    matrix.
+
+    Boxes that cover more than `MAX_CELLS_PER_BOX` cells, whether indexed
+    or queried, are not expanded to cells, but compared with all the boxes.
+
+    Boxes with non-finite coordinates are not indexed, and are never
+    returned as overlapping a query box.
+
+    Parameters
+    ----------
+    boxes : np.ndarray
+        Array of shape (M, 4) with the bounding boxes to index, in the
+        format [x1, y1, x2, y2]. Any additional columns are ignored.
+    cell_size : Optional[float]
+        Side of the grid cells, in pixels. By default, None, which means
+        the median of the longest side of the boxes is used.
+
+    """
+
+    def __init__(
+        self, boxes: np.ndarray, cell_size: Optional[float] = None
+    ) -> None:
+        """Build the index."""
+        self.boxes = np.asarray(boxes)[:, :4]
+        valid = np.isfinite(self.boxes).all(axis=1)
+        if cell_size is None:
+            sides = np.maximum(
+                self.boxes[valid, 2] - self.boxes[valid, 0],
+                self.boxes[valid, 3] - self.boxes[valid, 1],
+            )
+            cell_size = float(np.median(sides)) if len(sides) else 1.0
+        self.cell_size = max(cell_size, 1.0)
+
+        # sort the (box, cell) entries by cell key, registering inverted
+        # boxes (with x2 < x1 or y2 < y1) over the cells between their
+        # corners, as they may still overlap a query box with a margin
+        self.valid_box_idx = np.flatnonzero(valid)
+        corners = self.boxes[self.valid_box_idx].reshape(-1, 2, 2)
+        cells = self.get_cells(
+            np.hstack([corners.min(axis=1), corners.max(axis=1)])
+        )
+
+        # boxes covering too many cells are kept apart
+        large = _count_cells(cells) > MAX_CELLS_PER_BOX
+        self.large_box_idx = self.valid_box_idx[large]
+        small_box_idx = self.valid_box_idx[~large]
+
+        box_idx, cell_keys = _expand_to_cells(cells[~large])
+        order = np.argsort(cell_keys, kind="stable")
+        self.cell_keys = cell_keys[order]
+        self.cell_box_idx = small_box_idx[box_idx[order]]
+
+    def get_cells(self, boxes: np.ndarray, margin: float = 0.0) -> np.ndarray:
+        """Get the range of grid cells covered by each box.
+
+        Parameters
+        ----------
+        boxes : np.ndarray
+            Array of shape (N, 4) with bounding boxes in the format
+            [x1, y1, x2, y2].
+        margin : float
+            Margin added to all sides of the boxes, in pixels. Default: 0.
+
+        Returns
+        -------
+        np.ndarray
+            Integer array of shape (N, 4) with the first and last columns
+            and rows of the cells covered by each box, as
+            [col_start, row_start, col_end, row_end].
+
+        """
+        return np.floor(
+            (boxes[:, :4] + np.array([-margin, -margin, margin, margin]))
+            / self.cell_size
+        ).astype(np.int64)
+
+    def query(
+        self, query_boxes: np.ndarray, margin: float = 0.0
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the pairs of query and indexed boxes that overlap.
+
+        Parameters
+        ----------
+        query_boxes : np.ndarray
+            Array of shape (N, 4) with bounding boxes in the format
+            [x1, y1, x2, y2]. Any additional columns are ignored.
+        margin : float
+            Pairs are returned if their intersection is larger than
+            `-margin` along both axes. By default, 0, which means only
+            pairs of boxes with a non-empty intersection are returned.
+            Use 1 for boxes with inclusive pixel coordinates.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            Indices of the query boxes and of the indexed boxes of each
+            pair, sorted by query box and then by indexed box.
+
+        """
+        query_boxes = np.asarray(query_boxes)[:, :4]
+        valid_idx = np.flatnonzero(np.isfinite(query_boxes).all(axis=1))
+        cells = self.get_cells(query_boxes[valid_idx], margin)
+        large = _count_cells(cells) > MAX_CELLS_PER_BOX
+        small_query_idx = valid_idx[~large]
+        large_query_idx = valid_idx[large]
+        query_idx, query_keys = _expand_to_cells(cells[~large])
+        query_idx = small_query_idx[query_idx]
+
+        # find the indexed entries in the same cell as each query entry
+        starts = np.searchsorted(self.cell_keys, query_keys, side="left")
+        counts = (
+            np.searchsorted(self.cell_keys, query_keys, side="right") - starts
+        )
+        entry_idx = np.arange(counts.sum()) + np.repeat(
+            starts - (np.cumsum(counts) - counts), counts
+        )
+        # add the pairs with the large boxes: large query boxes are
+        # paired with all indexed boxes, and the other query boxes with
+        # the large indexed boxes
+        pair_query_idx = np.concatenate(
+            [
+                np.repeat(query_idx, counts),
+                np.repeat(small_query_idx, len(self.large_box_idx)),
+                np.repeat(large_query_idx, len(self.valid_box_idx)),
+            ]
+        )
+        pair_box_idx = np.concatenate(
+            [
+                self.cell_box_idx[entry_idx],
+                np.tile(self.large_box_idx, len(small_query_idx)),
+                np.tile(self.valid_box_idx, len(large_query_idx)),
+            ]
+        )
+
+        # remove pairs found in several cells, and sort them
+        pair_keys = np.unique(pair_query_idx * len(self.boxes) + pair_box_idx)
+        pair_query_idx, pair_box_idx = np.divmod(pair_keys, len(self.boxes))
+
+        # keep pairs that overlap
+        q = query_boxes[pair_query_idx]
+        b = self.boxes[pair_box_idx]
+        overlap = (
+            np.minimum(q[:, 2], b[:, 2]) - np.maximum(q[:, 0], b[:, 0])
+            > -margin
+        ) & (
+            np.minimum(q[:, 3], b[:, 3]) - np.maximum(q[:, 1], b[:, 1])
+            > -margin
+        )
+        return pair_query_idx[overlap], pair_box_idx[overlap]
+
+
+def sparse_iou(
+    boxes_a: np.ndarray,
+    boxes_b: np.ndarray,
+    pixel_inclusive: bool = False,
+    index: Optional[BoxGridIndex] = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Compute the IOU between the pairs of boxes that overlap.
+
+    The result is a sparse version of the IOU matrix between the two sets
+    of boxes: all pairs not returned have an IOU of zero.
+
+    Parameters
+    ----------
+    boxes_a : np.ndarray
+        Array of shape (N, 4) with bounding boxes in the format
+        [x1, y1, x2, y2]. Any additional columns are ignored.
+    boxes_b : np.ndarray
+        Array of shape (M, 4) with bounding boxes in the format
+        [x1, y1, x2, y2]. Any additional columns are ignored.
+    pixel_inclusive : bool
+        Whether the coordinates are inclusive pixel indices (see
+        :func:`iou_pairs`). Default: False.
+    index : Optional[BoxGridIndex]
+        Index over `boxes_b`, to reuse across queries. By default, None,
+        which means a new index is built.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        Row indices (into `boxes_a`), column indices (into `boxes_b`) and
+        IOU values of the pairs with a non-zero IOU, sorted by row and then
+        by column.
+
+    """
+    boxes_a = np.asarray(boxes_a)
+    boxes_b = np.asarray(boxes_b)
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0)
+
+    if index is None:
+        index = BoxGridIndex(boxes_b)
+    rows, cols = index.query(boxes_a, margin=1 if pixel_inclusive else 0)
+    ious = iou_pairs(boxes_a[rows, :4], boxes_b[cols, :4], pixel_inclusive)
+    nonzero = ious != 0
+    return rows[nonzero], cols[nonzero], ious[nonzero]
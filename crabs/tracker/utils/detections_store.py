@@ -0,0 +1,202 @@
+"""Utility functions for storing the raw detections of a video on disk."""
+
+import hashlib
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+
+# Number of bytes read from the start and the end of a video to compute
+# its (partial) hash
+VIDEO_HASH_CHUNK_SIZE = 2**20
+
+
+def compute_file_hash(file_path: str, partial: bool = False) -> str:
+    """Compute the SHA-256 hash of a file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file.
+    partial : bool
+        If True, only the size of the file and its first and last
+        `VIDEO_HASH_CHUNK_SIZE` bytes are hashed. This is much faster for
+        large video files, and in practice enough to identify them.
+        Default: False.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest of the hash.
+
+    """
+    file_hash = hashlib.sha256()
+    file_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        if partial:
+            file_hash.update(str(file_size).encode())
+            file_hash.update(f.read(VIDEO_HASH_CHUNK_SIZE))
+            f.seek(max(file_size - VIDEO_HASH_CHUNK_SIZE, 0))
+            file_hash.update(f.read(VIDEO_HASH_CHUNK_SIZE))
+        else:
+            for chunk in iter(lambda: f.read(VIDEO_HASH_CHUNK_SIZE), b""):
+                file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_detections_store_path(
+    detections_dir: str,
+    video_path: str,
+    trained_model_hash: str,
+    suffix: str = "",
+) -> Path:
+    """Get the path to the detections store of a video and a trained model.
+
+    The filename includes the hashes of the trained model checkpoint and
+    of the video, so that stored detections are only reused for the
+    same model and video. The checkpoint hash is passed in, so that a
+    large checkpoint is only hashed once for several videos.
+
+    Parameters
+    ----------
+    detections_dir : str
+        Directory with the detections stores.
+    video_path : str
+        Path to the input video.
+    trained_model_hash : str
+        Hash of the trained model checkpoint, as returned by
+        :func:`compute_file_hash`.
+    suffix : str
+        Suffix appended to the filename, to identify detections computed
+        with different settings (e.g. inference resolution). Default: "".
+
+    Returns
+    -------
+    Path
+        Path to the detections store, named
+        <video-name>_detections_<checkpoint-hash>_<video-hash><suffix>.npz
+
+    """
+    video_hash = compute_file_hash(video_path, partial=True)
+    return Path(detections_dir) / (
+        f"{Path(video_path).stem}_detections_"
+        f"{trained_model_hash[:16]}_{video_hash[:16]}{suffix}.npz"
+    )
+
+
+class DetectionsStoreWriter:
+    """Collect the raw detections of a video and save them to disk.
+
+    The detections of all frames are saved in a single compressed .npz
+    file, as arrays concatenated across frames:
+    - "boxes": array of shape (n, 4) with the boxes as
+      (xmin, ymin, xmax, ymax).
+    - "scores": array of shape (n,) with the detection scores.
+    - "labels": array of shape (n,) with the detection labels.
+    - "frame_offsets": array of shape (n_frames + 1,), such that the
+      detections of frame `i` are at rows
+      `frame_offsets[i]:frame_offsets[i + 1]`.
+
+    Parameters
+    ----------
+    store_path : Path
+        Path to the output .npz file.
+
+    """
+
+    def __init__(self, store_path: Path):
+        """Initialise an empty store."""
+        self.store_path = Path(store_path)
+        self.boxes: list[np.ndarray] = []
+        self.scores: list[np.ndarray] = []
+        self.labels: list[np.ndarray] = []
+        self.n_detections_per_frame: list[int] = []
+
+    def add_frame(self, frame_idx: int, detections_dict: dict) -> None:
+        """Add the detections of the next frame.
+
+        Parameters
+        ----------
+        frame_idx : int
+            Frame index (0-based). Frames must be added in order.
+        detections_dict : dict
+            Dictionary with the detections of the frame as torch tensors,
+            with keys "boxes", "scores" and "labels".
+
+        """
+        if frame_idx != len(self.n_detections_per_frame):
+            raise ValueError(
+                f"Expected detections of frame "
+                f"{len(self.n_detections_per_frame)}, got frame {frame_idx}."
+            )
+        self.boxes.append(detections_dict["boxes"].cpu().numpy())
+        self.scores.append(detections_dict["scores"].cpu().numpy())
+        self.labels.append(detections_dict["labels"].cpu().numpy())
+        self.n_detections_per_frame.append(len(self.scores[-1]))
+
+    def save(self) -> None:
+        """Save the detections to disk.
+
+        The store is written to a temporary file first, so that an
+        incomplete store is never read.
+        """
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_store_path = self.store_path.with_suffix(".tmp.npz")
+        np.savez_compressed(
+            tmp_store_path,
+            boxes=np.concatenate(self.boxes or [np.empty((0, 4))]).astype(
+                np.float32
+            ),
+            scores=np.concatenate(self.scores or [np.empty(0)]).astype(
+                np.float32
+            ),
+            labels=np.concatenate(self.labels or [np.empty(0)]).astype(
+                np.int64
+            ),
+            frame_offsets=np.concatenate(
+                [[0], np.cumsum(self.n_detections_per_frame)]
+            ).astype(np.int64),
+        )
+        os.replace(tmp_store_path, self.store_path)
+
+
+def read_detections_store(
+    store_path: Path, start_frame_idx: int = 0
+) -> Iterator[tuple[int, dict]]:
+    """Read the detections of each frame from a detections store.
+
+    Parameters
+    ----------
+    store_path : Path
+        Path to the .npz file written with :class:`DetectionsStoreWriter`.
+    start_frame_idx : int
+        Index (0-based) of the first frame to read. Default: 0.
+
+    Yields
+    ------
+    tuple[int, dict]
+        Frame index (0-based) and dictionary with the detections of the
+        frame as torch tensors, with keys "boxes", "scores" and "labels",
+        as returned by the detector.
+
+    """
+    # torch is slow to import, and only needed here
+    import torch
+
+    with np.load(store_path) as store:
+        boxes = store["boxes"]
+        scores = store["scores"]
+        labels = store["labels"]
+        frame_offsets = store["frame_offsets"]
+
+    for frame_idx in range(start_frame_idx, len(frame_offsets) - 1):
+        start, end = frame_offsets[frame_idx], frame_offsets[frame_idx + 1]
+        yield (
+            frame_idx,
+            {
+                "boxes": torch.from_numpy(boxes[start:end]),
+                "scores": torch.from_numpy(scores[start:end]),
+                "labels": torch.from_numpy(labels[start:end]),
+            },
+        )
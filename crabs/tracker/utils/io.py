@@ -1,13 +1,101 @@
 """Utility functions for handling input and output operations."""
 
 import csv
+import glob
+import json
 import logging
+import os
+from collections.abc import Iterable, Iterator
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Union
 
 import cv2
 import numpy as np
 
-from crabs.detector.utils.visualization import draw_bbox
+if TYPE_CHECKING:
+    # pandas is imported when reading VIA tracks files, as it is slow
+    # to import
+    import pandas as pd
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov")
+
+# Maximum number of frames decoded sequentially to reach the next frame
+# to read, beyond which the video is seeked instead, if the keyframes of
+# the video are not known. Seeking decodes the video from the previous
+# keyframe, so it only pays off for gaps longer than the keyframe interval
+# (GOP). 250 is x264's default maximum keyframe interval.
+MAX_GRAB_GAP = 250
+
+
+def get_file_paths(
+    paths: list[str], name_endings: tuple[str, ...], file_type: str
+) -> list[str]:
+    """Get the list of files from a list of paths.
+
+    Each path can be a file, a directory or a glob pattern. For a
+    directory, all the files in it (non-recursively) whose name ends with
+    one of `name_endings` are selected, case-insensitive. Hidden files are
+    ignored.
+
+    Parameters
+    ----------
+    paths : list[str]
+        List of files, directories or glob patterns.
+    name_endings : tuple[str, ...]
+        Lowercase endings of the names of the files to select in
+        directories, such as file extensions.
+    file_type : str
+        Description of the files, used in error messages.
+
+    Returns
+    -------
+    list[str]
+        List of files, sorted within each input path and without
+        duplicates.
+
+    """
+    files: list[str] = []
+    for path in paths:
+        if Path(path).is_dir():
+            matches = [
+                str(p)
+                for p in Path(path).iterdir()
+                if p.name.lower().endswith(name_endings)
+                and not p.name.startswith(".")
+            ]
+        elif any(char in path for char in "*?["):
+            matches = [p for p in glob.glob(path) if Path(p).is_file()]
+        else:
+            matches = [path]
+
+        if not matches:
+            raise ValueError(f"No {file_type} files found for {path}")
+        files.extend(p for p in sorted(matches) if p not in files)
+
+    return files
+
+
+def get_video_paths(video_paths: list[str]) -> list[str]:
+    """Get the list of video files from a list of paths.
+
+    Each path can be a video file, a directory or a glob pattern. For a
+    directory, all the video files in it (non-recursively) with one of the
+    extensions in `VIDEO_EXTENSIONS` are selected, case-insensitive.
+    Hidden files are ignored.
+
+    Parameters
+    ----------
+    video_paths : list[str]
+        List of video files, directories or glob patterns.
+
+    Returns
+    -------
+    list[str]
+        List of video files, sorted within each input path and without
+        duplicates.
+
+    """
+    return get_file_paths(video_paths, VIDEO_EXTENSIONS, "video")
 
 
 def open_video(video_path: str) -> cv2.VideoCapture:
@@ -18,6 +106,117 @@ def open_video(video_path: str) -> cv2.VideoCapture:
     return video_object
 
 
+def get_video_keyframe_indices(video_path: str) -> Optional[np.ndarray]:
+    """Get the indices of the keyframes of a video.
+
+    The packets of the video are read without decoding them, which is much
+    faster than decoding the video. This requires OpenCV's FFmpeg backend.
+    The packets are in decoding order, so for codecs with B-frames the
+    indices may be off by a few frames.
+
+    Parameters
+    ----------
+    video_path : str
+        Path to the video file.
+
+    Returns
+    -------
+    Optional[np.ndarray]
+        Sorted 0-based indices of the keyframes, or None if they cannot be
+        determined.
+
+    """
+    if not hasattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME"):
+        return None
+
+    # read the raw packets, without decoding them
+    video_object = cv2.VideoCapture(
+        video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1]
+    )
+    keyframe_indices = []
+    frame_idx = 0
+    while video_object.grab():
+        if video_object.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+            keyframe_indices.append(frame_idx)
+        frame_idx += 1
+    video_object.release()
+
+    # the first frame of a video is a keyframe
+    if not keyframe_indices or keyframe_indices[0] != 0:
+        return None
+    return np.array(keyframe_indices)
+
+
+def read_video_frames(
+    video_object: cv2.VideoCapture,
+    frame_indices: Iterable[int],
+    keyframe_indices: Optional[np.ndarray] = None,
+) -> Iterator[tuple[int, Optional[np.ndarray]]]:
+    """Read selected frames of a video, decoding it sequentially.
+
+    Setting the position of the video before reading each frame decodes
+    the video from the previous keyframe every time, and is not
+    frame-accurate for all codecs. Instead, the frames in between are
+    grabbed, which decodes them without converting them to images, and
+    only the selected frames are retrieved. The video is only seeked to go
+    back, or to skip to a frame whose previous keyframe is after the
+    current position, as then seeking decodes fewer frames.
+
+    Parameters
+    ----------
+    video_object : cv2.VideoCapture
+        Opened video capture. The frames are read from its current
+        position.
+    frame_indices : Iterable[int]
+        0-based indices of the frames to read. They should be sorted in
+        ascending order, as going back requires seeking.
+    keyframe_indices : Optional[np.ndarray]
+        Sorted indices of the keyframes of the video, as returned by
+        :func:`get_video_keyframe_indices`. Pass `[0]` to never seek
+        forward. If None, the video is seeked to skip more than
+        `MAX_GRAB_GAP` frames. Default: None.
+
+    Yields
+    ------
+    tuple[int, Optional[np.ndarray]]
+        Index and image of each selected frame. If a frame cannot be read,
+        its image is None and no further frames are read.
+
+    """
+    next_frame_idx = int(video_object.get(cv2.CAP_PROP_POS_FRAMES))
+    frame = None
+    for frame_idx in frame_indices:
+        # repeated index: return the last frame again
+        if frame is not None and frame_idx == next_frame_idx - 1:
+            yield frame_idx, frame
+            continue
+
+        # seek if it decodes fewer frames than grabbing up to the frame
+        if keyframe_indices is not None:
+            previous_keyframe_idx = keyframe_indices[
+                np.searchsorted(keyframe_indices, frame_idx, side="right") - 1
+            ]
+            seek = previous_keyframe_idx > next_frame_idx
+        else:
+            seek = frame_idx - next_frame_idx > MAX_GRAB_GAP
+        if seek or frame_idx < next_frame_idx:
+            video_object.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            next_frame_idx = frame_idx
+
+        # grab up to the selected frame, and only retrieve that one
+        success = True
+        while success and next_frame_idx <= frame_idx:
+            success = video_object.grab()
+            next_frame_idx += 1
+        if success:
+            success, frame = video_object.retrieve()
+
+        if not success or frame is None:
+            yield frame_idx, None
+            return
+        yield frame_idx, frame
+
+
 def get_video_parameters(video_path: str) -> dict:
     """Get total number of frames, frame width and height, and fps of video."""
     # Open video
@@ -42,63 +241,597 @@ def get_video_parameters(video_path: str) -> dict:
     return video_parameters
 
 
-def write_tracked_detections_to_csv(
-    csv_file_path: str,
-    tracked_bboxes_dict: dict,
-    frame_name_regexp: str = "frame_{frame_idx:08d}.png",
-    all_frames_size: int = 8888,
-):
-    """Write tracked detections to a csv file."""
-    # Initialise csv file
-    csv_file = open(  # noqa: SIM115
-        csv_file_path,
-        "w",
-    )
-    csv_writer = csv.writer(csv_file)
+class TrackedDetectionsCSVWriter:
+    """Write tracked detections to a csv file, one frame at a time.
 
-    # write header following VIA convention
-    # https://www.robots.ox.ac.uk/~vgg/software/via/docs/face_track_annotation.html
-    csv_writer.writerow(
-        (
-            "filename",
-            "file_size",
-            "file_attributes",
-            "region_count",
-            "region_id",
-            "region_shape_attributes",
-            "region_attributes",
-        )
-    )
+    The csv file follows the VIA tracks format. Rows are buffered and
+    flushed to disk every `flush_every_n_frames` frames, so that memory
+    use does not grow with the length of the video, and so that the
+    rows written up to the last flush are preserved if the process is
+    interrupted.
+
+    Parameters
+    ----------
+    csv_file_path : str
+        Path to the output csv file.
+    frame_name_regexp : str
+        The format to follow for the frame filenames in the csv file.
+        Default: "frame_{frame_idx:08d}.png".
+    all_frames_size : int
+        Value for the "file_size" column. Default: 8888.
+    flush_every_n_frames : int
+        Number of frames to buffer before writing their rows to disk.
+        Default: 1.
+    file_offset : Optional[int]
+        If passed, an existing csv file is truncated to this offset in
+        bytes, and rows are appended to it without writing the header.
+        Used to resume writing from the offset returned by :meth:`tell`.
+        Default: None.
+
+    """
 
-    # write detections
-    # loop thru frames
-    for frame_idx in tracked_bboxes_dict:
+    def __init__(
+        self,
+        csv_file_path: str,
+        frame_name_regexp: str = "frame_{frame_idx:08d}.png",
+        all_frames_size: int = 8888,
+        flush_every_n_frames: int = 1,
+        file_offset: Optional[int] = None,
+    ):
+        """Open the csv file and write the header."""
+        self.frame_name_regexp = frame_name_regexp
+        self.all_frames_size = all_frames_size
+        self.flush_every_n_frames = flush_every_n_frames
+        self.buffered_rows: list[tuple] = []
+        self.n_buffered_frames = 0
+
+        # Resume writing existing csv file if required
+        if file_offset is not None:
+            self.csv_file = open(csv_file_path, "r+")  # noqa: SIM115
+            self.csv_file.truncate(file_offset)
+            self.csv_file.seek(file_offset)
+            self.csv_writer = csv.writer(self.csv_file)
+            return
+
+        # Initialise csv file
+        self.csv_file = open(csv_file_path, "w")  # noqa: SIM115
+        self.csv_writer = csv.writer(self.csv_file)
+
+        # write header following VIA convention
+        # https://www.robots.ox.ac.uk/~vgg/software/via/docs/face_track_annotation.html
+        self.csv_writer.writerow(
+            (
+                "filename",
+                "file_size",
+                "file_attributes",
+                "region_count",
+                "region_id",
+                "region_shape_attributes",
+                "region_attributes",
+            )
+        )
+        self.csv_file.flush()
+
+    def write_frame(
+        self,
+        frame_idx: int,
+        tracked_boxes: np.ndarray,
+        ids: np.ndarray,
+        scores: np.ndarray,
+    ) -> None:
+        """Add the tracked detections of one frame to the csv file.
+
+        Parameters
+        ----------
+        frame_idx : int
+            Frame index (0-based) in the input video.
+        tracked_boxes : np.ndarray
+            Array of shape (n, 4) with the tracked bounding boxes as
+            (xmin, ymin, xmax, ymax).
+        ids : np.ndarray
+            Array of shape (n,) with the track IDs.
+        scores : np.ndarray
+            Array of shape (n,) with the detection scores.
+
+        """
         # loop thru all boxes in frame
-        for bbox, id, pred_score in zip(
-            tracked_bboxes_dict[frame_idx]["tracked_boxes"],
-            tracked_bboxes_dict[frame_idx]["ids"],
-            tracked_bboxes_dict[frame_idx]["scores"],
-        ):
+        for bbox, id, pred_score in zip(tracked_boxes, ids, scores):
             # extract shape
             xmin, ymin, xmax, ymax = bbox
             width_box = int(xmax - xmin)
             height_box = int(ymax - ymin)
 
-            # Add to csv
-            csv_writer.writerow(
+            # format score as a Python float, so that the output does
+            # not depend on the input type (tensor or array)
+            confidence = float(pred_score)
+
+            # Add to buffer
+            self.buffered_rows.append(
                 (
-                    frame_name_regexp.format(
+                    self.frame_name_regexp.format(
                         frame_idx=frame_idx
                     ),  # f"frame_{frame_idx:08d}.png",  # frame index!
-                    all_frames_size,  # frame size
+                    self.all_frames_size,  # frame size
                     '{{"clip":{}}}'.format("123"),
                     1,
                     0,
                     f'{{"name":"rect","x":{xmin},"y":{ymin},"width":{width_box},"height":{height_box}}}',
-                    f'{{"track":"{int(id)}", "confidence":"{pred_score}"}}',
+                    f'{{"track":"{int(id)}", "confidence":"{confidence}"}}',
                 )
             )
 
+        # Flush buffered rows if required
+        self.n_buffered_frames += 1
+        if self.n_buffered_frames >= self.flush_every_n_frames:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered rows to disk."""
+        self.csv_writer.writerows(self.buffered_rows)
+        self.csv_file.flush()
+        self.buffered_rows = []
+        self.n_buffered_frames = 0
+
+    def tell(self) -> int:
+        """Write the buffered rows to disk and return the file offset.
+
+        Returns
+        -------
+        int
+            Size in bytes of the csv file written so far.
+
+        """
+        self.flush()
+        return self.csv_file.tell()
+
+    def close(self) -> None:
+        """Write any buffered rows and close the csv file."""
+        self.flush()
+        self.csv_file.close()
+
+    def __enter__(self) -> "TrackedDetectionsCSVWriter":
+        """Return the writer when used as a context manager."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Close the csv file when exiting the context."""
+        self.close()
+
+
+def write_tracked_detections_to_csv(
+    csv_file_path: str,
+    tracked_bboxes_dict: dict,
+    frame_name_regexp: str = "frame_{frame_idx:08d}.png",
+    all_frames_size: int = 8888,
+):
+    """Write tracked detections to a csv file."""
+    with TrackedDetectionsCSVWriter(
+        csv_file_path,
+        frame_name_regexp=frame_name_regexp,
+        all_frames_size=all_frames_size,
+        flush_every_n_frames=len(tracked_bboxes_dict),
+    ) as csv_writer:
+        # loop thru frames
+        for frame_idx in tracked_bboxes_dict:
+            csv_writer.write_frame(
+                frame_idx,
+                tracked_bboxes_dict[frame_idx]["tracked_boxes"],
+                tracked_bboxes_dict[frame_idx]["ids"],
+                tracked_bboxes_dict[frame_idx]["scores"],
+            )
+
+
+class TrackedDetectionsNPZWriter:
+    """Collect the tracked detections of a video and save them to disk.
+
+    The tracked detections of all frames are saved in a single compressed
+    .npz file, as arrays concatenated across frames:
+    - "boxes": array of shape (n, 4) with the tracked boxes as
+      (xmin, ymin, xmax, ymax).
+    - "ids": array of shape (n,) with the track IDs.
+    - "scores": array of shape (n,) with the score of the detection each
+      tracked box was updated with, NaN for boxes predicted without a
+      detection (e.g. in frames skipped by the detector).
+    - "frame_offsets": array of shape (n_frames + 1,), such that the
+      tracked detections of frame `i` are at rows
+      `frame_offsets[i]:frame_offsets[i + 1]`.
+
+    This is much smaller and faster to read than the csv file in VIA
+    tracks format (see :func:`read_tracks_npz`).
+
+    As a compressed .npz file cannot be appended to, the tracked detections
+    are kept in memory (about 30 bytes per tracked box) and the whole file
+    is written by :meth:`save`. This happens at every checkpoint (see
+    :meth:`tell`) and when the writer is closed, so the file on disk holds
+    the frames up to the last checkpoint if the process is interrupted.
+
+    Parameters
+    ----------
+    npz_file_path : str
+        Path to the output .npz file.
+    resume_n_frames : Optional[int]
+        If passed, the tracked detections of the first `resume_n_frames`
+        frames are loaded from an existing file, and frames are added
+        after them. Used to resume writing from the number of frames
+        returned by :meth:`tell`. Default: None.
+
+    """
+
+    def __init__(
+        self, npz_file_path: str, resume_n_frames: Optional[int] = None
+    ):
+        """Initialise the writer."""
+        self.npz_file_path = Path(npz_file_path)
+        self.boxes: list[np.ndarray] = []
+        self.ids: list[np.ndarray] = []
+        self.scores: list[np.ndarray] = []
+        self.n_detections_per_frame: list[int] = []
+
+        # Load frames already written if resuming
+        if resume_n_frames is not None:
+            with np.load(self.npz_file_path) as tracks:
+                end = tracks["frame_offsets"][resume_n_frames]
+                self.boxes.append(tracks["boxes"][:end])
+                self.ids.append(tracks["ids"][:end])
+                self.scores.append(tracks["scores"][:end])
+                self.n_detections_per_frame = np.diff(
+                    tracks["frame_offsets"][: resume_n_frames + 1]
+                ).tolist()
+
+    def write_frame(
+        self,
+        frame_idx: int,
+        tracked_boxes: np.ndarray,
+        ids: np.ndarray,
+        scores: np.ndarray,
+    ) -> None:
+        """Add the tracked detections of the next frame.
+
+        Parameters
+        ----------
+        frame_idx : int
+            Frame index (0-based) in the input video. Frames must be
+            added in order.
+        tracked_boxes : np.ndarray
+            Array of shape (n, 4) with the tracked bounding boxes as
+            (xmin, ymin, xmax, ymax).
+        ids : np.ndarray
+            Array of shape (n,) with the track IDs.
+        scores : np.ndarray
+            Array of shape (n,) with the score of the detection each
+            tracked box was updated with.
+
+        """
+        if frame_idx != len(self.n_detections_per_frame):
+            raise ValueError(
+                f"Expected tracked detections of frame "
+                f"{len(self.n_detections_per_frame)}, got frame {frame_idx}."
+            )
+        if not len(tracked_boxes) == len(ids) == len(scores):
+            raise ValueError(
+                f"Expected one track ID and score per tracked box in frame "
+                f"{frame_idx}, got {len(tracked_boxes)} boxes, {len(ids)} "
+                f"IDs and {len(scores)} scores."
+            )
+        self.boxes.append(
+            np.asarray(tracked_boxes, dtype=np.float32).reshape(-1, 4)
+        )
+        self.ids.append(np.asarray(ids).astype(np.int64))
+        self.scores.append(np.asarray(scores, dtype=np.float32))
+        self.n_detections_per_frame.append(len(self.ids[-1]))
+
+    def save(self) -> None:
+        """Save the tracked detections added so far to disk.
+
+        The file is written to a temporary file first, so that an
+        incomplete file is never read.
+        """
+        self.npz_file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_npz_file_path = self.npz_file_path.with_suffix(".tmp.npz")
+        np.savez_compressed(
+            tmp_npz_file_path,
+            boxes=np.concatenate(self.boxes or [np.empty((0, 4))]).astype(
+                np.float32
+            ),
+            ids=np.concatenate(self.ids or [np.empty(0)]).astype(np.int64),
+            scores=np.concatenate(self.scores or [np.empty(0)]).astype(
+                np.float32
+            ),
+            frame_offsets=np.concatenate(
+                [[0], np.cumsum(self.n_detections_per_frame)]
+            ).astype(np.int64),
+        )
+        os.replace(tmp_npz_file_path, self.npz_file_path)
+
+    def tell(self) -> int:
+        """Save the tracked detections to disk and return the frames saved.
+
+        Returns
+        -------
+        int
+            Number of frames saved so far.
+
+        """
+        self.save()
+        return len(self.n_detections_per_frame)
+
+    def close(self) -> None:
+        """Save the tracked detections to disk."""
+        self.save()
+
+    def __enter__(self) -> "TrackedDetectionsNPZWriter":
+        """Return the writer when used as a context manager."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Save the tracked detections when exiting the context."""
+        self.close()
+
+
+def read_tracks_npz(npz_file_path: Union[str, Path]) -> dict[str, np.ndarray]:
+    """Read a tracks file written by :class:`TrackedDetectionsNPZWriter`.
+
+    The tracked detections are returned as the columnar arrays of a csv
+    file in VIA tracks format, so that both outputs can be analysed in
+    the same way.
+
+    Parameters
+    ----------
+    npz_file_path : str | Path
+        Path to the .npz file.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Dictionary with the arrays described in :func:`read_via_tracks_csv`.
+        The frame numbers are the frame indices (0-based), as in the
+        filenames of the csv file. Unlike in the csv file, all frames are
+        included in the index, including those without tracked detections.
+
+    """
+    with np.load(npz_file_path) as tracks:
+        boxes = tracks["boxes"].astype(np.float64)
+        ids = tracks["ids"]
+        scores = tracks["scores"]
+        frame_offsets = tracks["frame_offsets"]
+
+    frame_numbers = np.arange(len(frame_offsets) - 1)
+    return {
+        "frame": np.repeat(frame_numbers, np.diff(frame_offsets)),
+        "id": ids.astype(np.float64),
+        "x": boxes[:, 0],
+        "y": boxes[:, 1],
+        "w": boxes[:, 2] - boxes[:, 0],
+        "h": boxes[:, 3] - boxes[:, 1],
+        "confidence": scores.astype(np.float64),
+        "frame_numbers": frame_numbers,
+        "frame_offsets": frame_offsets,
+    }
+
+
+# Columns of the arrays returned by `read_via_tracks_csv`
+VIA_TRACKS_COLUMNS = ("frame", "id", "x", "y", "w", "h", "confidence")
+
+# Version of the format of the VIA tracks cache files. Increase it when
+# the format changes, so that older cache files are parsed again.
+VIA_TRACKS_CACHE_VERSION = 1
+
+
+def _parse_json_column(json_strings: "pd.Series") -> list[dict]:
+    """Parse a column of JSON objects with a single call to `json.loads`.
+
+    This is much faster than calling `json.loads` on each row.
+    """
+    return json.loads("[" + ",".join(json_strings.tolist()) + "]")
+
+
+def _get_via_tracks_cache_path(csv_file_path: Path) -> Path:
+    """Get the path to the cache file of a VIA tracks csv file."""
+    return csv_file_path.with_name(csv_file_path.name + ".cache.npz")
+
+
+def _read_via_tracks_cache(
+    cache_path: Path, csv_file_path: Path
+) -> Optional[dict[str, np.ndarray]]:
+    """Read a VIA tracks cache file if it is valid for the csv file.
+
+    Returns None if the cache file does not exist, has a different format
+    version, or was written for a different version of the csv file (as
+    identified by its size and modification time).
+    """
+    if not cache_path.exists():
+        return None
+    csv_stat = csv_file_path.stat()
+    with np.load(cache_path) as cache:
+        if (
+            int(cache["cache_version"]) != VIA_TRACKS_CACHE_VERSION
+            or int(cache["source_size"]) != csv_stat.st_size
+            or int(cache["source_mtime_ns"]) != csv_stat.st_mtime_ns
+        ):
+            return None
+        return {
+            key: cache[key]
+            for key in (*VIA_TRACKS_COLUMNS, "frame_numbers", "frame_offsets")
+        }
+
+
+def _write_via_tracks_cache(
+    cache_path: Path, csv_file_path: Path, via_tracks: dict[str, np.ndarray]
+) -> None:
+    """Write the arrays of a VIA tracks csv file to a cache file.
+
+    The cache is written to a temporary file first, so that an incomplete
+    cache is never read. If the cache cannot be written, a warning is
+    logged.
+    """
+    csv_stat = csv_file_path.stat()
+    cache_arrays: dict[str, Any] = {
+        "cache_version": VIA_TRACKS_CACHE_VERSION,
+        "source_size": csv_stat.st_size,
+        "source_mtime_ns": csv_stat.st_mtime_ns,
+        **via_tracks,
+    }
+    tmp_cache_path = cache_path.with_suffix(".tmp.npz")
+    try:
+        np.savez(tmp_cache_path, **cache_arrays)
+        os.replace(tmp_cache_path, cache_path)
+    except OSError as e:
+        logging.warning(f"Could not write cache file {cache_path}: {e}")
+
+
+def parse_via_tracks_csv(csv_file_path: Path) -> dict[str, np.ndarray]:
+    """Parse a csv file in VIA tracks format into columnar arrays.
+
+    The JSON attributes of all rows are parsed at once, rather than with
+    one call to `json.loads` per row and attribute.
+
+    Parameters
+    ----------
+    csv_file_path : Path
+        Path to the csv file.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Dictionary with the arrays described in
+        :func:`read_via_tracks_csv`.
+
+    """
+    import pandas as pd
+
+    df = pd.read_csv(
+        csv_file_path,
+        usecols=[
+            "filename",
+            "region_shape_attributes",
+            "region_attributes",
+        ],
+        dtype=str,
+        keep_default_na=False,
+    )
+
+    # the frame number is the last part of the filename after "_",
+    # without extension. Parse it once per filename.
+    filename_codes, filenames = pd.factorize(df["filename"])
+    frame_per_filename = np.array(
+        [int(f.split("_")[-1].split(".")[0]) for f in filenames],
+        dtype=np.int64,
+    )
+    columns = {"frame": frame_per_filename[filename_codes]}
+
+    region_shape_attributes = _parse_json_column(df["region_shape_attributes"])
+    boxes = np.array(
+        [
+            (shape["x"], shape["y"], shape["width"], shape["height"])
+            for shape in region_shape_attributes
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 4)
+    for i, column in enumerate(["x", "y", "w", "h"]):
+        columns[column] = boxes[:, i]
+
+    region_attributes = _parse_json_column(df["region_attributes"])
+    columns["id"] = np.array(
+        [attributes["track"] for attributes in region_attributes],
+        dtype=np.float64,
+    )
+    columns["confidence"] = np.array(
+        [
+            attributes.get("confidence", np.nan)
+            for attributes in region_attributes
+        ],
+        dtype=np.float64,
+    )
+
+    # sort rows by frame, keeping the order of the rows within each frame
+    order = np.argsort(columns["frame"], kind="stable")
+    via_tracks = {
+        column: columns[column][order] for column in VIA_TRACKS_COLUMNS
+    }
+    frame_numbers, frame_counts = np.unique(
+        via_tracks["frame"], return_counts=True
+    )
+    via_tracks["frame_numbers"] = frame_numbers
+    via_tracks["frame_offsets"] = np.concatenate(
+        [[0], np.cumsum(frame_counts)]
+    ).astype(np.int64)
+    return via_tracks
+
+
+def read_via_tracks_csv(
+    csv_file_path: Union[str, Path], use_cache: bool = False
+) -> dict[str, np.ndarray]:
+    """Read a csv file in VIA tracks format into columnar arrays.
+
+    The rows are sorted by frame number, keeping their order in the file
+    within each frame.
+
+    Parameters
+    ----------
+    csv_file_path : str | Path
+        Path to the csv file, with the ground truth annotations or the
+        tracked detections of a video.
+    use_cache : bool
+        If True, the parsed arrays are saved to a cache file next to the
+        csv file (named <csv-filename>.cache.npz), and read from it in
+        later calls instead of parsing the csv file again. The cache is
+        parsed again if the csv file changes. Default: False.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Dictionary with one array of shape (n,) per row of the csv file for
+        each column in `VIA_TRACKS_COLUMNS`:
+        - "frame": frame number, from the filename.
+        - "id": track ID.
+        - "x", "y", "w", "h": top-left corner, width and height of the
+          bounding box.
+        - "confidence": detection confidence, or NaN if not defined.
+        It also includes an index of the rows of each frame:
+        - "frame_numbers": array of shape (n_frames,) with the sorted
+          frame numbers.
+        - "frame_offsets": array of shape (n_frames + 1,), such that the
+          rows of frame `frame_numbers[i]` are at
+          `frame_offsets[i]:frame_offsets[i + 1]`.
+
+    """
+    csv_file_path = Path(csv_file_path)
+    cache_path = _get_via_tracks_cache_path(csv_file_path)
+    if use_cache:
+        via_tracks = _read_via_tracks_cache(cache_path, csv_file_path)
+        if via_tracks is not None:
+            return via_tracks
+
+    via_tracks = parse_via_tracks_csv(csv_file_path)
+    if use_cache:
+        _write_via_tracks_cache(cache_path, csv_file_path, via_tracks)
+    return via_tracks
+
+
+def get_via_tracks_frame_slices(
+    via_tracks: dict[str, np.ndarray],
+) -> dict[int, slice]:
+    """Get the slice of rows of each frame of VIA tracks arrays.
+
+    Parameters
+    ----------
+    via_tracks : dict[str, np.ndarray]
+        Arrays returned by :func:`read_via_tracks_csv`.
+
+    Returns
+    -------
+    dict[int, slice]
+        Dictionary that maps each frame number to the slice of its rows.
+
+    """
+    offsets = via_tracks["frame_offsets"].tolist()
+    return {
+        frame_number: slice(start, end)
+        for frame_number, start, end in zip(
+            via_tracks["frame_numbers"].tolist(), offsets[:-1], offsets[1:]
+        )
+    }
+
 
 def write_frame_to_output_video(
     frame: np.ndarray,
@@ -106,6 +839,10 @@ def write_frame_to_output_video(
     output_video_object: cv2.VideoWriter,
 ) -> None:
     """Write frame with tracked bounding boxes to output video."""
+    # the visualisation utils import torchvision and matplotlib, which are
+    # slow to import and not needed unless writing a video
+    from crabs.detector.utils.visualization import draw_bbox
+
     frame_copy = frame.copy()  # why copy?
     for bbox, id in zip(
         tracked_bboxes_one_frame["tracked_boxes"],
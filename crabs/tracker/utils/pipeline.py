@@ -0,0 +1,149 @@
+"""Utility functions for running the tracking loop as a staged pipeline."""
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+# Sentinel put in a queue to signal the end of the stream
+END_OF_STREAM = object()
+
+# Timeout (in seconds) used when blocking on a queue, after which
+# we check whether the pipeline has been stopped
+QUEUE_TIMEOUT = 0.1
+
+
+class PipelineStopped(Exception):
+    """Raised in a stage when the pipeline was stopped by another stage."""
+
+
+class StageTimer:
+    """Accumulate the time a pipeline stage is busy or waiting.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, used for logging.
+
+    """
+
+    def __init__(self, name: str):
+        """Initialise the timer with zero busy and waiting times."""
+        self.name = name
+        self.busy_time = 0.0
+        self.waiting_time = 0.0
+
+    @contextmanager
+    def busy(self):
+        """Add the time spent in the context to the busy time."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.busy_time += time.perf_counter() - start
+
+    @contextmanager
+    def waiting(self):
+        """Add the time spent in the context to the waiting time."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.waiting_time += time.perf_counter() - start
+
+    def log(self) -> None:
+        """Log the busy and waiting times of the stage."""
+        logging.info(
+            f"Stage '{self.name}': busy {self.busy_time:.2f} s, "
+            f"waiting {self.waiting_time:.2f} s"
+        )
+
+
+class PipelineStage(threading.Thread):
+    """Thread running one stage of the pipeline.
+
+    If the stage raises an exception, the exception is stored and the
+    pipeline is stopped, so that the other stages do not block forever.
+    The exception is re-raised when the stage is joined with
+    :meth:`join_and_raise`.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage.
+    target : Callable[[], None]
+        Function to run in the thread.
+    stop_event : threading.Event
+        Event shared by all stages, set to stop the pipeline.
+
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target: Callable[[], None],
+        stop_event: threading.Event,
+    ):
+        """Initialise the stage as a daemon thread."""
+        super().__init__(name=name, daemon=True)
+        self.stage_target = target
+        self.stop_event = stop_event
+        self.exception: Optional[BaseException] = None
+
+    def run(self) -> None:
+        """Run the stage, and stop the pipeline if it fails."""
+        try:
+            self.stage_target()
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            self.exception = e
+            self.stop_event.set()
+
+    def join_and_raise(self) -> None:
+        """Wait for the stage to finish and re-raise its exception if any."""
+        self.join()
+        if self.exception is not None:
+            raise self.exception
+
+
+def put_in_queue(
+    output_queue: queue.Queue,
+    item: Any,
+    timer: StageTimer,
+    stop_event: threading.Event,
+) -> None:
+    """Put an item in a bounded queue, waiting while the queue is full.
+
+    The time spent waiting is added to the stage timer. If the pipeline
+    is stopped while waiting, a :class:`PipelineStopped` exception is raised.
+    """
+    with timer.waiting():
+        while True:
+            try:
+                output_queue.put(item, timeout=QUEUE_TIMEOUT)
+                return
+            except queue.Full:
+                if stop_event.is_set():
+                    raise PipelineStopped() from None
+
+
+def get_from_queue(
+    input_queue: queue.Queue,
+    timer: StageTimer,
+    stop_event: threading.Event,
+) -> Any:
+    """Get an item from a queue, waiting while the queue is empty.
+
+    The time spent waiting is added to the stage timer. If the pipeline
+    is stopped while waiting, a :class:`PipelineStopped` exception is raised.
+    """
+    with timer.waiting():
+        while True:
+            try:
+                return input_queue.get(timeout=QUEUE_TIMEOUT)
+            except queue.Empty:
+                if stop_event.is_set():
+                    raise PipelineStopped() from None
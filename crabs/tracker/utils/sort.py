@@ -19,6 +19,35 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from typing import Optional
 
 import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from crabs.tracker.utils.box_index import iou_pairs, sparse_iou
+
+try:
+    import lap
+except ImportError:
+    lap = None
+
+
+def _lapjv_assignment(cost_matrix: np.ndarray) -> np.ndarray:
+    """Solve the linear assignment problem with the LAPJV algorithm."""
+    _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
+    cols = x[x >= 0]
+    return np.stack([y[cols], cols], axis=1)
+
+
+def _scipy_assignment(cost_matrix: np.ndarray) -> np.ndarray:
+    """Solve the linear assignment problem with scipy."""
+    return np.stack(linear_sum_assignment(cost_matrix), axis=1)
+
+
+# Solver for the linear assignment problem, chosen once on import:
+# LAPJV if available, otherwise scipy's linear_sum_assignment
+_linear_assignment_solver = (
+    _scipy_assignment if lap is None else _lapjv_assignment
+)
 
 
 def linear_assignment(cost_matrix: np.ndarray) -> np.ndarray:
@@ -40,16 +69,140 @@ def linear_assignment(cost_matrix: np.ndarray) -> np.ndarray:
         pair (track index, detection index).
 
     """
-    try:
-        import lap
+    return _linear_assignment_solver(cost_matrix).reshape(-1, 2).astype(int)
+
+
+def sparse_linear_assignment(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    costs: np.ndarray,
+    shape: tuple[int, int],
+) -> np.ndarray:
+    """Perform linear assignment over a sparse set of candidate pairs.
+
+    The cost of all other pairs is zero, and they are never assigned. The
+    rows and columns are split into groups connected by candidate pairs,
+    and each group is solved separately. Groups with a single row and a
+    single column are matched directly. Pairs with a zero cost do not
+    change the total cost of an assignment, so the total cost is the same
+    as that of :func:`linear_assignment` over the full cost matrix. When
+    there are few candidate pairs per row and column, such as between the
+    boxes of crowded frames, where most boxes do not overlap, each group
+    is small and the assignment is much faster than over the full matrix.
+
+    Parameters
+    ----------
+    rows : np.ndarray
+        Array of shape (K,) with the row index of each candidate pair.
+    cols : np.ndarray
+        Array of shape (K,) with the column index of each candidate pair.
+    costs : np.ndarray
+        Array of shape (K,) with the non-zero cost of each candidate pair.
+    shape : tuple[int, int]
+        Shape of the full cost matrix.
+
+    Returns
+    -------
+    np.ndarray
+        An array containing the assignment indices. Each row corresponds to a
+        pair (row index, column index), sorted by the row index.
+
+    """
+    n_rows, n_cols = shape
+    if len(rows) == 0:
+        return np.empty((0, 2), dtype=int)
+
+    # label connected groups, in a bipartite graph with the rows as the
+    # first n_rows nodes and the columns as the last n_cols nodes
+    graph = coo_matrix(
+        (np.ones(len(rows)), (rows, cols + n_rows)),
+        shape=(n_rows + n_cols, n_rows + n_cols),
+    )
+    n_labels, labels = connected_components(graph, directed=False)
+    row_labels, col_labels = labels[:n_rows], labels[n_rows:]
+    row_counts = np.bincount(row_labels, minlength=n_labels)
+    col_counts = np.bincount(col_labels, minlength=n_labels)
+
+    # groups with a single row and a single column are matched directly
+    single_pair = (row_counts == 1) & (col_counts == 1)
+    col_per_label = np.empty(n_labels, dtype=int)
+    col_per_label[col_labels] = np.arange(n_cols)
+    single_rows = np.flatnonzero(single_pair[row_labels])
+    matches = [
+        np.stack([single_rows, col_per_label[row_labels[single_rows]]], axis=1)
+    ]
+
+    # other groups are solved separately: we sort the rows, columns and
+    # candidate pairs by group, and index rows and columns within groups
+    rows_per_label = np.split(
+        np.argsort(row_labels, kind="stable"), np.cumsum(row_counts)[:-1]
+    )
+    cols_per_label = np.split(
+        np.argsort(col_labels, kind="stable"), np.cumsum(col_counts)[:-1]
+    )
+    row_idx_in_group = np.empty(n_rows, dtype=int)
+    row_idx_in_group[np.concatenate(rows_per_label)] = np.concatenate(
+        [np.arange(count) for count in row_counts]
+    )
+    col_idx_in_group = np.empty(n_cols, dtype=int)
+    col_idx_in_group[np.concatenate(cols_per_label)] = np.concatenate(
+        [np.arange(count) for count in col_counts]
+    )
+    pair_labels = row_labels[rows]
+    pairs_per_label = np.split(
+        np.argsort(pair_labels, kind="stable"),
+        np.cumsum(np.bincount(pair_labels, minlength=n_labels))[:-1],
+    )
+    for label in np.flatnonzero(
+        (row_counts > 0) & (col_counts > 0) & ~single_pair
+    ):
+        group_rows = rows_per_label[label]
+        group_cols = cols_per_label[label]
+        group_pairs = pairs_per_label[label]
+        group_cost_matrix = np.zeros((len(group_rows), len(group_cols)))
+        group_cost_matrix[
+            row_idx_in_group[rows[group_pairs]],
+            col_idx_in_group[cols[group_pairs]],
+        ] = costs[group_pairs]
+        group_matches = linear_assignment(group_cost_matrix)
+        group_matches = group_matches[
+            group_cost_matrix[tuple(group_matches.T)] != 0
+        ]
+        matches.append(
+            np.stack(
+                [
+                    group_rows[group_matches[:, 0]],
+                    group_cols[group_matches[:, 1]],
+                ],
+                axis=1,
+            )
+        )
+    matches_array = np.concatenate(matches)
+    return matches_array[np.argsort(matches_array[:, 0], kind="stable")]
+
 
-        _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
-        return np.array([[y[i], i] for i in x if i >= 0])  #
-    except ImportError:
-        from scipy.optimize import linear_sum_assignment
+def gated_linear_assignment(cost_matrix: np.ndarray) -> np.ndarray:
+    """Perform linear assignment only over pairs with a non-zero cost.
 
-        x, y = linear_sum_assignment(cost_matrix)
-        return np.array(list(zip(x, y)))
+    See :func:`sparse_linear_assignment`.
+
+    Parameters
+    ----------
+    cost_matrix : np.ndarray
+        The cost matrix representing the assignment costs between
+        tracks and detections.
+
+    Returns
+    -------
+    np.ndarray
+        An array containing the assignment indices. Each row corresponds to a
+        pair (track index, detection index), sorted by the first index.
+
+    """
+    rows, cols = np.nonzero(cost_matrix)
+    return sparse_linear_assignment(
+        rows, cols, cost_matrix[rows, cols], cost_matrix.shape
+    )
 
 
 def iou_batch(bb_test: np.ndarray, bb_gt: np.ndarray) -> np.ndarray:
@@ -160,8 +313,119 @@ def convert_x_to_bbox(
         ).reshape((1, 5))
 
 
-def associate_detections_to_trackers(  # noqa: C901
-    detections: np.ndarray, trackers: np.ndarray, iou_threshold: float = 0.3
+def convert_bboxes_to_z(bboxes: np.ndarray) -> np.ndarray:
+    """Convert an array of bounding boxes from corner form to center form.
+
+    Batched version of :func:`convert_bbox_to_z`.
+
+    Parameters
+    ----------
+    bboxes : np.ndarray
+        Array of shape (N, 4) with bounding boxes in the form
+        [x1, y1, x2, y2]. Any additional columns are ignored.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (N, 4) with the bounding boxes in the form
+        [x, y, s, r].
+
+    """
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    x = bboxes[:, 0] + w / 2.0
+    y = bboxes[:, 1] + h / 2.0
+    s = w * h  # scale is just area
+    r = w / h
+    return np.stack([x, y, s, r], axis=1)
+
+
+def convert_x_to_bboxes(x: np.ndarray) -> np.ndarray:
+    """Convert an array of states from center form to corner form.
+
+    Batched version of :func:`convert_x_to_bbox`.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Array of shape (N, D), with D >= 4, whose first four columns are
+        bounding boxes in the center form [x, y, s, r].
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (N, 4) with the bounding boxes in the form
+        [x1, y1, x2, y2].
+
+    """
+    w = np.sqrt(x[:, 2] * x[:, 3])
+    h = x[:, 2] / w
+    return np.stack(
+        [
+            x[:, 0] - w / 2.0,
+            x[:, 1] - h / 2.0,
+            x[:, 0] + w / 2.0,
+            x[:, 1] + h / 2.0,
+        ],
+        axis=1,
+    )
+
+
+def _assign_dense(
+    detections: np.ndarray, trackers: np.ndarray, iou_threshold: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Assign detections to trackers using the full IOU matrix.
+
+    Returns the assigned pairs of detection and tracker indices, and
+    their IOU.
+    """
+    iou_matrix = iou_batch(detections, trackers)
+
+    if min(iou_matrix.shape) > 0:
+        a = (iou_matrix > iou_threshold).astype(np.int32)
+        if a.sum(1).max() == 1 and a.sum(0).max() == 1:
+            matched_indices = np.stack(np.where(a), axis=1)
+        else:
+            matched_indices = linear_assignment(-iou_matrix)
+    else:
+        matched_indices = np.empty(shape=(0, 2), dtype=int)
+
+    return matched_indices, iou_matrix[tuple(matched_indices.T)]
+
+
+def _assign_gated(
+    detections: np.ndarray, trackers: np.ndarray, iou_threshold: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Assign detections to trackers using only pairs of boxes that overlap.
+
+    The overlapping pairs are found with a spatial grid index over the
+    trackers' boxes. Returns the assigned pairs of detection and tracker
+    indices, and their IOU.
+    """
+    rows, cols, ious = sparse_iou(detections, trackers)
+
+    above = ious > iou_threshold
+    if (
+        above.any()
+        and np.bincount(rows[above]).max() == 1
+        and np.bincount(cols[above]).max() == 1
+    ):
+        return np.stack([rows[above], cols[above]], axis=1), ious[above]
+
+    matched_indices = sparse_linear_assignment(
+        rows, cols, -ious, (len(detections), len(trackers))
+    )
+    return matched_indices, iou_pairs(
+        detections[matched_indices[:, 0], :4],
+        trackers[matched_indices[:, 1], :4],
+    )
+
+
+def associate_detections_to_trackers(
+    detections: np.ndarray,
+    trackers: np.ndarray,
+    iou_threshold: float = 0.3,
+    gated: bool = False,
 ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """Assign detections to tracked objects.
 
@@ -177,6 +441,14 @@ def associate_detections_to_trackers(  # noqa: C901
         format [x1, y1, x2, y2].
     iou_threshold : float, optional
         IOU threshold for associating detections with trackers. Default is 0.3.
+    gated : bool, optional
+        If True, only pairs of detections and trackers whose boxes overlap
+        enter the assignment problem, which is solved separately for each
+        group of overlapping boxes (see :func:`sparse_linear_assignment`).
+        The overlapping pairs are found with a spatial index, without
+        computing the full IOU matrix. This is faster in crowded frames.
+        The matches are the same as in the full assignment, but the
+        unmatched detections may be in a different order. Default is False.
 
     Returns
     -------
@@ -197,41 +469,33 @@ def associate_detections_to_trackers(  # noqa: C901
             np.empty((0, 5), dtype=int),
         )
 
-    iou_matrix = iou_batch(detections, trackers)
-
-    if min(iou_matrix.shape) > 0:
-        a = (iou_matrix > iou_threshold).astype(np.int32)
-        if a.sum(1).max() == 1 and a.sum(0).max() == 1:
-            matched_indices = np.stack(np.where(a), axis=1)
-        else:
-            matched_indices = linear_assignment(-iou_matrix)
+    if gated:
+        matched_indices, matched_ious = _assign_gated(
+            detections, trackers, iou_threshold
+        )
     else:
-        matched_indices = np.empty(shape=(0, 2), dtype=int)
-
-    unmatched_detections = []
-    for d, _det in enumerate(detections):
-        if d not in matched_indices[:, 0]:
-            unmatched_detections.append(d)
-    unmatched_trackers = []
-    for t, _trk in enumerate(trackers):
-        if t not in matched_indices[:, 1]:
-            unmatched_trackers.append(t)
+        matched_indices, matched_ious = _assign_dense(
+            detections, trackers, iou_threshold
+        )
 
     # filter out matched with low IOU
-    list_matches = []  # before: matches
-    for m in matched_indices:
-        if iou_matrix[m[0], m[1]] < iou_threshold:
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            list_matches.append(m.reshape(1, 2))
-    if len(list_matches) == 0:
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(list_matches, axis=0)
+    low_iou = matched_ious < iou_threshold
+
+    # unmatched detections and trackers: those not assigned, followed by
+    # those assigned with a low IOU
+    assigned_detections = np.zeros(len(detections), dtype=bool)
+    assigned_detections[matched_indices[:, 0]] = True
+    assigned_trackers = np.zeros(len(trackers), dtype=bool)
+    assigned_trackers[matched_indices[:, 1]] = True
+    unmatched_detections = np.concatenate(
+        [np.flatnonzero(~assigned_detections), matched_indices[low_iou, 0]]
+    )
+    unmatched_trackers = np.concatenate(
+        [np.flatnonzero(~assigned_trackers), matched_indices[low_iou, 1]]
+    )
 
     return (
-        matches,
-        np.array(unmatched_detections),
-        np.array(unmatched_trackers),
+        matched_indices[~low_iou],
+        unmatched_detections,
+        unmatched_trackers,
     )
@@ -2,15 +2,17 @@
 
 import json
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any, Optional
 
-import pandas as pd
-import torch
+if TYPE_CHECKING:
+    # torch is only imported by the functions that use it, as it is slow
+    # to import
+    import torch
 
 
 def format_and_filter_bbox_predictions_for_sort(
     prediction_dict: dict, score_threshold: float
-) -> torch.Tensor:
+) -> "torch.Tensor":
     """Put predictions in format expected by SORT.
 
     Lower confidence predictions are filtered out.
@@ -31,6 +33,8 @@ def format_and_filter_bbox_predictions_for_sort(
         in format [xmin, ymin, xmax, ymax, score].
 
     """
+    import torch
+
     # Format as a tensor with scores as last column
     predictions_tensor = torch.hstack(
         (
@@ -44,6 +48,88 @@ def format_and_filter_bbox_predictions_for_sort(
     return predictions_tensor[predictions_tensor[:, -1] > score_threshold]
 
 
+def compute_inference_frame_size(
+    frame_size: tuple[int, int],
+    inference_scale: float = 1.0,
+    max_inference_side: Optional[int] = None,
+) -> Optional[tuple[int, int]]:
+    """Compute the size of the frames passed to the detector.
+
+    Frames are only ever downscaled, keeping their aspect ratio.
+
+    Parameters
+    ----------
+    frame_size : tuple[int, int]
+        Width and height of the input video frames, in pixels.
+    inference_scale : float
+        Factor to scale the frames by before detection. Default: 1.0.
+    max_inference_side : Optional[int]
+        If defined, the frames are scaled so that their longest side is
+        at most this number of pixels. It takes precedence over
+        `inference_scale`. Default: None.
+
+    Returns
+    -------
+    Optional[tuple[int, int]]
+        Width and height of the frames passed to the detector, in pixels,
+        or None if the frames are passed at their original size.
+
+    """
+    frame_width, frame_height = frame_size
+    if max_inference_side is not None:
+        inference_scale = max_inference_side / max(frame_width, frame_height)
+
+    inference_frame_size = (
+        max(round(frame_width * inference_scale), 1),
+        max(round(frame_height * inference_scale), 1),
+    )
+    if (
+        inference_frame_size[0] >= frame_width
+        or inference_frame_size[1] >= frame_height
+    ):
+        return None
+    return inference_frame_size
+
+
+def rescale_detections_to_frame_size(
+    detections_dict: dict,
+    inference_frame_size: tuple[int, int],
+    frame_size: tuple[int, int],
+) -> dict:
+    """Map detected boxes from the inference frame to the original frame.
+
+    The x and y coordinates are scaled separately, by the ratio of the
+    original and the inference frame sizes, since rounding the inference
+    frame size to whole pixels may change the aspect ratio slightly.
+
+    Parameters
+    ----------
+    detections_dict : dict
+        Dictionary with the detections in the inference frame as torch
+        tensors, with keys "boxes", "scores" and "labels". The boxes are
+        in (xmin, ymin, xmax, ymax) format.
+    inference_frame_size : tuple[int, int]
+        Width and height of the frame passed to the detector, in pixels.
+    frame_size : tuple[int, int]
+        Width and height of the original frame, in pixels.
+
+    Returns
+    -------
+    dict
+        Dictionary with the same keys, and the boxes in the pixel
+        coordinates of the original frame.
+
+    """
+    scale_x = frame_size[0] / inference_frame_size[0]
+    scale_y = frame_size[1] / inference_frame_size[1]
+    boxes = detections_dict["boxes"]
+    return {
+        **detections_dict,
+        "boxes": boxes
+        * boxes.new_tensor([scale_x, scale_y, scale_x, scale_y]),
+    }
+
+
 def extract_bounding_box_info(row: list[str]) -> dict[str, Any]:
     """Extract bounding box information from a row of data.
 
@@ -57,6 +143,8 @@ def extract_bounding_box_info(row: list[str]) -> dict[str, Any]:
     -------
     dict[str, Any]:
         A dictionary containing the extracted bounding box information.
+        The detection confidence is included only if it is defined in the
+        row.
 
     """
     filename = row[0]
@@ -70,7 +158,7 @@ def extract_bounding_box_info(row: list[str]) -> dict[str, Any]:
     track_id = region_attributes["track"]
 
     frame_number = int(filename.split("_")[-1].split(".")[0])
-    return {
+    bbox_info = {
         "frame_number": frame_number,
         "x": x,
         "y": y,
@@ -79,12 +167,20 @@ def extract_bounding_box_info(row: list[str]) -> dict[str, Any]:
         "id": track_id,
     }
 
+    # add confidence if defined (e.g. for predicted tracks)
+    if "confidence" in region_attributes:
+        bbox_info["confidence"] = region_attributes["confidence"]
+
+    return bbox_info
+
 
 def save_tracking_mota_metrics(
     tracking_output_dir: Path,
     track_results: dict[str, Any],
 ) -> None:
     """Save tracking metrics to a CSV file."""
+    import pandas as pd
+
     track_df = pd.DataFrame(track_results)
     output_filename = f"{tracking_output_dir}/tracking_metrics_output.csv"
     track_df.to_csv(output_filename, index=False)
@@ -0,0 +1,317 @@
+"""Accumulate identity and higher-order tracking metrics across frames."""
+
+from typing import Optional
+
+import numpy as np
+
+from crabs.tracker.utils.sort import sparse_linear_assignment
+
+# Localisation thresholds over which HOTA and its components are averaged
+HOTA_ALPHAS = np.arange(1, 20) / 20
+
+# Maximum number of rows buffered by a `SparseCounter` before they are
+# merged with the counts so far
+DEFAULT_MAX_BUFFER_SIZE = 100_000
+
+
+class SparseCounter:
+    """Count the occurrences of rows of values, in bounded memory.
+
+    Rows are buffered as they are added, and merged with the counts so far
+    once the buffer exceeds `max_buffer_size` rows. The memory used is then
+    proportional to the number of distinct rows, rather than to the number
+    of rows added.
+
+    Parameters
+    ----------
+    n_columns : int
+        Number of values per row.
+    max_buffer_size : int
+        Maximum number of rows buffered before merging them with the
+        counts. Default: `DEFAULT_MAX_BUFFER_SIZE`.
+
+    """
+
+    def __init__(
+        self, n_columns: int, max_buffer_size: int = DEFAULT_MAX_BUFFER_SIZE
+    ):
+        """Initialise an empty counter."""
+        self.max_buffer_size = max_buffer_size
+        self.keys = np.empty((0, n_columns))
+        self.counts = np.empty(0, dtype=np.int64)
+        self.buffer: list[np.ndarray] = []
+        self.n_buffered = 0
+
+    def add(self, rows: np.ndarray) -> None:
+        """Add rows to the counter.
+
+        Parameters
+        ----------
+        rows : np.ndarray
+            Array of shape (n, n_columns).
+
+        """
+        self.buffer.append(np.asarray(rows, dtype=np.float64))
+        self.n_buffered += len(rows)
+        if self.n_buffered > self.max_buffer_size:
+            self.merge()
+
+    def merge(self) -> None:
+        """Merge the buffered rows with the counts so far."""
+        if not self.buffer:
+            return
+        rows = np.concatenate(self.buffer)
+        self.keys, inverse = np.unique(
+            np.concatenate([self.keys, rows]), axis=0, return_inverse=True
+        )
+        self.counts = np.bincount(
+            inverse.ravel(),
+            weights=np.concatenate(
+                [self.counts, np.ones(len(rows), dtype=np.int64)]
+            ),
+            minlength=len(self.keys),
+        ).astype(np.int64)
+        self.buffer = []
+        self.n_buffered = 0
+
+    def get_counts(self) -> tuple[np.ndarray, np.ndarray]:
+        """Get the distinct rows added and their counts.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            Array of shape (K, n_columns) with the distinct rows, sorted
+            lexicographically, and array of shape (K,) with their counts.
+
+        """
+        self.merge()
+        return self.keys, self.counts
+
+
+class TrackingMetrics:
+    """Accumulate tracking metrics over the frames of a video.
+
+    The IoU matrix between the ground truth and tracked boxes of each frame
+    is computed once, and passed to :meth:`update` together with the
+    matches used for the MOTA. Only counts per ground truth ID, per tracked
+    ID and per pair of IDs are kept across frames, so the memory used does
+    not grow with the number of frames. The metrics are computed at the end
+    with :meth:`compute`:
+
+    - MOTP: mean IoU of the matches used for the MOTA.
+    - IDF1, IDP and IDR: identity F1 score, precision and recall, from the
+      one-to-one mapping of ground truth IDs to tracked IDs that maximises
+      the number of frames in which their boxes have an IoU above the
+      threshold [1]_.
+    - HOTA, DetA and AssA: higher order tracking accuracy, and its
+      detection and association components, averaged over the
+      localisation thresholds in `HOTA_ALPHAS` [2]_. The boxes of each
+      frame are matched once, maximising the total IoU, and a match counts
+      at a threshold if its IoU is at least the threshold. Unlike the
+      reference implementation, the matching does not favour pairs of IDs
+      that are often matched in other frames, as that would need a second
+      pass over the frames. HOTA is therefore an approximation, that may be
+      slightly lower than the reference value in crowded frames.
+
+    Parameters
+    ----------
+    iou_threshold : float
+        IoU threshold above which a ground truth box and a tracked box are
+        considered a match for the identity metrics.
+    max_buffer_size : int
+        Maximum number of rows buffered by the counters of IDs before they
+        are merged. Default: `DEFAULT_MAX_BUFFER_SIZE`.
+
+    References
+    ----------
+    .. [1] Ristani et al., "Performance Measures and a Data Set for
+       Multi-Target, Multi-Camera Tracking", ECCV Workshops, 2016.
+    .. [2] Luiten et al., "HOTA: A Higher Order Metric for Evaluating
+       Multi-Object Tracking", IJCV, 2021.
+
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float,
+        max_buffer_size: int = DEFAULT_MAX_BUFFER_SIZE,
+    ):
+        """Initialise the counts."""
+        self.iou_threshold = iou_threshold
+        self.n_gt = 0
+        self.n_pred = 0
+        self.n_matches = 0
+        self.sum_matched_iou = 0.0
+        self.gt_id_counter = SparseCounter(1, max_buffer_size)
+        self.pred_id_counter = SparseCounter(1, max_buffer_size)
+        # frames in which a pair of IDs has an IoU above the threshold
+        self.id_pair_counter = SparseCounter(2, max_buffer_size)
+        # HOTA matches of a pair of IDs, by number of thresholds passed
+        self.hota_pair_counter = SparseCounter(3, max_buffer_size)
+
+    def update(
+        self,
+        gt_ids: np.ndarray,
+        pred_ids: np.ndarray,
+        iou_matrix: np.ndarray,
+        matched: Optional[np.ndarray] = None,
+    ) -> None:
+        """Add the ground truth and tracked boxes of a frame.
+
+        Parameters
+        ----------
+        gt_ids : np.ndarray
+            Ground truth IDs with shape (N,).
+        pred_ids : np.ndarray
+            Tracked IDs with shape (M,).
+        iou_matrix : np.ndarray
+            IoU between ground truth and tracked boxes, with shape (N, M).
+        matched : Optional[np.ndarray]
+            Array of shape (K, 2) with the indices of the ground truth and
+            tracked boxes matched for the MOTA, used for the MOTP. By
+            default, None, which means no boxes are matched.
+
+        """
+        gt_ids = np.asarray(gt_ids, dtype=np.float64)
+        pred_ids = np.asarray(pred_ids, dtype=np.float64)
+        self.n_gt += len(gt_ids)
+        self.n_pred += len(pred_ids)
+        self.gt_id_counter.add(gt_ids[:, None])
+        self.pred_id_counter.add(pred_ids[:, None])
+
+        if matched is not None and len(matched):
+            self.n_matches += len(matched)
+            self.sum_matched_iou += float(
+                iou_matrix[matched[:, 0], matched[:, 1]].sum()
+            )
+
+        rows, cols = np.nonzero(iou_matrix > self.iou_threshold)
+        self.id_pair_counter.add(np.stack([gt_ids[rows], pred_ids[cols]], 1))
+
+        # match boxes maximising the total IoU, over the pairs that pass
+        # the lowest threshold
+        rows, cols = np.nonzero(iou_matrix >= HOTA_ALPHAS[0])
+        hota_matched = sparse_linear_assignment(
+            rows, cols, -iou_matrix[rows, cols], iou_matrix.shape
+        )
+        ious = iou_matrix[hota_matched[:, 0], hota_matched[:, 1]]
+        n_alphas_passed = np.searchsorted(HOTA_ALPHAS, ious, side="right")
+        self.hota_pair_counter.add(
+            np.stack(
+                [
+                    gt_ids[hota_matched[:, 0]],
+                    pred_ids[hota_matched[:, 1]],
+                    n_alphas_passed,
+                ],
+                axis=1,
+            )
+        )
+
+    def compute_identity_metrics(self) -> dict[str, float]:
+        """Compute the IDF1, IDP and IDR.
+
+        Returns
+        -------
+        dict[str, float]
+            Dictionary with the IDF1, IDP and IDR, NaN if undefined.
+
+        """
+        id_pairs, counts = self.id_pair_counter.get_counts()
+        gt_ids, gt_idx = np.unique(id_pairs[:, 0], return_inverse=True)
+        pred_ids, pred_idx = np.unique(id_pairs[:, 1], return_inverse=True)
+        assigned = sparse_linear_assignment(
+            gt_idx,
+            pred_idx,
+            -counts.astype(float),
+            (len(gt_ids), len(pred_ids)),
+        )
+
+        # the pairs are sorted by ground truth ID and then by tracked ID
+        pair_keys = gt_idx * len(pred_ids) + pred_idx
+        assigned_keys = assigned[:, 0] * len(pred_ids) + assigned[:, 1]
+        id_true_positives = counts[
+            np.searchsorted(pair_keys, assigned_keys)
+        ].sum()
+        return {
+            "IDF1": _safe_divide(
+                2 * id_true_positives, self.n_gt + self.n_pred
+            ),
+            "IDP": _safe_divide(id_true_positives, self.n_pred),
+            "IDR": _safe_divide(id_true_positives, self.n_gt),
+        }
+
+    def compute_hota_metrics(self) -> dict[str, float]:
+        """Compute the HOTA, DetA and AssA, averaged over the thresholds.
+
+        Returns
+        -------
+        dict[str, float]
+            Dictionary with the HOTA, DetA and AssA, NaN if undefined.
+
+        """
+        if self.n_gt + self.n_pred == 0:
+            return {"HOTA": np.nan, "DetA": np.nan, "AssA": np.nan}
+
+        hota_pairs, counts = self.hota_pair_counter.get_counts()
+        id_pairs, pair_idx = np.unique(
+            hota_pairs[:, :2], axis=0, return_inverse=True
+        )
+        pair_idx = pair_idx.ravel()
+
+        # matches of each pair of IDs at each threshold: those that pass
+        # at least as many thresholds
+        n_alphas = len(HOTA_ALPHAS)
+        matches_per_level = np.zeros((len(id_pairs), n_alphas + 1))
+        np.add.at(
+            matches_per_level,
+            (pair_idx, hota_pairs[:, 2].astype(int)),
+            counts,
+        )
+        tpa = np.cumsum(matches_per_level[:, ::-1], axis=1)[:, ::-1][:, 1:]
+
+        # frames in which each ID of the pair appears
+        gt_ids, gt_counts = self.gt_id_counter.get_counts()
+        pred_ids, pred_counts = self.pred_id_counter.get_counts()
+        gt_id_counts = gt_counts[np.searchsorted(gt_ids[:, 0], id_pairs[:, 0])]
+        pred_id_counts = pred_counts[
+            np.searchsorted(pred_ids[:, 0], id_pairs[:, 1])
+        ]
+
+        # association accuracy of each pair at each threshold, weighted
+        # by its number of matches
+        association = tpa / np.maximum(
+            (gt_id_counts + pred_id_counts)[:, None] - tpa, 1
+        )
+        true_positives = tpa.sum(axis=0)
+        ass_a = np.divide(
+            (tpa * association).sum(axis=0),
+            true_positives,
+            out=np.zeros(n_alphas),
+            where=true_positives > 0,
+        )
+        det_a = true_positives / (self.n_gt + self.n_pred - true_positives)
+        return {
+            "HOTA": float(np.mean(np.sqrt(det_a * ass_a))),
+            "DetA": float(np.mean(det_a)),
+            "AssA": float(np.mean(ass_a)),
+        }
+
+    def compute(self) -> dict[str, float]:
+        """Compute all the accumulated metrics.
+
+        Returns
+        -------
+        dict[str, float]
+            Dictionary with the MOTP, IDF1, IDP, IDR, HOTA, DetA and AssA.
+
+        """
+        return {
+            "MOTP": _safe_divide(self.sum_matched_iou, self.n_matches),
+            **self.compute_identity_metrics(),
+            **self.compute_hota_metrics(),
+        }
+
+
+def _safe_divide(numerator: float, denominator: float) -> float:
+    """Divide two numbers, returning NaN if the denominator is zero."""
+    return float(numerator / denominator) if denominator else np.nan
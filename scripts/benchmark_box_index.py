@@ -0,0 +1,100 @@
+"""Benchmark the spatial grid index used to gate the IOU between boxes.
+
+Compares the time of computing the full IOU matrix between two sets of
+boxes with that of computing the IOU only for the pairs that overlap,
+found with a `BoxGridIndex`, for an increasing number of boxes. The
+density of boxes is kept constant, as in frames of increasing size with
+crabs spread across them.
+
+Example usage:
+    python scripts/benchmark_box_index.py --n_boxes 100 1000 5000
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+
+from crabs.tracker.utils.box_index import sparse_iou
+from crabs.tracker.utils.sort import iou_batch
+
+
+def make_boxes(n_boxes: int, rng: np.random.Generator) -> np.ndarray:
+    """Make boxes of about 20 pixels in a region of constant density.
+
+    Returns an array of shape (n_boxes, 4), with the boxes in format
+    [x1, y1, x2, y2].
+    """
+    side = 40 * np.sqrt(n_boxes)
+    top_left = rng.uniform(0, side, size=(n_boxes, 2))
+    size = rng.uniform(15, 25, size=(n_boxes, 2))
+    return np.hstack([top_left, top_left + size])
+
+
+def time_function(function: Callable, n_repeats: int) -> float:
+    """Time the best of `n_repeats` calls to a function."""
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(args: argparse.Namespace) -> None:
+    """Run the benchmark and print a table of times per call."""
+    rng = np.random.default_rng(args.seed)
+    print(
+        f"{'n_boxes':>8} {'pairs':>8} {'iou_batch (ms)':>15} "
+        f"{'sparse_iou (ms)':>16} {'speed-up':>9}"
+    )
+    for n_boxes in args.n_boxes:
+        boxes_a = make_boxes(n_boxes, rng)
+        boxes_b = make_boxes(n_boxes, rng)
+
+        # check both methods agree
+        rows, cols, ious = sparse_iou(boxes_a, boxes_b)
+        iou_matrix = np.zeros((n_boxes, n_boxes))
+        iou_matrix[rows, cols] = ious
+        assert np.array_equal(iou_matrix, iou_batch(boxes_a, boxes_b))
+
+        dense = time_function(
+            lambda a=boxes_a, b=boxes_b: iou_batch(a, b), args.n_repeats
+        )
+        sparse = time_function(
+            lambda a=boxes_a, b=boxes_b: sparse_iou(a, b), args.n_repeats
+        )
+        print(
+            f"{n_boxes:>8} {len(ious):>8} {dense * 1e3:>15.3f} "
+            f"{sparse * 1e3:>16.3f} {dense / sparse:>8.1f}x"
+        )
+
+
+def benchmark_parse_args():
+    """Parse command-line arguments for the benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--n_boxes",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 5000],
+        help="Numbers of boxes per set to benchmark. Default: 100 1000 5000.",
+    )
+    parser.add_argument(
+        "--n_repeats",
+        type=int,
+        default=5,
+        help="Number of repeats, of which the best is reported. Default: 5.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Seed of the random boxes. Default: 42.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(benchmark_parse_args())
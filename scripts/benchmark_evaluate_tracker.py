@@ -0,0 +1,216 @@
+"""Benchmark the MOTA computation of the tracker evaluation.
+
+The ground truth frames in tests/data/gt_test.csv are scaled up
+synthetically: each frame is tiled to get more crabs per frame, and the
+crabs drift slightly over an increasing number of frames. The tracked
+boxes are the ground truth boxes with noise, some missed detections,
+false positives and identity switches.
+
+Compares the time to compute the MOTA per frame with a per-pair IoU loop,
+as in earlier versions, with that of the greedy and optimal matching of
+`TrackerEvaluate`, and checks that the greedy matching gives the same
+results as the per-pair loop.
+
+Example usage:
+    python scripts/benchmark_evaluate_tracker.py --n_copies 10 100
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from crabs.tracker.evaluate_tracker import TrackerEvaluate
+
+GT_TEST_FILE = Path(__file__).parents[1] / "tests" / "data" / "gt_test.csv"
+
+
+def make_scaled_data(
+    n_copies: int, n_frames: int, rng: np.random.Generator
+) -> tuple[dict, dict]:
+    """Make ground truth and tracked data from the test annotations.
+
+    The first annotated frame is tiled `n_copies` times, so that each frame
+    has `n_copies` times more crabs, and repeated with some drift for
+    `n_frames` frames.
+    """
+    ground_truth_dict = TrackerEvaluate(
+        str(GT_TEST_FILE), {}, 0.1, Path()
+    ).get_ground_truth_data()
+    first_frame = ground_truth_dict[min(ground_truth_dict)]
+    boxes, ids = first_frame["bbox"], first_frame["id"]
+
+    # tile the frame in a square grid
+    n_cols = int(np.ceil(np.sqrt(n_copies)))
+    extent = boxes[:, 2:].max(axis=0) + 100
+    offsets = np.stack(np.divmod(np.arange(n_copies), n_cols)[::-1], axis=1)
+    boxes = (boxes[None] + np.tile(offsets * extent, 2)[:, None]).reshape(
+        -1, 4
+    )
+    ids = (ids[None] + np.arange(n_copies)[:, None] * ids.max()).ravel()
+
+    gt_dict, pred_dict = {}, {}
+    pred_ids = ids + 1000
+    for frame_number in range(1, n_frames + 1):
+        boxes = boxes + np.tile(rng.normal(0, 2, size=(len(boxes), 2)), 2)
+        gt_dict[frame_number] = {"bbox": boxes.astype(np.float32), "id": ids}
+
+        # tracked boxes: noisy, with missed detections and false positives
+        detected = rng.uniform(size=len(boxes)) > 0.1
+        false_positives = boxes[rng.uniform(size=len(boxes)) < 0.05] + 30
+        tracked_boxes = np.vstack(
+            [
+                boxes[detected] + rng.normal(0, 3, size=(detected.sum(), 4)),
+                false_positives,
+            ]
+        )
+        # swap the IDs of a few pairs of tracks
+        swap = rng.choice(len(pred_ids), size=2)
+        pred_ids[swap] = pred_ids[swap[::-1]]
+        pred_dict[frame_number] = {
+            "tracked_boxes": tracked_boxes,
+            "ids": np.concatenate(
+                [
+                    pred_ids[detected],
+                    np.arange(len(false_positives)) + 10**6,
+                ]
+            ),
+        }
+    return gt_dict, pred_dict
+
+
+def compute_mota_one_frame_per_pair(
+    evaluation: TrackerEvaluate,
+    gt_data: dict,
+    pred_data: dict,
+    gt_to_tracked_id_previous_frame: Optional[dict],
+) -> tuple:
+    """Compute the MOTA of one frame with a per-pair IoU loop.
+
+    This is the loop of earlier versions of `compute_mota_one_frame`.
+    """
+    gt_boxes, gt_ids = gt_data["bbox"], gt_data["id"]
+    matched_gt: set = set()
+    gt_to_tracked_id_current_frame: dict = {}
+    true_positive = 0
+    for pred_box, pred_id in zip(pred_data["tracked_boxes"], pred_data["ids"]):
+        best_iou, index_best, index_not_match = 0.0, None, None
+        for j, gt_box in enumerate(gt_boxes):
+            if j not in matched_gt:
+                iou = evaluation.calculate_iou(gt_box, pred_box)
+                if iou > evaluation.iou_threshold and iou > best_iou:
+                    best_iou, index_best = iou, j
+                else:
+                    index_not_match = j
+        if index_best is not None:
+            true_positive += 1
+            matched_gt.add(index_best)
+            gt_to_tracked_id_current_frame[int(gt_ids[index_best])] = int(
+                pred_id
+            )
+        if index_not_match is not None:
+            gt_to_tracked_id_current_frame[int(gt_ids[index_not_match])] = (
+                np.nan
+            )
+
+    total_gt = len(gt_boxes)
+    false_positive = len(pred_data["ids"]) - true_positive
+    missed_detections = total_gt - true_positive
+    num_switches = evaluation.count_identity_switches(
+        gt_to_tracked_id_previous_frame, gt_to_tracked_id_current_frame
+    )
+    mota = 1 - (missed_detections + false_positive + num_switches) / total_gt
+    return (
+        mota,
+        true_positive,
+        missed_detections,
+        false_positive,
+        num_switches,
+        total_gt,
+        gt_to_tracked_id_current_frame,
+    )
+
+
+def time_per_pair(gt_dict: dict, pred_dict: dict) -> tuple[float, list]:
+    """Time the MOTA computation with the per-pair IoU loop."""
+    evaluation = TrackerEvaluate("", pred_dict, 0.1, Path())
+    start = time.perf_counter()
+    prev_frame_id_map = None
+    motas = []
+    for frame_number in sorted(gt_dict):
+        results = compute_mota_one_frame_per_pair(
+            evaluation,
+            gt_dict[frame_number],
+            pred_dict[frame_number],
+            prev_frame_id_map,
+        )
+        motas.append(results[0])
+        prev_frame_id_map = results[-1]
+    return time.perf_counter() - start, motas
+
+
+def time_matching(
+    gt_dict: dict, pred_dict: dict, matching: str
+) -> tuple[float, list]:
+    """Time the MOTA computation of `TrackerEvaluate`."""
+    evaluation = TrackerEvaluate("", pred_dict, 0.1, Path(), matching=matching)
+    start = time.perf_counter()
+    results = evaluation.compute_mota_per_frame(gt_dict, pred_dict)
+    return time.perf_counter() - start, results["MOTA"]
+
+
+def main(args: argparse.Namespace) -> None:
+    """Run the benchmark and print a table of times per frame."""
+    rng = np.random.default_rng(args.seed)
+    print(
+        f"{'boxes/frame':>11} {'per-pair (ms)':>14} {'greedy (ms)':>12} "
+        f"{'optimal (ms)':>13} {'MOTA greedy':>12} {'MOTA optimal':>13}"
+    )
+    for n_copies in args.n_copies:
+        gt_dict, pred_dict = make_scaled_data(n_copies, args.n_frames, rng)
+        per_pair, motas_per_pair = time_per_pair(gt_dict, pred_dict)
+        greedy, motas_greedy = time_matching(gt_dict, pred_dict, "greedy")
+        optimal, motas_optimal = time_matching(gt_dict, pred_dict, "optimal")
+        assert motas_greedy == motas_per_pair
+
+        n_boxes = len(gt_dict[1]["bbox"])
+        print(
+            f"{n_boxes:>11} {per_pair / args.n_frames * 1e3:>14.3f} "
+            f"{greedy / args.n_frames * 1e3:>12.3f} "
+            f"{optimal / args.n_frames * 1e3:>13.3f} "
+            f"{np.mean(motas_greedy):>12.4f} {np.mean(motas_optimal):>13.4f}"
+        )
+
+
+def benchmark_parse_args():
+    """Parse command-line arguments for the benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--n_copies",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100, 300],
+        help=(
+            "Numbers of copies of the annotated frame tiled in each frame. "
+            "Default: 1 10 100 300."
+        ),
+    )
+    parser.add_argument(
+        "--n_frames",
+        type=int,
+        default=20,
+        help="Number of frames. Default: 20.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Seed of the synthetic data. Default: 42.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(benchmark_parse_args())
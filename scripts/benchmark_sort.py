@@ -0,0 +1,122 @@
+"""Benchmark the Kalman filters of the SORT tracker.
+
+Compares the time per frame of predicting and updating one
+`KalmanBoxTracker` per track with that of a single `KalmanBoxTrackerBank`,
+and reports the time per frame of a full `Sort.update`, for an increasing
+number of tracks.
+
+Example usage:
+    python scripts/benchmark_sort.py --n_tracks 10 100 1000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from crabs.tracker.sort import KalmanBoxTracker, KalmanBoxTrackerBank, Sort
+
+
+def make_boxes(n_tracks: int, n_frames: int, seed: int) -> np.ndarray:
+    """Make non-overlapping boxes moving with constant velocity.
+
+    Returns an array of shape (n_frames, n_tracks, 5), with the boxes in
+    format [x1, y1, x2, y2, score].
+    """
+    rng = np.random.default_rng(seed)
+    n_cols = int(np.ceil(np.sqrt(n_tracks)))
+    grid = np.stack(
+        np.divmod(np.arange(n_tracks), n_cols)[::-1], axis=1
+    ).astype(float)
+    top_left = grid * 50 + rng.uniform(0, 5, size=(n_tracks, 2))
+    velocity = rng.uniform(-1, 1, size=(n_tracks, 2))
+    boxes = np.empty((n_frames, n_tracks, 5))
+    for frame_idx in range(n_frames):
+        position = top_left + frame_idx * velocity
+        boxes[frame_idx, :, :2] = position
+        boxes[frame_idx, :, 2:4] = position + 20
+        boxes[frame_idx, :, 4] = 0.9
+    return boxes
+
+
+def time_per_track_filters(boxes: np.ndarray) -> float:
+    """Time predicting and updating one Kalman filter per track."""
+    trackers = [
+        KalmanBoxTracker(bbox, track_id)
+        for track_id, bbox in enumerate(boxes[0])
+    ]
+    start = time.perf_counter()
+    for frame_boxes in boxes[1:]:
+        for trk in trackers:
+            trk.predict()
+        for trk, bbox in zip(trackers, frame_boxes):
+            trk.update(bbox)
+    return (time.perf_counter() - start) / (len(boxes) - 1)
+
+
+def time_tracker_bank(boxes: np.ndarray) -> float:
+    """Time predicting and updating a bank of Kalman filters."""
+    bank = KalmanBoxTrackerBank()
+    bank.add(boxes[0, :, :4], np.arange(boxes.shape[1]))
+    indices = np.arange(boxes.shape[1])
+    start = time.perf_counter()
+    for frame_boxes in boxes[1:]:
+        bank.predict()
+        bank.update(indices, frame_boxes[:, :4])
+    return (time.perf_counter() - start) / (len(boxes) - 1)
+
+
+def time_sort_update(boxes: np.ndarray) -> float:
+    """Time a full SORT update, including the association step."""
+    sort_tracker = Sort(max_age=10, min_hits=1, iou_threshold=0.1)
+    sort_tracker.update(boxes[0])
+    start = time.perf_counter()
+    for frame_boxes in boxes[1:]:
+        sort_tracker.update(frame_boxes)
+    return (time.perf_counter() - start) / (len(boxes) - 1)
+
+
+def main(args: argparse.Namespace) -> None:
+    """Run the benchmark and print a table of times per frame."""
+    print(
+        f"{'n_tracks':>8} {'per-track (ms)':>15} {'bank (ms)':>10} "
+        f"{'speed-up':>9} {'Sort.update (ms)':>17}"
+    )
+    for n_tracks in args.n_tracks:
+        boxes = make_boxes(n_tracks, args.n_frames, args.seed)
+        per_track = time_per_track_filters(boxes)
+        bank = time_tracker_bank(boxes)
+        sort_update = time_sort_update(boxes)
+        print(
+            f"{n_tracks:>8} {per_track * 1e3:>15.3f} {bank * 1e3:>10.3f} "
+            f"{per_track / bank:>8.1f}x {sort_update * 1e3:>17.3f}"
+        )
+
+
+def benchmark_parse_args():
+    """Parse command-line arguments for the benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--n_tracks",
+        type=int,
+        nargs="+",
+        default=[10, 30, 100, 300, 1000],
+        help="Numbers of tracks to benchmark. Default: 10 30 100 300 1000.",
+    )
+    parser.add_argument(
+        "--n_frames",
+        type=int,
+        default=50,
+        help="Number of frames to track. Default: 50.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Seed of the random boxes. Default: 42.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(benchmark_parse_args())
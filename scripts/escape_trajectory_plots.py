@@ -6,6 +6,45 @@ import matplotlib.pyplot as plt
 import numpy as np
 from movement.io import load_bboxes
 
+from crabs.tracker.utils.io import read_tracks_npz
+
+
+def load_tracks_npz(npz_file):
+    """Read a tracks .npz file as a movement dataset.
+
+    The tracked detections are arranged as arrays of shape
+    (n_frames, n_individuals, ...), with NaN for frames in which an
+    individual is not tracked, as in the datasets read from csv files.
+    """
+    tracks = read_tracks_npz(npz_file)
+    unique_ids, individual_idx = np.unique(tracks["id"], return_inverse=True)
+    n_frames = len(tracks["frame_numbers"])
+
+    position = np.full((n_frames, len(unique_ids), 2), np.nan)
+    shape = np.full((n_frames, len(unique_ids), 2), np.nan)
+    confidence = np.full((n_frames, len(unique_ids)), np.nan)
+    position[tracks["frame"], individual_idx] = np.stack(
+        [
+            tracks["x"] + tracks["w"] / 2,
+            tracks["y"] + tracks["h"] / 2,
+        ],
+        axis=1,
+    )
+    shape[tracks["frame"], individual_idx] = np.stack(
+        [tracks["w"], tracks["h"]], axis=1
+    )
+    confidence[tracks["frame"], individual_idx] = tracks["confidence"]
+
+    ds = load_bboxes.from_numpy(
+        position_array=position,
+        shape_array=shape,
+        confidence_array=confidence,
+        individual_names=[f"id_{int(track_id)}" for track_id in unique_ids],
+        frame_array=tracks["frame_numbers"].reshape(-1, 1),
+    )
+    ds.attrs["source_file"] = str(npz_file)
+    return ds
+
 
 def main(input_data, output_figures_dir):
     """Read input files as movement datasets and generate plots."""
@@ -13,14 +52,14 @@ def main(input_data, output_figures_dir):
     if not output_figures_dir.exists():
         output_figures_dir.mkdir(parents=True)
 
-    # List all csv files in the input directory
-    list_csv_files = [
+    # List all tracks files (csv or npz) in the input directory
+    list_tracks_files = [
         x
         for x in input_data.iterdir()
-        if x.is_file() and x.name.endswith("_tracks.csv")
+        if x.is_file() and x.name.endswith(("_tracks.csv", "_tracks.npz"))
     ]
-    list_csv_files.sort()
-    print(len(list_csv_files))
+    list_tracks_files.sort()
+    print(len(list_tracks_files))
 
     # Prepare plots
     # select whether to plot ID at first frame
@@ -41,11 +80,14 @@ def main(input_data, output_figures_dir):
     )  # 96 colors
 
     # loop thru escape clip files
-    for csv_file in list_csv_files:
+    for tracks_file in list_tracks_files:
         # Create movement ds
-        ds = load_bboxes.from_via_tracks_file(
-            csv_file, fps=None, use_frame_numbers_from_file=False
-        )
+        if tracks_file.suffix == ".npz":
+            ds = load_tracks_npz(tracks_file)
+        else:
+            ds = load_bboxes.from_via_tracks_file(
+                tracks_file, fps=None, use_frame_numbers_from_file=False
+            )
 
         # Print summary metrics
         print(Path(ds.source_file).name)
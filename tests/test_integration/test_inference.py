@@ -6,7 +6,16 @@ from typing import Optional
 import cv2
 import pooch
 import pytest
-
+import torch
+import torchvision
+import yaml
+
+from crabs.tracker.evaluate_tracker import TrackerEvaluate
+from crabs.tracker.utils.detections_store import (
+    compute_file_hash,
+    get_detections_store_path,
+    read_detections_store,
+)
 from crabs.tracker.utils.io import open_video
 
 
@@ -165,3 +174,75 @@ def test_detect_and_track_video(
 
         assert len(list_files) == total_n_frames
         assert all(expected_pattern.match(x.name) for x in list_files)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize(
+    "inference_scale, max_recall_drop",
+    [(0.5, 0.1)],
+)
+def test_detection_recall_with_reduced_inference_scale(
+    input_data_paths: dict,
+    tmp_path: Path,
+    inference_scale: float,
+    max_recall_drop: float,
+):
+    """Compare the detection recall at full and reduced inference resolution.
+
+    The detections of the test clip are computed at both resolutions with
+    the detect-and-track-video entry point in detection-only mode. The
+    recall is the fraction of ground truth boxes that overlap with a
+    detection above the score threshold with an IOU of at least 0.5.
+    The test checks the recall at reduced resolution does not drop by
+    more than `max_recall_drop` relative to the full-resolution recall.
+    """
+    detections_dir = tmp_path / "detections"
+    with open(input_data_paths["tracking_config"]) as f:
+        score_threshold = yaml.safe_load(f)["score_threshold"]
+    ground_truth_dict = TrackerEvaluate(
+        input_data_paths["annotations"], {}, 0.5, tmp_path
+    ).get_ground_truth_data()
+
+    recall = {}
+    for scale, suffix in [(1.0, ""), (inference_scale, "_scale{:g}")]:
+        subprocess.run(
+            [
+                "detect-and-track-video",
+                f"--trained_model_path={input_data_paths['ckpt']}",
+                f"--video_path={input_data_paths['video']}",
+                f"--config_file={input_data_paths['tracking_config']}",
+                f"--detections_dir={detections_dir}",
+                f"--inference_scale={scale}",
+                "--detection_only",
+                "--accelerator=cpu",
+            ],
+            check=True,
+            cwd=tmp_path,
+        )
+        store_path = get_detections_store_path(
+            str(detections_dir),
+            input_data_paths["video"],
+            compute_file_hash(input_data_paths["ckpt"]),
+            suffix=suffix.format(scale),
+        )
+
+        # Count ground truth boxes matched by a detection
+        n_matched, n_ground_truth = 0, 0
+        for frame_idx, detections_dict in read_detections_store(store_path):
+            if frame_idx not in ground_truth_dict:
+                continue
+            gt_boxes = torch.from_numpy(ground_truth_dict[frame_idx]["bbox"])
+            pred_boxes = detections_dict["boxes"][
+                detections_dict["scores"] > score_threshold
+            ]
+            ious = torchvision.ops.box_iou(gt_boxes, pred_boxes)
+            n_matched += (
+                int((ious.max(dim=1).values >= 0.5).sum())
+                if len(pred_boxes)
+                else 0
+            )
+            n_ground_truth += len(gt_boxes)
+        recall[scale] = n_matched / n_ground_truth
+
+    print(f"Detection recall per inference scale: {recall}")
+    assert recall[inference_scale] >= recall[1.0] - max_recall_drop
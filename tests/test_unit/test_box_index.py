@@ -0,0 +1,138 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from crabs.tracker.evaluate_tracker import TrackerEvaluate
+from crabs.tracker.utils.box_index import (
+    MAX_CELLS_PER_BOX,
+    BoxGridIndex,
+    sparse_iou,
+)
+from crabs.tracker.utils.sort import iou_batch
+
+
+def make_boxes(n_boxes: int, rng: np.random.Generator) -> np.ndarray:
+    """Make boxes of varied sizes in a region that scales with their number,
+    so that the density of boxes is constant.
+    """
+    side = 50 * np.sqrt(n_boxes)
+    top_left = rng.uniform(0, side, size=(n_boxes, 2))
+    size = rng.uniform(5, 60, size=(n_boxes, 2))
+    return np.hstack([top_left, top_left + size])
+
+
+@pytest.mark.parametrize("n_boxes", [1, 10, 300])
+@pytest.mark.parametrize("cell_size", [None, 3.0, 1000.0])
+def test_sparse_iou_matches_iou_batch(n_boxes: int, cell_size):
+    """Test the sparse IOU has the same non-zero values as the full
+    IOU matrix, for any size of the grid cells.
+    """
+    rng = np.random.default_rng(42)
+    boxes_a = make_boxes(n_boxes, rng)
+    boxes_b = make_boxes(n_boxes + 5, rng)
+
+    rows, cols, ious = sparse_iou(
+        boxes_a, boxes_b, index=BoxGridIndex(boxes_b, cell_size)
+    )
+
+    iou_matrix = np.zeros((len(boxes_a), len(boxes_b)))
+    iou_matrix[rows, cols] = ious
+    assert np.array_equal(iou_matrix, iou_batch(boxes_a, boxes_b))
+    # pairs are sorted by row and then by column
+    assert np.array_equal(
+        np.stack([rows, cols], axis=1), np.argwhere(iou_matrix)
+    )
+
+
+@pytest.mark.parametrize("large_side", [100.0, 2e5])
+def test_sparse_iou_mixed_box_sizes(large_side: float):
+    """Test boxes much larger than the grid cells are compared with all
+    boxes, rather than expanded to all the cells they cover, both when
+    indexed and when queried.
+    """
+    rng = np.random.default_rng(42)
+    small_boxes = rng.uniform(0, 100, size=(200, 2))
+    small_boxes = np.hstack([small_boxes, small_boxes + 10])
+    large_boxes = np.array(
+        [[0, 0, large_side, large_side], [50, -10, 50 + large_side, 60]]
+    )
+    boxes_a = np.vstack([small_boxes[:100], large_boxes[:1]])
+    boxes_b = np.vstack([large_boxes[1:], small_boxes[100:]])
+
+    index = BoxGridIndex(boxes_b)
+    rows, cols, ious = sparse_iou(boxes_a, boxes_b, index=index)
+
+    # the large box is not in the grid
+    assert len(index.cell_keys) <= MAX_CELLS_PER_BOX * len(boxes_b)
+    iou_matrix = np.zeros((len(boxes_a), len(boxes_b)))
+    iou_matrix[rows, cols] = ious
+    assert np.array_equal(iou_matrix, iou_batch(boxes_a, boxes_b))
+    assert np.array_equal(
+        np.stack([rows, cols], axis=1), np.argwhere(iou_matrix)
+    )
+
+
+def test_sparse_iou_pixel_inclusive():
+    """Test the sparse IOU with inclusive pixel coordinates matches the IOU
+    used to evaluate the tracker, including for boxes that share a single
+    column of pixels.
+    """
+    boxes_a = np.array([[0, 0, 9, 9], [20, 20, 29, 29], [100, 0, 110, 5]])
+    boxes_b = np.array([[9, 0, 19, 9], [5, 5, 24, 24], [0, 50, 9, 59]])
+    boxes_a = boxes_a.astype(float)
+    boxes_b = boxes_b.astype(float)
+
+    rows, cols, ious = sparse_iou(boxes_a, boxes_b, pixel_inclusive=True)
+
+    evaluation = TrackerEvaluate("", {}, 0.1, Path())
+    expected = np.array(
+        [
+            [evaluation.calculate_iou(box_a, box_b) for box_b in boxes_b]
+            for box_a in boxes_a
+        ]
+    )
+    iou_matrix = np.zeros(expected.shape)
+    iou_matrix[rows, cols] = ious
+    assert np.array_equal(iou_matrix, expected)
+    # the first boxes only share the column of pixels x = 9
+    assert (0, 0) in zip(rows, cols)
+
+
+def test_sparse_iou_inverted_boxes():
+    """Test boxes with x2 < x1 are paired if they overlap other boxes as
+    inclusive pixels, and never otherwise.
+    """
+    boxes_a = np.array([[0.0, 0.0, 9.0, 9.0], [20.0, 0.0, 30.0, 9.0]])
+    boxes_b = np.array([[9.4, 0.0, 8.8, 9.0], [28.0, 0.0, 17.0, 9.0]])
+
+    rows, cols, _ = sparse_iou(boxes_a, boxes_b, pixel_inclusive=True)
+    assert list(zip(rows, cols)) == [(0, 0)]
+
+    rows, cols, _ = sparse_iou(boxes_a, boxes_b)
+    assert len(rows) == 0
+
+
+def test_sparse_iou_non_finite_boxes():
+    """Test boxes with non-finite coordinates are not paired."""
+    boxes = np.array(
+        [[0, 0, 10, 10], [np.nan, 0, 10, 10], [5, 5, 15, 15]], dtype=float
+    )
+
+    rows, cols, _ = sparse_iou(boxes, boxes)
+
+    assert 1 not in rows
+    assert 1 not in cols
+    assert list(zip(rows, cols)) == [(0, 0), (0, 2), (2, 0), (2, 2)]
+
+
+@pytest.mark.parametrize("shapes", [(0, 3), (3, 0), (0, 0)])
+def test_sparse_iou_empty(shapes: tuple[int, int]):
+    """Test the sparse IOU of empty sets of boxes is empty."""
+    rng = np.random.default_rng(42)
+    boxes_a = make_boxes(shapes[0], rng).reshape(-1, 4)
+    boxes_b = make_boxes(shapes[1], rng).reshape(-1, 4)
+
+    rows, cols, ious = sparse_iou(boxes_a, boxes_b)
+
+    assert len(rows) == len(cols) == len(ious) == 0
@@ -0,0 +1,211 @@
+import subprocess
+import sys
+
+import pytest
+import torch
+from torchvision.models.detection import fasterrcnn_resnet50_fpn_v2
+
+from crabs.detector.export_model import export_parse_args, main
+from crabs.detector.utils.bundle import (
+    BUNDLE_DTYPES,
+    BUNDLE_FORMAT_VERSION,
+    is_detector_bundle,
+    load_detector_bundle,
+    save_detector_bundle,
+)
+from crabs.detector.utils.evaluate import get_trained_model_params_from_ckpt
+
+
+@pytest.fixture(scope="module")
+def model_state_dict() -> dict[str, torch.Tensor]:
+    """Return the weights of a randomly initialised detector."""
+    torch.manual_seed(42)
+    model = fasterrcnn_resnet50_fpn_v2(
+        weights=None, weights_backbone=None, num_classes=2
+    )
+    return model.state_dict()
+
+
+@pytest.fixture
+def trained_model_params() -> dict:
+    """Return the parameters of a training job."""
+    return {
+        "config": {"num_classes": 2, "learning_rate": 0.001},
+        "cli_args": {"experiment_name": "Sept2023", "seed_n": 42},
+        "run_name": "run_1",
+    }
+
+
+@pytest.fixture
+def lightning_checkpoint(tmp_path, model_state_dict, trained_model_params):
+    """Return the path to a checkpoint with the layout of Lightning's."""
+    ckpt_path = tmp_path / "checkpoints" / "last.ckpt"
+    ckpt_path.parent.mkdir()
+    torch.save(
+        {
+            "state_dict": {
+                f"model.{name}": tensor
+                for name, tensor in model_state_dict.items()
+            },
+            "hyper_parameters": {
+                **trained_model_params,
+                "optuna_log": False,
+            },
+            "optimizer_states": [],
+        },
+        ckpt_path,
+    )
+    return ckpt_path
+
+
+@pytest.mark.parametrize("dtype", list(BUNDLE_DTYPES))
+def test_save_and_load_detector_bundle(
+    tmp_path, model_state_dict, trained_model_params, dtype
+):
+    """Test the detector loaded from a bundle has the exported weights, in
+    float32, and the exported post-processing thresholds.
+    """
+    bundle_path = tmp_path / "detector_bundle.pt"
+    bundle_hash = save_detector_bundle(
+        model_state_dict,
+        trained_model_params,
+        bundle_path,
+        dtype=dtype,
+        postprocessing={"box_score_thresh": 0.3},
+    )
+
+    model, metadata = load_detector_bundle(bundle_path)
+
+    assert not model.training
+    assert model.roi_heads.score_thresh == 0.3
+    assert model.roi_heads.nms_thresh == 0.5
+    assert metadata["sha256"] == bundle_hash
+    assert metadata["dtype"] == dtype
+    for key, value in trained_model_params.items():
+        assert metadata[key] == value
+    for name, tensor in model.state_dict().items():
+        expected = model_state_dict[name]
+        if expected.is_floating_point():
+            expected = expected.to(getattr(torch, dtype)).float()
+        assert tensor.dtype == model_state_dict[name].dtype
+        assert torch.equal(tensor, expected)
+
+
+def test_half_precision_bundle_is_smaller(
+    tmp_path, model_state_dict, trained_model_params
+):
+    """Test a bundle with float16 weights is about half the size."""
+    sizes = {}
+    for dtype in ["float32", "float16"]:
+        bundle_path = tmp_path / f"bundle_{dtype}.pt"
+        save_detector_bundle(
+            model_state_dict, trained_model_params, bundle_path, dtype=dtype
+        )
+        sizes[dtype] = bundle_path.stat().st_size
+
+    assert sizes["float16"] < 0.55 * sizes["float32"]
+
+
+def test_load_detector_bundle_hash_mismatch(
+    tmp_path, model_state_dict, trained_model_params
+):
+    """Test loading a bundle whose weights do not match its hash fails."""
+    bundle_path = tmp_path / "detector_bundle.pt"
+    save_detector_bundle(model_state_dict, trained_model_params, bundle_path)
+
+    bundle = torch.load(bundle_path, weights_only=True)
+    name = next(iter(bundle["state_dict"]))
+    bundle["state_dict"][name] = bundle["state_dict"][name] + 1
+    torch.save(bundle, bundle_path)
+
+    with pytest.raises(ValueError, match="do not match its hash"):
+        load_detector_bundle(bundle_path)
+
+    # the check can be skipped
+    load_detector_bundle(bundle_path, verify_hash=False)
+
+
+def test_is_detector_bundle(
+    tmp_path, model_state_dict, trained_model_params, lightning_checkpoint
+):
+    """Test bundles are told apart from Lightning checkpoints."""
+    bundle_path = tmp_path / "detector_bundle.pt"
+    save_detector_bundle(model_state_dict, trained_model_params, bundle_path)
+
+    assert is_detector_bundle(bundle_path)
+    assert not is_detector_bundle(lightning_checkpoint)
+    assert not is_detector_bundle(tmp_path / "missing.pt")
+
+
+@pytest.mark.parametrize(
+    "modification, error_message",
+    [
+        ({"format_version": BUNDLE_FORMAT_VERSION + 1}, "Please update"),
+        ({"sha256": "0" * 64}, "do not match its hash"),
+    ],
+)
+def test_unsupported_bundle_is_detector_bundle(
+    modification: dict,
+    error_message: str,
+    tmp_path,
+    model_state_dict,
+    trained_model_params,
+):
+    """Test bundles of a newer format version or with a wrong hash are
+    recognised as bundles, and fail to load with an explicit error.
+    """
+    bundle_path = tmp_path / "detector_bundle.pt"
+    save_detector_bundle(model_state_dict, trained_model_params, bundle_path)
+    bundle = torch.load(bundle_path, weights_only=True)
+    torch.save({**bundle, **modification}, bundle_path)
+
+    assert is_detector_bundle(bundle_path)
+    with pytest.raises(ValueError, match=error_message):
+        load_detector_bundle(bundle_path)
+
+
+def test_load_detector_bundle_without_lightning(
+    tmp_path, model_state_dict, trained_model_params
+):
+    """Test loading a bundle does not import Lightning or MLflow."""
+    bundle_path = tmp_path / "detector_bundle.pt"
+    save_detector_bundle(model_state_dict, trained_model_params, bundle_path)
+
+    code = (
+        "import sys\n"
+        "from crabs.detector.utils.bundle import load_detector_bundle\n"
+        f"load_detector_bundle({str(bundle_path)!r})\n"
+        "assert 'lightning' not in sys.modules\n"
+        "assert 'mlflow' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_export_detector(
+    tmp_path, model_state_dict, trained_model_params, lightning_checkpoint
+):
+    """Test exporting a Lightning checkpoint as a bundle."""
+    bundle_path = tmp_path / "export" / "detector_bundle.pt"
+    main(
+        export_parse_args(
+            [
+                "--trained_model_path",
+                str(lightning_checkpoint),
+                "--output_path",
+                str(bundle_path),
+                "--dtype",
+                "float16",
+            ]
+        )
+    )
+
+    model, metadata = load_detector_bundle(bundle_path)
+    assert metadata["dtype"] == "float16"
+    assert model.state_dict().keys() == model_state_dict.keys()
+
+    # the parameters of the training job are read from the bundle
+    # as from a checkpoint
+    assert (
+        get_trained_model_params_from_ckpt(str(bundle_path))
+        == trained_model_params
+    )
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+import torch
+
+from crabs.tracker.utils.detections_store import (
+    DetectionsStoreWriter,
+    compute_file_hash,
+    get_detections_store_path,
+    read_detections_store,
+)
+
+
+@pytest.fixture()
+def detections_per_frame() -> list[dict]:
+    """Return detections of 4 frames, with no detections in one frame."""
+    rng = np.random.default_rng(42)
+    detections = []
+    for n_detections in [3, 0, 1, 5]:
+        detections.append(
+            {
+                "boxes": torch.from_numpy(
+                    rng.uniform(0, 100, size=(n_detections, 4)).astype(
+                        np.float32
+                    )
+                ),
+                "scores": torch.from_numpy(
+                    rng.uniform(size=n_detections).astype(np.float32)
+                ),
+                "labels": torch.ones(n_detections, dtype=torch.int64),
+            }
+        )
+    return detections
+
+
+@pytest.mark.parametrize("partial", [True, False])
+def test_compute_file_hash(partial, tmp_path, monkeypatch):
+    """Test the partial hash only depends on the size and the first and
+    last chunks of the file.
+    """
+    monkeypatch.setattr(
+        "crabs.tracker.utils.detections_store.VIDEO_HASH_CHUNK_SIZE", 4
+    )
+    file_a = tmp_path / "a.bin"
+    file_b = tmp_path / "b.bin"
+    file_a.write_bytes(b"0123456789abcdef")
+    file_b.write_bytes(b"0123XXXXXXXXcdef")  # same start, end and size
+
+    hash_a = compute_file_hash(str(file_a), partial=partial)
+    hash_b = compute_file_hash(str(file_b), partial=partial)
+
+    assert (hash_a == hash_b) == partial
+    assert hash_a == compute_file_hash(str(file_a), partial=partial)
+
+
+def test_get_detections_store_path(tmp_path):
+    """Test the store path depends on both the model and the video."""
+    video_path = tmp_path / "video.mp4"
+    video_path.write_bytes(b"video")
+    model_a = tmp_path / "model_a.ckpt"
+    model_a.write_bytes(b"model a")
+    model_b = tmp_path / "model_b.ckpt"
+    model_b.write_bytes(b"model b")
+
+    store_path_a = get_detections_store_path(
+        str(tmp_path), str(video_path), compute_file_hash(str(model_a))
+    )
+    store_path_b = get_detections_store_path(
+        str(tmp_path), str(video_path), compute_file_hash(str(model_b))
+    )
+
+    assert store_path_a.name.startswith("video_detections_")
+    assert store_path_a.suffix == ".npz"
+    assert store_path_a != store_path_b
+
+
+@pytest.mark.parametrize("start_frame_idx", [0, 1, 3, 4])
+def test_detections_store_roundtrip(
+    start_frame_idx, detections_per_frame, tmp_path
+):
+    """Test detections read from the store match the detections written."""
+    store_path = tmp_path / "store" / "detections.npz"
+    writer = DetectionsStoreWriter(store_path)
+    for frame_idx, detections_dict in enumerate(detections_per_frame):
+        writer.add_frame(frame_idx, detections_dict)
+    writer.save()
+
+    stored_detections = list(
+        read_detections_store(store_path, start_frame_idx)
+    )
+
+    assert [frame_idx for frame_idx, _ in stored_detections] == list(
+        range(start_frame_idx, len(detections_per_frame))
+    )
+    for frame_idx, detections_dict in stored_detections:
+        for key in ["boxes", "scores", "labels"]:
+            assert torch.equal(
+                detections_dict[key], detections_per_frame[frame_idx][key]
+            )
+
+
+def test_detections_store_frames_out_of_order(detections_per_frame, tmp_path):
+    """Test frames must be added to the store in order."""
+    writer = DetectionsStoreWriter(tmp_path / "detections.npz")
+    with pytest.raises(ValueError, match="Expected detections of frame 0"):
+        writer.add_frame(1, detections_per_frame[1])
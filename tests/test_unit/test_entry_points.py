@@ -10,7 +10,10 @@ import pytest
         "combine-annotations",
         "train-detector",
         "evaluate-detector",
+        "export-detector",
         "detect-and-track-video",
+        "sweep-tracker",
+        "evaluate-tracker",
     ],
 )
 def test_smoke(cli_command: str) -> None:
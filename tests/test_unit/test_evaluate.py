@@ -1,8 +1,11 @@
+import pytest
 import torch
 
 from crabs.detector.utils.evaluate import (
     compute_confusion_matrix_elements,
     compute_precision_recall,
+    get_trained_model_params_from_ckpt,
+    parse_mlflow_parameters,
 )
 
 
@@ -72,3 +75,153 @@ def test_compute_confusion_matrix_elements():
     assert class_stats["crab"]["tp"] == 1
     assert class_stats["crab"]["fp"] == 1
     assert class_stats["crab"]["fn"] == 2
+
+
+def test_compute_confusion_matrix_elements_label_mismatch():
+    """Test a detection overlapping a GT box with a different label is a
+    false positive, but the GT box is not a false negative.
+    """
+    gt_boxes = torch.tensor([[0.0, 0.0, 10.0, 10.0], [20.0, 20.0, 30.0, 30.0]])
+    targets = [{"boxes": gt_boxes, "labels": torch.tensor([1, 1])}]
+    detections = [
+        {
+            "boxes": gt_boxes.clone(),
+            "labels": torch.tensor([1, 2]),
+            "scores": torch.tensor([0.9, 0.8]),
+        }
+    ]
+
+    _, _, class_stats = compute_confusion_matrix_elements(
+        targets, detections, 0.5
+    )
+
+    assert class_stats["crab"] == {"tp": 1, "fp": 1, "fn": 0}
+
+
+@pytest.mark.parametrize(
+    "n_gt, n_detections, expected_stats",
+    [
+        (0, 2, {"tp": 0, "fp": 2, "fn": 0}),
+        (3, 0, {"tp": 0, "fp": 0, "fn": 3}),
+        (0, 0, {"tp": 0, "fp": 0, "fn": 0}),
+    ],
+)
+def test_compute_confusion_matrix_elements_empty(
+    n_gt: int, n_detections: int, expected_stats: dict
+):
+    """Test images without GT boxes or without detections."""
+    boxes = torch.tensor([[0.0, 0.0, 10.0, 10.0]]).repeat(3, 1)
+    targets = [
+        {
+            "boxes": boxes[:n_gt].reshape(-1, 4),
+            "labels": torch.ones(n_gt, dtype=torch.int64),
+        }
+    ]
+    detections = [
+        {
+            "boxes": boxes[:n_detections].reshape(-1, 4),
+            "labels": torch.ones(n_detections, dtype=torch.int64),
+            "scores": torch.ones(n_detections),
+        }
+    ]
+
+    _, _, class_stats = compute_confusion_matrix_elements(
+        targets, detections, 0.5
+    )
+
+    assert class_stats["crab"] == expected_stats
+
+
+@pytest.fixture
+def trained_model_params() -> dict:
+    """Return the parameters of a training job."""
+    return {
+        "config": {
+            "num_classes": 2,
+            "learning_rate": 0.001,
+            "checkpoint_saving": {"every_n_epochs": 50, "save_last": True},
+        },
+        "cli_args": {
+            "experiment_name": "Sept2023",
+            "dataset_dirs": ["/data/Sept2023"],
+            "seed_n": 42,
+            "checkpoint_path": None,
+        },
+        "run_name": "run_1",
+    }
+
+
+def test_get_trained_model_params_from_ckpt(
+    tmp_path, trained_model_params, monkeypatch
+):
+    """Test the parameters of the training job are read from the checkpoint,
+    without looking up its MLflow run.
+    """
+    ckpt_path = tmp_path / "last.ckpt"
+    torch.save(
+        {
+            "state_dict": {"weights": torch.zeros(3)},
+            "hyper_parameters": {**trained_model_params, "optuna_log": False},
+        },
+        ckpt_path,
+    )
+
+    def _get_mlflow_parameters_from_ckpt(trained_model_path):
+        raise AssertionError("MLflow run should not be looked up")
+
+    monkeypatch.setattr(
+        "crabs.detector.utils.evaluate.get_mlflow_parameters_from_ckpt",
+        _get_mlflow_parameters_from_ckpt,
+    )
+
+    params = get_trained_model_params_from_ckpt(str(ckpt_path))
+    assert params == trained_model_params
+
+    # modifying the returned parameters does not modify those of later calls
+    params["config"]["num_classes"] = 3
+    assert get_trained_model_params_from_ckpt(str(ckpt_path)) == (
+        trained_model_params
+    )
+
+
+def test_get_trained_model_params_from_ckpt_mlflow_fallback(
+    tmp_path, trained_model_params, monkeypatch
+):
+    """Test the parameters missing from older checkpoints are read from the
+    parameters of their MLflow run.
+    """
+    ckpt_path = tmp_path / "checkpoints" / "last.ckpt"
+    ckpt_path.parent.mkdir()
+    torch.save(
+        {
+            "state_dict": {},
+            "hyper_parameters": {
+                "config": trained_model_params["config"],
+                "optuna_log": False,
+            },
+        },
+        ckpt_path,
+    )
+
+    # MLflow parameters are strings, with nested keys separated by "/"
+    mlflow_params = {
+        "config/num_classes": "2",
+        "config/learning_rate": "0.001",
+        "config/checkpoint_saving/every_n_epochs": "50",
+        "config/checkpoint_saving/save_last": "True",
+        "cli_args/experiment_name": "Sept2023",
+        "cli_args/dataset_dirs": "['/data/Sept2023']",
+        "cli_args/seed_n": "42",
+        "cli_args/checkpoint_path": "None",
+        "run_name": "run_1",
+    }
+    monkeypatch.setattr(
+        "crabs.detector.utils.evaluate.get_mlflow_parameters_from_ckpt",
+        lambda trained_model_path: mlflow_params,
+    )
+
+    assert parse_mlflow_parameters(mlflow_params) == trained_model_params
+    assert (
+        get_trained_model_params_from_ckpt(str(ckpt_path))
+        == trained_model_params
+    )
@@ -1,9 +1,19 @@
+import pickle
 from pathlib import Path
 
 import numpy as np
 import pytest
 
-from crabs.tracker.evaluate_tracker import TrackerEvaluate
+from crabs.tracker.evaluate_tracker import (
+    TrackerEvaluate,
+    evaluate_parse_args,
+    main,
+    pair_tracks_and_annotations,
+)
+from crabs.tracker.utils.io import (
+    TrackedDetectionsNPZWriter,
+    write_tracked_detections_to_csv,
+)
 
 
 @pytest.fixture
@@ -502,13 +512,16 @@ def test_calculate_iou(box1, box2, expected_iou, tracker_evaluate_interface):
         ),
     ],
 )
+@pytest.mark.parametrize("matching", ["optimal", "greedy"])
 def test_compute_mota_one_frame(
     gt_data,
     pred_data,
     prev_frame_id_map,
     expected_output,
+    matching,
     tracker_evaluate_interface,
 ):
+    tracker_evaluate_interface.matching = matching
     (
         mota,
         true_positives,
@@ -529,3 +542,433 @@ def test_compute_mota_one_frame(
     assert false_positives == expected_output[3]
     assert num_switches == expected_output[4]
     assert total_gt == (true_positives + missed_detections)
+
+
+@pytest.mark.parametrize(
+    "matching, expected_matches",
+    [
+        ("greedy", {1: np.nan, 2: 11}),
+        ("optimal", {1: 11, 2: 12}),
+    ],
+)
+def test_compute_mota_one_frame_matching(
+    matching, expected_matches, tracker_evaluate_interface
+):
+    """Test the greedy matching takes the best ground truth box for each
+    tracked box in turn, and the optimal matching maximises the number of
+    matches.
+    """
+    gt_data = {
+        "bbox": np.array([[0.0, 0.0, 9.0, 9.0], [5.0, 0.0, 14.0, 9.0]]),
+        "id": np.array([1, 2]),
+    }
+    # the first tracked box overlaps both ground truth boxes, but most
+    # the second one (IoU 0.82 vs 0.43), which is the only one that the
+    # second tracked box overlaps (IoU 0.18)
+    pred_data = {
+        "tracked_boxes": np.array(
+            [[4.0, 0.0, 13.0, 9.0], [12.0, 0.0, 21.0, 9.0]]
+        ),
+        "ids": np.array([11, 12]),
+    }
+    tracker_evaluate_interface.matching = matching
+
+    (
+        _,
+        true_positives,
+        missed_detections,
+        false_positives,
+        _,
+        _,
+        gt_to_tracked_id,
+    ) = tracker_evaluate_interface.compute_mota_one_frame(
+        gt_data, pred_data, 0.1, None
+    )
+
+    n_matches = 2 if matching == "optimal" else 1
+    assert true_positives == n_matches
+    assert missed_detections == 2 - n_matches
+    assert false_positives == 2 - n_matches
+    assert gt_to_tracked_id == pytest.approx(expected_matches, nan_ok=True)
+
+
+def compute_mota_one_frame_scalar(
+    evaluation: TrackerEvaluate,
+    gt_data: dict,
+    pred_data: dict,
+    iou_threshold: float,
+    gt_to_tracked_id_previous_frame,
+) -> tuple:
+    """Compute the MOTA components of a frame with the scalar loop of
+    earlier versions, which the greedy matching should reproduce.
+    """
+    indices_of_matched_gt_boxes: set = set()
+    gt_to_tracked_id_current_frame: dict = {}
+    false_positive = 0
+    for pred_box, pred_id in zip(pred_data["tracked_boxes"], pred_data["ids"]):
+        best_iou = 0.0
+        index_gt_best_match = None
+        index_gt_not_match = None
+        for j, gt_box in enumerate(gt_data["bbox"]):
+            if j not in indices_of_matched_gt_boxes:
+                iou = evaluation.calculate_iou(gt_box, pred_box)
+                if iou > iou_threshold and iou > best_iou:
+                    best_iou = iou
+                    index_gt_best_match = j
+                else:
+                    index_gt_not_match = j
+        if index_gt_best_match is not None:
+            indices_of_matched_gt_boxes.add(index_gt_best_match)
+            gt_to_tracked_id_current_frame[
+                int(gt_data["id"][index_gt_best_match])
+            ] = int(pred_id)
+        else:
+            false_positive += 1
+        if index_gt_not_match is not None:
+            gt_to_tracked_id_current_frame[
+                int(gt_data["id"][index_gt_not_match])
+            ] = np.nan
+
+    true_positive = len(indices_of_matched_gt_boxes)
+    num_switches = evaluation.count_identity_switches(
+        gt_to_tracked_id_previous_frame, gt_to_tracked_id_current_frame
+    )
+    return (
+        true_positive,
+        len(gt_data["bbox"]) - true_positive,
+        false_positive,
+        num_switches,
+        gt_to_tracked_id_current_frame,
+    )
+
+
+def test_greedy_matching_matches_scalar_loop():
+    """Test the greedy matching gives the same MOTA components and mapping
+    of IDs as the scalar loop of earlier versions, on random frames with
+    overlapping boxes, missed detections and swapped IDs.
+    """
+    rng = np.random.default_rng(0)
+    evaluation = TrackerEvaluate("", {}, 0.1, Path(), matching="greedy")
+    evaluation_scalar = TrackerEvaluate("", {}, 0.1, Path())
+    gt_to_tracked_id = gt_to_tracked_id_scalar = None
+    for _ in range(300):
+        # ground truth boxes clustered in a small region
+        n_gt = rng.integers(1, 8)
+        top_left = rng.uniform(0, 40, size=(n_gt, 2))
+        gt_data = {
+            "bbox": np.hstack([top_left, top_left + 15]),
+            "id": rng.choice(40, size=n_gt, replace=False) + 1,
+        }
+        # tracked boxes: some ground truth boxes with noise, and some
+        # false positives, with IDs from a small pool
+        kept = rng.random(n_gt) < 0.8
+        n_false = rng.integers(0, 3)
+        top_left_false = rng.uniform(0, 40, size=(n_false, 2))
+        pred_data = {
+            "tracked_boxes": np.vstack(
+                [
+                    gt_data["bbox"][kept] + rng.normal(0, 3, (kept.sum(), 4)),
+                    np.hstack([top_left_false, top_left_false + 15]),
+                ]
+            ),
+            "ids": rng.choice(40, size=kept.sum() + n_false, replace=False)
+            + 1,
+        }
+
+        *components, gt_to_tracked_id = evaluation.compute_mota_one_frame(
+            gt_data, pred_data, 0.1, gt_to_tracked_id
+        )
+        (
+            *components_scalar,
+            gt_to_tracked_id_scalar,
+        ) = compute_mota_one_frame_scalar(
+            evaluation_scalar,
+            gt_data,
+            pred_data,
+            0.1,
+            gt_to_tracked_id_scalar,
+        )
+
+        # true positives, missed detections, false positives and switches
+        assert components[1:5] == components_scalar
+        assert list(gt_to_tracked_id) == list(gt_to_tracked_id_scalar)
+        assert gt_to_tracked_id == pytest.approx(
+            gt_to_tracked_id_scalar, nan_ok=True
+        )
+
+
+def test_optimal_matching_missed_detection_no_switch():
+    """Test a crab missed in one frame and tracked again with the same ID
+    in the next frames does not count as an identity switch.
+    """
+    gt_frame = {
+        "bbox": np.array([[0.0, 0.0, 9.0, 9.0], [50.0, 0.0, 59.0, 9.0]]),
+        "id": np.array([1, 2]),
+    }
+    tracked_frame = {
+        "tracked_boxes": gt_frame["bbox"],
+        "ids": np.array([11, 12]),
+    }
+    missed_frame = {
+        "tracked_boxes": gt_frame["bbox"][1:],
+        "ids": np.array([12]),
+    }
+    ground_truth_dict = {frame: gt_frame for frame in range(1, 5)}
+    predicted_dict = {
+        1: tracked_frame,
+        2: missed_frame,
+        3: tracked_frame,
+        4: tracked_frame,
+    }
+
+    results = TrackerEvaluate(
+        "", predicted_dict, 0.1, Path()
+    ).compute_mota_per_frame(ground_truth_dict, predicted_dict)
+
+    assert results["Missed Detections"] == [0, 1, 0, 0]
+    assert results["Number of Switches"] == [0, 0, 0, 0]
+
+
+@pytest.mark.parametrize("matching", ["optimal", "greedy"])
+def test_compute_metrics(matching):
+    """Test the metrics across frames are computed in the same pass as the
+    MOTA per frame, and do not change its results.
+    """
+    rng = np.random.default_rng(42)
+    ground_truth_dict, predicted_dict = {}, {}
+    gt_boxes = np.array([[0.0, 0.0, 9.0, 9.0], [50.0, 0.0, 59.0, 9.0]])
+    for frame_number in range(1, 11):
+        ground_truth_dict[frame_number] = {
+            "bbox": gt_boxes,
+            "id": np.array([1, 2]),
+        }
+        predicted_dict[frame_number] = {
+            "tracked_boxes": gt_boxes + rng.uniform(-2, 2, size=(2, 4)),
+            "ids": np.array([11, 12]) if frame_number < 6 else [12, 11],
+        }
+
+    results, summary_metrics = TrackerEvaluate(
+        "", predicted_dict, 0.1, Path(), matching=matching
+    ).compute_metrics(ground_truth_dict, predicted_dict)
+    expected_results = TrackerEvaluate(
+        "", predicted_dict, 0.1, Path(), matching=matching
+    ).compute_mota_per_frame(ground_truth_dict, predicted_dict)
+
+    assert results == expected_results
+    assert summary_metrics["IDF1"] == 0.5
+    assert 0.5 < summary_metrics["MOTP"] < 1.0
+    assert 0 < summary_metrics["HOTA"] < summary_metrics["DetA"]
+
+
+def test_online_evaluation(tmp_path):
+    """Test feeding the tracked detections frame by frame, including all
+    the frames of the video and resuming from a saved state, gives the
+    same metrics as evaluating them at the end.
+    """
+    annotations_file = Path(__file__).parents[1] / "data" / "gt_test.csv"
+    ground_truth_dict = TrackerEvaluate(
+        annotations_file, {}, 0.1, tmp_path
+    ).get_ground_truth_data()
+    rng = np.random.default_rng(42)
+    predicted_dict = {}
+    for frame_idx in range(max(ground_truth_dict) + 5):
+        gt_data = ground_truth_dict.get(
+            frame_idx, {"bbox": np.empty((0, 4)), "id": np.empty(0)}
+        )
+        predicted_dict[frame_idx] = {
+            "tracked_boxes": gt_data["bbox"]
+            + rng.uniform(-20, 20, size=gt_data["bbox"].shape),
+            "ids": rng.permutation(gt_data["id"]) + 100,
+        }
+
+    expected_results, expected_metrics = TrackerEvaluate(
+        annotations_file, predicted_dict, 0.1, tmp_path
+    ).compute_metrics(ground_truth_dict, predicted_dict)
+
+    evaluation = TrackerEvaluate(annotations_file, {}, 0.1, tmp_path)
+    evaluation.start_online_evaluation()
+    mota_values = []
+    for frame_idx, pred_data in predicted_dict.items():
+        mota = evaluation.update(frame_idx, pred_data)
+        if mota is not None:
+            mota_values.append(mota)
+        if frame_idx == len(predicted_dict) // 2:
+            # resume from a copy of the state in a new evaluation
+            state = pickle.loads(pickle.dumps(evaluation.online_state))
+            evaluation = TrackerEvaluate(annotations_file, {}, 0.1, tmp_path)
+            evaluation.start_online_evaluation(ground_truth_dict)
+            evaluation.load_online_state(state)
+    assert mota_values == expected_results["MOTA"]
+    assert evaluation.get_running_mota() == np.mean(mota_values)
+
+    assert evaluation.finish_online_evaluation() == expected_results["MOTA"]
+    assert evaluation.online_state["results"] == expected_results
+    assert evaluation.online_state["metrics"].compute() == expected_metrics
+    assert (tmp_path / "tracking_metrics_output.csv").exists()
+
+
+def test_online_evaluation_out_of_order():
+    """Test an error is raised if frames are not fed in increasing order."""
+    evaluation = TrackerEvaluate("", {}, 0.1, Path())
+    evaluation.start_online_evaluation(ground_truth_dict={})
+    pred_data = {"tracked_boxes": np.empty((0, 4)), "ids": np.empty(0)}
+    assert evaluation.update(3, pred_data) is None
+    assert np.isnan(evaluation.get_running_mota())
+
+    with pytest.raises(ValueError, match="increasing order"):
+        evaluation.update(2, pred_data)
+
+
+def test_invalid_matching():
+    """Test an unknown matching method raises an error."""
+    with pytest.raises(ValueError, match="Matching method should be one of"):
+        TrackerEvaluate("", {}, 0.1, Path(), matching="hungarian")
+
+
+def test_get_predicted_data_from_csv(tmp_path):
+    """Test predictions read from a csv file match the predictions
+    passed as a dictionary, for the required frames only.
+    """
+    predicted_dict = {
+        0: {
+            "tracked_boxes": np.array([[10.0, 20.0, 30.0, 40.0]]),
+            "ids": np.array([1.0]),
+            "scores": np.array([0.9]),
+        },
+        2: {
+            "tracked_boxes": np.array(
+                [[15.0, 25.0, 35.0, 45.0], [50.0, 60.0, 70.0, 80.0]]
+            ),
+            "ids": np.array([1.0, 2.0]),
+            "scores": np.array([0.85, 0.5]),
+        },
+    }
+    csv_file_path = tmp_path / "predictions.csv"
+    write_tracked_detections_to_csv(
+        csv_file_path, predicted_dict, "frame_{frame_idx:08d}.png", 8888
+    )
+    annotations_file_csv = Path(__file__).parents[1] / "data" / "gt_test.csv"
+    tracker_evaluate = TrackerEvaluate(
+        annotations_file_csv,
+        predicted_boxes_dict=csv_file_path,
+        iou_threshold=0.1,
+        tracking_output_dir=tmp_path,
+    )
+
+    predicted_data = tracker_evaluate.get_predicted_data([1, 2])
+
+    # frame 0 is not required, frame 1 has no predictions
+    assert list(sorted(predicted_data.keys())) == [1, 2]
+    assert predicted_data[1]["tracked_boxes"].shape == (0, 4)
+    for key in ["tracked_boxes", "ids", "scores"]:
+        assert len(predicted_data[1][key]) == 0
+        assert np.allclose(predicted_data[2][key], predicted_dict[2][key])
+
+
+@pytest.mark.parametrize(
+    "annotations_files, expected_annotations",
+    [
+        (["gt.csv"], ["gt.csv", "gt.csv", "gt.csv"]),
+        (
+            ["clip10_gt.csv", "clip1.csv", "dir/clip2-annotations.csv"],
+            ["clip1.csv", "dir/clip2-annotations.csv", "clip10_gt.csv"],
+        ),
+    ],
+)
+def test_pair_tracks_and_annotations(annotations_files, expected_annotations):
+    """Test tracks files are paired with the annotations file that starts
+    with the name of their video, or with the only annotations file.
+    """
+    tracks_files = ["clip1_tracks.csv", "clip2_tracks.npz", "clip10.csv"]
+
+    pairs = pair_tracks_and_annotations(tracks_files, annotations_files)
+
+    assert pairs == list(zip(tracks_files, expected_annotations))
+
+
+@pytest.mark.parametrize(
+    "annotations_files", [["clip1.csv", "clip2.csv"], ["a.csv", "clip1.csv"]]
+)
+def test_pair_tracks_and_annotations_error(annotations_files):
+    """Test an error is raised if a tracks file matches no or several
+    annotations files.
+    """
+    with pytest.raises(ValueError, match="Expected one annotations file"):
+        pair_tracks_and_annotations(
+            ["clip1_tracks.csv", "clip3_tracks.csv"],
+            annotations_files + ["clip1_v2.csv"],
+        )
+
+
+def test_evaluate_tracker(tmp_path):
+    """Test tracks files in a directory are evaluated against their
+    annotations, with the same metrics as `TrackerEvaluate`.
+    """
+    annotations_file = Path(__file__).parents[1] / "data" / "gt_test.csv"
+    ground_truth_dict = TrackerEvaluate(
+        annotations_file, {}, 0.1, tmp_path
+    ).get_ground_truth_data()
+
+    # Write the ground truth as tracks, with some boxes shifted in video_b
+    tracks_dir = tmp_path / "tracks"
+    annotations_dir = tmp_path / "annotations"
+    tracks_dir.mkdir()
+    annotations_dir.mkdir()
+    predicted_dicts = {}
+    for video_name, shift in [("video_a", 0), ("video_b", 100)]:
+        (annotations_dir / f"{video_name}_gt.csv").write_bytes(
+            annotations_file.read_bytes()
+        )
+        predicted_dicts[video_name] = {
+            frame_number: {
+                "tracked_boxes": frame_data["bbox"] + shift * (i % 2),
+                "ids": frame_data["id"],
+                "scores": np.ones(len(frame_data["id"])),
+            }
+            for i, (frame_number, frame_data) in enumerate(
+                sorted(ground_truth_dict.items())
+            )
+        }
+    write_tracked_detections_to_csv(
+        tracks_dir / "video_a_tracks.csv",
+        predicted_dicts["video_a"],
+        "frame_{frame_idx:08d}.png",
+    )
+    with TrackedDetectionsNPZWriter(
+        str(tracks_dir / "video_b_tracks.npz")
+    ) as npz_writer:
+        for frame_idx in range(max(ground_truth_dict) + 1):
+            frame_data = predicted_dicts["video_b"].get(
+                frame_idx,
+                {"tracked_boxes": [], "ids": [], "scores": []},
+            )
+            npz_writer.write_frame(frame_idx, **frame_data)
+    (tracks_dir / "notes.txt").touch()
+
+    results_df = main(
+        evaluate_parse_args(
+            [
+                f"--tracks_files={tracks_dir}",
+                f"--annotations_files={annotations_dir}",
+                "--n_workers=2",
+                f"--output_dir={tmp_path / 'evaluation_output'}",
+            ]
+        )
+    )
+
+    assert (tmp_path / "evaluation_output" / "tracker_evaluation.csv").exists()
+    assert list(results_df["Video"]) == ["video_a", "video_b"]
+    for video_name, row in results_df.set_index("Video").iterrows():
+        evaluation = TrackerEvaluate(
+            annotations_file, predicted_dicts[video_name], 0.1, tmp_path
+        )
+        results = evaluation.compute_mota_per_frame(
+            ground_truth_dict, predicted_dicts[video_name]
+        )
+        assert row["MOTA"] == pytest.approx(np.mean(results["MOTA"]))
+        assert row["False Positives"] == sum(results["False Positives"])
+    assert results_df["MOTA"].iloc[0] == 1.0
+    assert results_df["MOTA"].iloc[1] < 1.0
+    for metric in ["IDF1", "HOTA"]:
+        assert results_df[metric].iloc[0] == pytest.approx(1.0)
+        assert results_df[metric].iloc[1] < 1.0
@@ -0,0 +1,92 @@
+import subprocess
+import sys
+
+import pytest
+
+# Packages that are slow to import, and should only be imported by the
+# code paths that use them
+HEAVY_PACKAGES = {
+    "lightning",
+    "matplotlib",
+    "mlflow",
+    "optuna",
+    "pandas",
+    "sleap",
+    "torch",
+    "torchvision",
+}
+
+
+def get_import_times(module: str, script_name: str) -> dict[str, int]:
+    """Run the `--help` of an entry point in a new interpreter and return
+    the cumulative import time of each imported module, in microseconds.
+
+    The entry point is the `app_wrapper` function of the module, run as
+    the console script `script_name` would run it.
+    """
+    code = (
+        "import sys\n"
+        f"from {module} import app_wrapper\n"
+        f"sys.argv = ['{script_name}', '--help']\n"
+        "app_wrapper()"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert f"usage: {script_name}" in result.stdout.lower()
+
+    # each line reads "import time: <self> | <cumulative> | <name>",
+    # with the name indented by the import depth
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        import_times[name.strip()] = int(cumulative)
+    return import_times
+
+
+@pytest.mark.parametrize(
+    "script_name, module, budget_s",
+    [
+        (
+            "extract-frames",
+            "crabs.bboxes_labelling.extract_frames_to_label_w_sleap",
+            1.5,
+        ),
+        (
+            "combine-annotations",
+            "crabs.bboxes_labelling.combine_and_format_annotations",
+            1.5,
+        ),
+        ("train-detector", "crabs.detector.train_model", 1.5),
+        ("evaluate-detector", "crabs.detector.evaluate_model", 1.5),
+        ("export-detector", "crabs.detector.export_model", 1.5),
+        # the tracker needs scipy and filterpy, which take about 1 s to
+        # import
+        ("detect-and-track-video", "crabs.tracker.track_video", 4),
+        ("sweep-tracker", "crabs.tracker.sweep_tracker", 4),
+        ("evaluate-tracker", "crabs.tracker.evaluate_tracker", 4),
+    ],
+)
+def test_entry_point_help_import_time(
+    script_name: str, module: str, budget_s: float
+) -> None:
+    """Test the `--help` of the entry points does not import heavy
+    packages, and their modules are imported within a time budget.
+
+    The budgets are generous, so that the test is not flaky on slow
+    machines, but would be exceeded if torch or Lightning were imported.
+    """
+    import_times = get_import_times(module, script_name)
+
+    heavy_imports = HEAVY_PACKAGES & {
+        name.split(".")[0] for name in import_times
+    }
+    assert not heavy_imports
+
+    import_time_s = import_times[module] / 1e6
+    assert import_time_s < budget_s
@@ -0,0 +1,70 @@
+import pytest
+import torch
+from torchvision.models._api import WeightsEnum
+from torchvision.models.detection import fasterrcnn_resnet50_fpn_v2
+
+from crabs.detector.models import FasterRCNN
+
+
+@pytest.fixture
+def no_weights_download(monkeypatch):
+    """Make any attempt to get torchvision pretrained weights fail."""
+
+    def _get_state_dict(*args, **kwargs):
+        raise AssertionError("Pretrained weights should not be loaded")
+
+    monkeypatch.setattr(WeightsEnum, "get_state_dict", _get_state_dict)
+
+
+def test_load_from_checkpoint_skips_pretrained_weights(
+    tmp_path, no_weights_download
+):
+    """Test restoring a model from a checkpoint does not load the
+    pretrained weights, and restores the weights in the checkpoint.
+    """
+    config = {"num_classes": 2, "pretrained_weights": "DEFAULT"}
+    model = FasterRCNN(config, load_pretrained_weights=False)
+    with torch.no_grad():
+        for param in model.parameters():
+            param.fill_(0.5)
+
+    ckpt_path = tmp_path / "last.ckpt"
+    torch.save(
+        {
+            "state_dict": model.state_dict(),
+            "hyper_parameters": dict(model.hparams),
+            "pytorch-lightning_version": "2.4.0",
+        },
+        ckpt_path,
+    )
+    assert "load_pretrained_weights" not in model.hparams
+
+    restored_model = FasterRCNN.load_from_checkpoint(ckpt_path)
+
+    assert restored_model.config == config
+    assert all(
+        torch.all(param == 0.5) for param in restored_model.parameters()
+    )
+
+
+def test_pretrained_weights_from_local_file(tmp_path, no_weights_download):
+    """Test the pretrained weights are loaded from a local file, before
+    the box predictor is replaced.
+    """
+    torch.manual_seed(42)
+    pretrained_model = fasterrcnn_resnet50_fpn_v2(
+        weights=None, weights_backbone=None
+    )
+    weights_path = tmp_path / "weights.pth"
+    torch.save(pretrained_model.state_dict(), weights_path)
+
+    model = FasterRCNN(
+        {"num_classes": 2, "pretrained_weights": str(weights_path)}
+    )
+
+    pretrained_state_dict = pretrained_model.state_dict()
+    for name, param in model.model.state_dict().items():
+        if name.startswith("roi_heads.box_predictor"):
+            assert param.shape[0] in (2, 2 * 4)
+        else:
+            assert torch.equal(param, pretrained_state_dict[name])
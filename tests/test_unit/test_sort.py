@@ -0,0 +1,284 @@
+import numpy as np
+import pytest
+
+from crabs.tracker.sort import KalmanBoxTracker, KalmanBoxTrackerBank, Sort
+from crabs.tracker.utils.sort import (
+    associate_detections_to_trackers,
+    gated_linear_assignment,
+    linear_assignment,
+)
+
+
+def make_detections(n_frames: int, seed: int = 42) -> list[np.ndarray]:
+    """Make detections of boxes moving with constant velocity, with
+    some missed detections.
+    """
+    rng = np.random.default_rng(seed)
+    n_boxes = 4
+    top_left = rng.uniform(0, 200, size=(n_boxes, 2))
+    velocity = rng.uniform(-5, 5, size=(n_boxes, 2))
+    detections = []
+    for _ in range(n_frames):
+        boxes = np.hstack(
+            [
+                top_left,
+                top_left + 20,
+                rng.uniform(0.5, 1, size=(n_boxes, 1)),
+            ]
+        )
+        detected = rng.uniform(size=n_boxes) > 0.2
+        detections.append(boxes[detected])
+        top_left = top_left + velocity
+    return detections
+
+
+def test_track_ids_per_tracker():
+    """Test track IDs start from 1 for each SORT tracker."""
+    detections = np.array([[10, 10, 30, 30, 0.9], [50, 50, 70, 70, 0.8]])
+
+    for _ in range(2):
+        sort_tracker = Sort(max_age=10, min_hits=1, iou_threshold=0.1)
+        tracked_boxes = sort_tracker.update(detections)
+        assert sorted(tracked_boxes[:, -1]) == [1, 2]
+        assert sort_tracker.track_id_count == 2
+
+
+def test_sort_output_scores():
+    """Test the output scores are those of the detections each tracked box
+    was updated with, and NaN for the boxes predicted without detections.
+    """
+    sort_tracker = Sort(max_age=1, min_hits=1, iou_threshold=0.1)
+    detections = np.array(
+        [[10, 10, 30, 30, 0.9], [50, 50, 70, 70, 0.8], [90, 90, 99, 99, 0.7]]
+    )
+    for shift, keep in [(0, [0, 1]), (2, [1, 0]), (4, [2, 1, 0])]:
+        dets = detections[keep] + [shift, shift, shift, shift, 0]
+        tracked_boxes = sort_tracker.update(dets)
+
+        # match each tracked box to the closest detection
+        closest = (
+            np.abs(tracked_boxes[:, np.newaxis, :4] - dets[np.newaxis, :, :4])
+            .sum(axis=-1)
+            .argmin(axis=1)
+        )
+        assert np.array_equal(sort_tracker.output_scores, dets[closest, 4])
+
+    tracked_boxes = sort_tracker.advance()
+    assert len(sort_tracker.output_scores) == len(tracked_boxes)
+    assert np.isnan(sort_tracker.output_scores).all()
+
+
+@pytest.mark.parametrize("n_frames_before_resume", [0, 1, 5, 10])
+def test_sort_state_dict(n_frames_before_resume: int):
+    """Test a tracker restored from a state produces the same output as the
+    tracker the state was taken from.
+    """
+    detections = make_detections(n_frames=15)
+    sort_tracker = Sort(max_age=2, min_hits=1, iou_threshold=0.1)
+    for dets in detections[:n_frames_before_resume]:
+        sort_tracker.update(dets)
+
+    # restore state in a new tracker
+    sort_tracker_resumed = Sort(max_age=2, min_hits=1, iou_threshold=0.1)
+    sort_tracker_resumed.load_state_dict(sort_tracker.state_dict())
+
+    # check output is the same
+    for dets in detections[n_frames_before_resume:]:
+        assert np.array_equal(
+            sort_tracker.update(dets), sort_tracker_resumed.update(dets)
+        )
+    assert (
+        sort_tracker.state_dict()["track_id_count"]
+        == sort_tracker_resumed.state_dict()["track_id_count"]
+    )
+
+
+def test_sort_advance():
+    """Test advancing the tracker predicts the boxes of the tracks output
+    in the last update, without counting the frame as a missed detection.
+    """
+    sort_tracker = Sort(max_age=1, min_hits=1, iou_threshold=0.1)
+    detections = np.array([[10, 10, 30, 30, 0.9], [50, 50, 70, 70, 0.8]])
+    sort_tracker.update(detections)
+    sort_tracker.update(detections + [2, 2, 2, 2, 0])
+    counters = [
+        sort_tracker.trackers.time_since_update.copy(),
+        sort_tracker.trackers.hit_streak.copy(),
+        sort_tracker.trackers.age.copy(),
+    ]
+
+    # advance for more frames than max_age
+    for _ in range(3):
+        tracked_boxes = sort_tracker.advance()
+
+    # tracks are predicted and kept, with the same counters
+    assert sorted(tracked_boxes[:, -1]) == [1, 2]
+    assert np.all(tracked_boxes[:, 0] > 12)  # boxes keep moving
+    assert sort_tracker.frame_count == 2
+    assert np.array_equal(counters[0], sort_tracker.trackers.time_since_update)
+    assert np.array_equal(counters[1], sort_tracker.trackers.hit_streak)
+    assert np.array_equal(counters[2], sort_tracker.trackers.age)
+
+
+def test_kalman_box_tracker_bank():
+    """Test the bank of trackers matches one Kalman filter per tracker."""
+    rng = np.random.default_rng(42)
+    bboxes = rng.uniform(0, 100, size=(5, 2))
+    bboxes = np.hstack([bboxes, bboxes + rng.uniform(10, 30, size=(5, 2))])
+    trackers = [KalmanBoxTracker(bbox, i) for i, bbox in enumerate(bboxes)]
+    bank = KalmanBoxTrackerBank()
+    bank.add(bboxes, np.arange(5))
+
+    for _ in range(10):
+        predicted = np.concatenate([trk.predict() for trk in trackers])
+        assert np.array_equal(bank.predict(), predicted)
+
+        # update a random subset of trackers with noisy boxes
+        indices = np.flatnonzero(rng.uniform(size=5) > 0.3)
+        observed = predicted[indices] + rng.normal(0, 2, (len(indices), 4))
+        for idx, bbox in zip(indices, observed):
+            trackers[idx].update(bbox)
+        bank.update(indices, observed)
+
+        assert np.array_equal(
+            bank.x, np.stack([trk.kf.x[:, 0] for trk in trackers])
+        )
+        assert np.array_equal(bank.P, np.stack([trk.kf.P for trk in trackers]))
+        for counter in ["time_since_update", "hits", "hit_streak", "age"]:
+            assert getattr(bank, counter).tolist() == [
+                getattr(trk, counter) for trk in trackers
+            ]
+
+
+def reference_sort_update(
+    trackers: list, dets: np.ndarray, frame_count: int, track_id_count: int
+) -> tuple[np.ndarray, int]:
+    """Update SORT with one Kalman filter per tracker, as in the original
+    implementation.
+    """
+    trks = np.array([trk.predict()[0] for trk in trackers]).reshape(-1, 4)
+    matched, unmatched_dets, _ = associate_detections_to_trackers(
+        dets, trks, iou_threshold=0.1
+    )
+    for m in matched:
+        trackers[m[1]].update(dets[m[0], :])
+    for i in unmatched_dets:
+        trackers.append(KalmanBoxTracker(dets[i, :], track_id_count))
+        track_id_count += 1
+    ret = []
+    for i in reversed(range(len(trackers))):
+        trk = trackers[i]
+        if trk.time_since_update < 1 and (
+            trk.hit_streak >= 2 or frame_count <= 2
+        ):
+            ret.append(np.concatenate((trk.get_state()[0], [trk.id + 1])))
+        if trk.time_since_update > 3:
+            trackers.pop(i)
+    return np.array(ret).reshape(-1, 5), track_id_count
+
+
+def test_sort_matches_per_tracker_kalman_filters():
+    """Test SORT output is identical to that of a SORT implementation with
+    one Kalman filter per tracker.
+    """
+    sort_tracker = Sort(max_age=3, min_hits=2, iou_threshold=0.1)
+    trackers: list = []
+    track_id_count = 0
+    for frame_idx, dets in enumerate(make_detections(n_frames=30), 1):
+        expected, track_id_count = reference_sort_update(
+            trackers, dets, frame_idx, track_id_count
+        )
+        assert np.array_equal(sort_tracker.update(dets), expected)
+
+
+def make_crowded_boxes(n_boxes: int, rng: np.random.Generator) -> np.ndarray:
+    """Make boxes in a small area, so that many of them overlap."""
+    top_left = rng.uniform(0, 200, size=(n_boxes, 2))
+    return np.hstack(
+        [top_left, top_left + rng.uniform(5, 30, size=(n_boxes, 2))]
+    )
+
+
+def test_gated_linear_assignment():
+    """Test the gated assignment solves each group of non-zero costs
+    separately, and does not assign pairs with a zero cost.
+    """
+    cost_matrix = -np.array(
+        [
+            [0.9, 0.8, 0.0, 0.0],
+            [0.8, 0.1, 0.0, 0.0],
+            [0.0, 0.0, 0.0, 0.5],
+            [0.0, 0.0, 0.0, 0.0],
+        ]
+    )
+    assert gated_linear_assignment(cost_matrix).tolist() == [
+        [0, 1],
+        [1, 0],
+        [2, 3],
+    ]
+    assert gated_linear_assignment(np.zeros((3, 2))).shape == (0, 2)
+
+
+@pytest.mark.parametrize("iou_threshold", [0.1, 0.3])
+def test_associate_detections_to_trackers_gated(iou_threshold: float):
+    """Test the gated association finds the same matches as the dense
+    association in crowded frames.
+    """
+    rng = np.random.default_rng(42)
+    for _ in range(20):
+        detections = make_crowded_boxes(40, rng)
+        trackers = make_crowded_boxes(30, rng)
+        matches, unmatched_dets, unmatched_trks = (
+            associate_detections_to_trackers(
+                detections, trackers, iou_threshold
+            )
+        )
+        matches_gated, unmatched_dets_gated, unmatched_trks_gated = (
+            associate_detections_to_trackers(
+                detections, trackers, iou_threshold, gated=True
+            )
+        )
+        assert np.array_equal(matches, matches_gated)
+        assert sorted(unmatched_dets) == sorted(unmatched_dets_gated)
+        assert sorted(unmatched_trks) == sorted(unmatched_trks_gated)
+
+        # all detections and trackers are either matched or unmatched
+        assert sorted([*matches[:, 0], *unmatched_dets]) == list(range(40))
+        assert sorted([*matches[:, 1], *unmatched_trks]) == list(range(30))
+
+
+def test_sort_gated_association_permutes_ids():
+    """Test SORT with gated association outputs the same tracked boxes as
+    with the dense association, with the track IDs mapped one-to-one.
+    """
+    rng = np.random.default_rng(42)
+    sort_tracker = Sort(max_age=3, min_hits=1, iou_threshold=0.1)
+    sort_tracker_gated = Sort(
+        max_age=3, min_hits=1, iou_threshold=0.1, gated_association=True
+    )
+    gated_id_per_id: dict = {}
+    for dets in make_detections(n_frames=30):
+        # add a few false positives
+        dets = np.vstack(
+            [dets, np.hstack([make_crowded_boxes(3, rng), np.ones((3, 1))])]
+        )
+        tracked_boxes = sort_tracker.update(dets)
+        tracked_boxes_gated = sort_tracker_gated.update(dets)
+
+        # sort the output by box coordinates
+        tracked_boxes = tracked_boxes[np.lexsort(tracked_boxes[:, :4].T)]
+        tracked_boxes_gated = tracked_boxes_gated[
+            np.lexsort(tracked_boxes_gated[:, :4].T)
+        ]
+        assert np.allclose(tracked_boxes[:, :4], tracked_boxes_gated[:, :4])
+        for track_id, gated_id in zip(
+            tracked_boxes[:, 4], tracked_boxes_gated[:, 4]
+        ):
+            assert gated_id_per_id.setdefault(track_id, gated_id) == gated_id
+    assert len(set(gated_id_per_id.values())) == len(gated_id_per_id)
+
+
+def test_linear_assignment():
+    """Test the linear assignment returns the pairs sorted by row."""
+    cost_matrix = -np.array([[0.1, 0.9], [0.8, 0.2], [0.3, 0.3]])
+    assert linear_assignment(cost_matrix).tolist() == [[0, 1], [1, 0]]
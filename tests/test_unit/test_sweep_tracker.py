@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+import torch
+import yaml
+
+from crabs.tracker.sweep_tracker import (
+    get_grid_configs,
+    main,
+    sweep_parse_args,
+    track_stored_detections,
+)
+from crabs.tracker.utils.detections_store import (
+    DetectionsStoreWriter,
+    read_detections_store,
+)
+from crabs.tracker.utils.io import write_tracked_detections_to_csv
+
+SORT_CONFIG = {
+    "max_age": 10,
+    "min_hits": 1,
+    "iou_threshold": 0.1,
+    "score_threshold": 0.5,
+}
+
+
+@pytest.fixture()
+def detections_store_path(tmp_path):
+    """Store detections of 3 boxes moving with constant velocity over 20
+    frames, with missed and low-score detections.
+    """
+    rng = np.random.default_rng(42)
+    top_left = np.array([[10.0, 10.0], [100.0, 50.0], [50.0, 150.0]])
+    velocity = np.array([[3.0, 1.0], [-2.0, 2.0], [1.0, -3.0]])
+    store_path = tmp_path / "detections.npz"
+    writer = DetectionsStoreWriter(store_path)
+    for frame_idx in range(20):
+        boxes = np.hstack([top_left, top_left + 30])
+        detected = rng.uniform(size=3) > 0.2
+        writer.add_frame(
+            frame_idx,
+            {
+                "boxes": torch.tensor(boxes[detected], dtype=torch.float32),
+                "scores": torch.tensor(
+                    rng.uniform(0.3, 1, size=detected.sum()),
+                    dtype=torch.float32,
+                ),
+                "labels": torch.ones(detected.sum(), dtype=torch.int64),
+            },
+        )
+        top_left = top_left + velocity
+    writer.save()
+    return store_path
+
+
+def test_get_grid_configs():
+    sweep_config = {
+        "max_age": [1, 10],
+        "min_hits": [1, 2, 3],
+        "iou_threshold": [0.1],
+        "score_threshold": [0.1, 0.5],
+    }
+
+    grid_configs = get_grid_configs(sweep_config)
+
+    assert len(grid_configs) == 2 * 3 * 1 * 2
+    assert grid_configs[0] == {
+        "max_age": 1,
+        "min_hits": 1,
+        "iou_threshold": 0.1,
+        "score_threshold": 0.1,
+    }
+    assert len({tuple(c.values()) for c in grid_configs}) == len(grid_configs)
+
+
+@pytest.mark.parametrize("search", ["grid", "optuna"])
+def test_sweep_tracker(search, detections_store_path, tmp_path):
+    """Test the sweep ranks first the SORT config used to create the
+    ground truth, with a perfect MOTA.
+    """
+    # Create ground truth from the tracks of one config
+    stored_detections = list(read_detections_store(detections_store_path))
+    ground_truth_frames = set(range(0, 20, 2))
+    ground_truth = track_stored_detections(
+        stored_detections, SORT_CONFIG, ground_truth_frames
+    )
+    annotations_file = tmp_path / "ground_truth.csv"
+    write_tracked_detections_to_csv(
+        annotations_file, ground_truth, "frame_{frame_idx:08d}.png", 8888
+    )
+
+    # Create sweep config including the ground truth config
+    config_file = tmp_path / "sweep_config.yaml"
+    with open(config_file, "w") as f:
+        yaml.dump(
+            {
+                "max_age": [1, 10],
+                "min_hits": [1, 3],
+                "iou_threshold": [0.1],
+                "score_threshold": [0.5, 0.9],
+                "optuna": {"n_trials": 5},
+            },
+            f,
+        )
+
+    # Run sweep
+    results_df = main(
+        sweep_parse_args(
+            [
+                f"--detections_path={detections_store_path}",
+                f"--annotations_file={annotations_file}",
+                f"--config_file={config_file}",
+                f"--search={search}",
+                "--n_workers=2",
+                f"--output_dir={tmp_path / 'sweep_output'}",
+            ]
+        )
+    )
+
+    # Check results are ranked by MOTA and saved
+    assert (tmp_path / "sweep_output" / "sweep_results.csv").exists()
+    assert len(results_df) == (8 if search == "grid" else 5)
+    assert list(results_df.index) == list(range(1, len(results_df) + 1))
+    assert results_df["MOTA"].is_monotonic_decreasing
+    if search == "grid":
+        best_config = results_df.iloc[0]
+        assert best_config["MOTA"] == 1.0
+        assert best_config["max_age"] == SORT_CONFIG["max_age"]
+        assert best_config["score_threshold"] == 0.5
+        assert best_config["Missed Detections"] == 0
+        assert best_config["False Positives"] == 0
+        assert best_config["Number of Switches"] == 0
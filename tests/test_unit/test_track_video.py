@@ -1,12 +1,25 @@
+import csv
 import re
 from argparse import Namespace
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Optional
 
+import cv2
+import numpy as np
+import pandas as pd
 import pytest
+import torch
 import yaml
+from torchvision.models.detection import fasterrcnn_resnet50_fpn_v2
 
-from crabs.tracker.track_video import Tracking
+from crabs.detector.utils.bundle import save_detector_bundle
+from crabs.tracker.evaluate_tracker import TrackerEvaluate
+from crabs.tracker.track_video import Tracking, main, tracking_parse_args
+from crabs.tracker.utils.detections_store import compute_file_hash
+from crabs.tracker.utils.io import (
+    read_tracks_npz,
+    write_tracked_detections_to_csv,
+)
 
 
 @pytest.fixture()
@@ -100,19 +113,36 @@ def test_tracking_constructor(
             "output_dir": "tracking_output",
             "output_dir_no_timestamp": False,
             "annotations_file": None,
+            "evaluation_matching": "optimal",
+            "cache_annotations": False,
+            "evaluation_log_every_n_frames": 1000,
+            "early_stop_mota": None,
+            "early_stop_min_frames": 10,
             "save_video": False,
             "save_frames": False,
+            "detection_batch_size": 1,
+            "decoded_frames_queue_size": 8,
+            "detections_queue_size": 8,
+            "flush_every_n_frames": 100,
+            "output_format": "csv",
+            "checkpoint_every_n_frames": 0,
+            "resume": False,
+            "detection_only": False,
+            "tracking_only": False,
+            "detections_dir": "detections",
+            "inference_scale": 1.0,
+            "max_inference_side": None,
         }
     )
 
-    # mock getting mlflow parameters from checkpoint
-    trained_model_mlflow_params = {
+    # mock getting trained model parameters from checkpoint
+    trained_model_params = {
         "run_name": "trained_model_run_name",
-        "cli_args/experiment_name": "trained_model_expt_name",
+        "cli_args": {"experiment_name": "trained_model_expt_name"},
     }
     monkeypatch.setattr(
-        "crabs.tracker.track_video.get_mlflow_parameters_from_ckpt",
-        lambda x: trained_model_mlflow_params,
+        "crabs.tracker.track_video.get_trained_model_params_from_ckpt",
+        lambda x: trained_model_params,
     )
 
     # mock getting trained model's config
@@ -136,13 +166,10 @@ def test_tracking_constructor(
     assert tracker.config_file == mock_args.config_file
     assert tracker.config == tracking_config
     assert tracker.trained_model_path == mock_args.trained_model_path
-    assert (
-        tracker.trained_model_run_name
-        == trained_model_mlflow_params["run_name"]
-    )
+    assert tracker.trained_model_run_name == trained_model_params["run_name"]
     assert (
         tracker.trained_model_expt_name
-        == trained_model_mlflow_params["cli_args/experiment_name"]
+        == trained_model_params["cli_args"]["experiment_name"]
     )
     assert tracker.trained_model_config == trained_model_config
     assert tracker.input_video_path == mock_args.video_path
@@ -150,6 +177,17 @@ def test_tracking_constructor(
     assert tracker.tracking_output_dir_root == mock_args.output_dir
     assert tracker.frame_name_format_str == "frame_{frame_idx:08d}.png"
     assert tracker.accelerator == "cuda"
+    assert tracker.detection_batch_size == mock_args.detection_batch_size
+    assert (
+        tracker.decoded_frames_queue_size
+        == mock_args.decoded_frames_queue_size
+    )
+    assert tracker.detections_queue_size == mock_args.detections_queue_size
+    assert tracker.flush_every_n_frames == mock_args.flush_every_n_frames
+    assert tracker.checkpoint_every_n_frames == 0
+    assert tracker.start_frame_idx == 0
+    assert tracker.csv_file_offset is None
+    assert not tracker.keep_decoded_frames
 
 
 @pytest.mark.parametrize(
@@ -207,17 +245,34 @@ def test_prep_outputs(
             "output_dir": output_dir,
             "output_dir_no_timestamp": output_dir_no_timestamp,
             "annotations_file": None,
+            "evaluation_matching": "optimal",
+            "cache_annotations": False,
+            "evaluation_log_every_n_frames": 1000,
+            "early_stop_mota": None,
+            "early_stop_min_frames": 10,
             "save_video": save_video,
             "save_frames": save_frames,
+            "detection_batch_size": 1,
+            "decoded_frames_queue_size": 8,
+            "detections_queue_size": 8,
+            "flush_every_n_frames": 100,
+            "output_format": "csv",
+            "checkpoint_every_n_frames": 0,
+            "resume": False,
+            "detection_only": False,
+            "tracking_only": False,
+            "detections_dir": "detections",
+            "inference_scale": 1.0,
+            "max_inference_side": None,
         }
     )
 
     # mock getting mlflow parameters from checkpoint
     monkeypatch.setattr(
-        "crabs.tracker.track_video.get_mlflow_parameters_from_ckpt",
+        "crabs.tracker.track_video.get_trained_model_params_from_ckpt",
         lambda x: {
             "run_name": "trained_model_run_name",
-            "cli_args/experiment_name": "trained_model_expt_name",
+            "cli_args": {"experiment_name": "trained_model_expt_name"},
         },
     )
 
@@ -270,3 +325,977 @@ def test_prep_outputs(
         )
         # assert creation
         assert (tmp_path / tracker.frames_subdir).exists()
+
+
+@pytest.fixture()
+def synthetic_video(tmp_path: Path) -> Path:
+    """Create a short video with a white square moving across the frame."""
+    video_path = tmp_path / "synthetic_video.avi"
+    video_writer = cv2.VideoWriter(
+        str(video_path), cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48)
+    )
+    for frame_idx in range(7):
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        frame[10:20, 5 + 4 * frame_idx : 15 + 4 * frame_idx, :] = 255
+        video_writer.write(frame)
+    video_writer.release()
+    return video_path
+
+
+class MockDetector(torch.nn.Module):
+    """Mock detector that predicts a box around the bright pixels of each
+    image, and logs the number of images passed per call.
+    """
+
+    def __init__(self):
+        """Initialise the log of batch sizes and image sizes."""
+        super().__init__()
+        self.batch_sizes: list = []
+        self.image_sizes: set = set()
+
+    def forward(self, images: list) -> list:
+        """Return one detection per image."""
+        self.batch_sizes.append(len(images))
+        self.image_sizes.update(tuple(image.shape) for image in images)
+        detections = []
+        for image in images:
+            ys, xs = torch.where(image.mean(dim=0) > 0.5)
+            detections.append(
+                {
+                    "boxes": torch.tensor(
+                        [[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]],
+                        dtype=torch.float32,
+                    ),
+                    "scores": torch.tensor([0.9]),
+                    "labels": torch.tensor([1]),
+                }
+            )
+        return detections
+
+
+@pytest.fixture()
+def tracking_interface_with_mock_detector(
+    create_mock_args: Callable,
+    create_tracking_config_file: Callable,
+    synthetic_video: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Return a factory of Tracking interfaces that use a mock detector."""
+    monkeypatch.setattr(
+        "crabs.tracker.track_video.get_trained_model_params_from_ckpt",
+        lambda x: {
+            "run_name": "trained_model_run_name",
+            "cli_args": {"experiment_name": "trained_model_expt_name"},
+        },
+    )
+    monkeypatch.setattr(
+        "crabs.tracker.track_video.get_config_from_ckpt",
+        lambda **kwargs: {},
+    )
+    monkeypatch.setattr(
+        "crabs.detector.models.FasterRCNN.load_from_checkpoint",
+        lambda *args, **kwargs: MockDetector(),
+    )
+
+    def _tracking_interface_with_mock_detector(**kwargs) -> Tracking:
+        args_dict = {
+            "video_path": str(synthetic_video),
+            "trained_model_path": "path/to/model.ckpt",
+            "config_file": create_tracking_config_file(
+                {
+                    "max_age": 10,
+                    "min_hits": 1,
+                    "iou_threshold": 0.1,
+                    "score_threshold": 0.1,
+                },
+                tmp_path,
+            ),
+            "accelerator": "cpu",
+            "output_dir": str(tmp_path / "tracking_output"),
+            "output_dir_no_timestamp": True,
+            "annotations_file": None,
+            "evaluation_matching": "optimal",
+            "cache_annotations": False,
+            "evaluation_log_every_n_frames": 1000,
+            "early_stop_mota": None,
+            "early_stop_min_frames": 10,
+            "save_video": False,
+            "save_frames": False,
+            "detection_batch_size": 1,
+            "decoded_frames_queue_size": 8,
+            "detections_queue_size": 8,
+            "flush_every_n_frames": 100,
+            "output_format": "csv",
+            "checkpoint_every_n_frames": 0,
+            "resume": False,
+            "detection_only": False,
+            "tracking_only": False,
+            "detections_dir": str(tmp_path / "detections"),
+            "inference_scale": 1.0,
+            "max_inference_side": None,
+        }
+        args_dict.update(kwargs)
+
+        tracker = Tracking(create_mock_args(args_dict))
+        tracker.prep_detector_and_tracker()
+        return tracker
+
+    return _tracking_interface_with_mock_detector
+
+
+@pytest.mark.parametrize("queue_size", [1, 8])
+@pytest.mark.parametrize("detection_batch_size", [1, 2, 3, 7, 10])
+def test_core_detection_and_tracking_batched(
+    detection_batch_size: int,
+    queue_size: int,
+    tracking_interface_with_mock_detector: Callable,
+    tmp_path: Path,
+):
+    """Test batched detection produces the same tracks as per-frame
+    detection, and that the detector is called with the expected batches.
+    """
+    # Compute tracks with one frame per detector call
+    tracker_reference = tracking_interface_with_mock_detector(
+        output_dir=str(tmp_path / "tracking_output_reference"),
+    )
+    tracked_reference = tracker_reference.core_detection_and_tracking(
+        frames_to_keep=range(7)
+    )
+
+    # Compute tracks with batched detection
+    tracker = tracking_interface_with_mock_detector(
+        detection_batch_size=detection_batch_size,
+        decoded_frames_queue_size=queue_size,
+        detections_queue_size=queue_size,
+    )
+    tracked_detections = tracker.core_detection_and_tracking(
+        frames_to_keep=range(7)
+    )
+
+    # Check detector calls
+    n_frames = 7
+    expected_batch_sizes = [detection_batch_size] * (
+        n_frames // detection_batch_size
+    )
+    if n_frames % detection_batch_size:
+        expected_batch_sizes.append(n_frames % detection_batch_size)
+    assert tracker.trained_model.batch_sizes == expected_batch_sizes
+
+    # Check tracked boxes and IDs match the per-frame output
+    assert tracked_detections.keys() == tracked_reference.keys()
+    for frame_idx, frame_data in tracked_detections.items():
+        for key in ["tracked_boxes", "ids", "scores"]:
+            assert np.array_equal(
+                frame_data[key], tracked_reference[frame_idx][key]
+            )
+
+    # Check output csv files match
+    assert (
+        Path(tracker.csv_file_path).read_text()
+        == Path(tracker_reference.csv_file_path).read_text()
+    )
+
+
+@pytest.mark.parametrize(
+    "save_video, save_frames",
+    [(True, False), (False, True), (True, True)],
+)
+def test_core_detection_and_tracking_fused_output(
+    save_video: bool,
+    save_frames: bool,
+    tracking_interface_with_mock_detector: Callable,
+    synthetic_video: Path,
+):
+    """Test the output video and frames are written in the detection and
+    tracking loop, decoding the input video only once.
+    """
+    tracker = tracking_interface_with_mock_detector(
+        save_video=save_video,
+        save_frames=save_frames,
+        detection_batch_size=2,
+    )
+
+    # count calls to the video decoder
+    n_reads = 0
+    video_capture_read = cv2.VideoCapture.read
+
+    def _counting_read(video_capture):
+        nonlocal n_reads
+        n_reads += 1
+        return video_capture_read(video_capture)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(cv2.VideoCapture, "read", _counting_read)
+        tracked_detections = tracker.core_detection_and_tracking(
+            frames_to_keep=range(7)
+        )
+
+    # check input video is decoded once (7 frames + failed read at the end)
+    assert n_reads == 8
+
+    # check output video has one frame per input frame
+    if save_video:
+        output_video = cv2.VideoCapture(tracker.output_video_path)
+        assert output_video.get(cv2.CAP_PROP_FRAME_COUNT) == len(
+            tracked_detections
+        )
+        output_video.release()
+
+    # check frames are saved as-is
+    if save_frames:
+        input_video = cv2.VideoCapture(str(synthetic_video))
+        for frame_idx in tracked_detections:
+            _, frame = input_video.read()
+            frame_file = tracker.frames_subdir / (
+                tracker.frame_name_format_str.format(frame_idx=frame_idx)
+            )
+            assert np.array_equal(cv2.imread(str(frame_file)), frame)
+        input_video.release()
+
+
+@pytest.mark.parametrize(
+    "failing_method",
+    ["run_detection_batch", "run_tracking", "inference_transforms"],
+)
+def test_core_detection_and_tracking_error(
+    failing_method: str,
+    tracking_interface_with_mock_detector: Callable,
+):
+    """Test an error in any stage of the pipeline is raised in the main
+    thread, rather than blocking the other stages.
+    """
+    tracker = tracking_interface_with_mock_detector(
+        decoded_frames_queue_size=1,
+        detections_queue_size=1,
+    )
+
+    def _raise_error(*args, **kwargs):
+        raise RuntimeError(f"Error in {failing_method}")
+
+    setattr(tracker, failing_method, _raise_error)
+
+    with pytest.raises(RuntimeError, match=f"Error in {failing_method}"):
+        tracker.core_detection_and_tracking()
+
+
+@pytest.mark.parametrize("frames_to_keep", [None, [], [0, 3, 6, 100]])
+@pytest.mark.parametrize("flush_every_n_frames", [1, 3, 100])
+def test_core_detection_and_tracking_streamed_output(
+    frames_to_keep: Optional[list],
+    flush_every_n_frames: int,
+    tracking_interface_with_mock_detector: Callable,
+):
+    """Test the tracked detections are written to the csv file during
+    tracking, and only the required frames are returned.
+    """
+    tracker = tracking_interface_with_mock_detector(
+        flush_every_n_frames=flush_every_n_frames,
+    )
+    tracked_detections = tracker.core_detection_and_tracking(
+        frames_to_keep=frames_to_keep
+    )
+
+    # check only required frames that exist in the video are returned
+    expected_frames = [f for f in (frames_to_keep or []) if f < 7]
+    assert sorted(tracked_detections.keys()) == expected_frames
+    for frame_data in tracked_detections.values():
+        assert isinstance(frame_data["scores"], np.ndarray)
+
+    # check one row per tracked box per frame is written to the csv file
+    with open(tracker.csv_file_path) as csv_file:
+        rows = list(csv.reader(csv_file))
+    assert len(rows) == 1 + 7
+    assert [row[0] for row in rows[1:]] == [
+        tracker.frame_name_format_str.format(frame_idx=frame_idx)
+        for frame_idx in range(7)
+    ]
+
+
+def test_core_detection_and_tracking_npz_output(
+    tracking_interface_with_mock_detector: Callable,
+):
+    """Test only the npz file is written if the output format is npz, with
+    the same tracked detections as returned.
+    """
+    tracker = tracking_interface_with_mock_detector(output_format="npz")
+    tracked_detections = tracker.core_detection_and_tracking(
+        frames_to_keep=list(range(7))
+    )
+
+    assert not Path(tracker.csv_file_path).exists()
+    npz_tracks = read_tracks_npz(tracker.npz_file_path)
+    assert np.array_equal(npz_tracks["frame_numbers"], np.arange(7))
+    for frame_idx, frame_data in tracked_detections.items():
+        frame_rows = slice(
+            npz_tracks["frame_offsets"][frame_idx],
+            npz_tracks["frame_offsets"][frame_idx + 1],
+        )
+        assert np.array_equal(npz_tracks["id"][frame_rows], frame_data["ids"])
+        assert np.allclose(
+            npz_tracks["x"][frame_rows], frame_data["tracked_boxes"][:, 0]
+        )
+        # one score per tracked box
+        assert np.allclose(
+            npz_tracks["confidence"][frame_rows],
+            frame_data["scores"],
+            equal_nan=True,
+        )
+
+
+@pytest.mark.parametrize(
+    "detection_batch_size, checkpoint_every_n_frames, n_frames_to_fail",
+    [
+        (1, 2, 5),  # resume from frame 4
+        (1, 1, 1),  # resume from frame 1
+        (2, 3, 6),  # checkpoints rounded up to every 4 frames
+        (1, 2, 1),  # no checkpoint saved: resume from first frame
+    ],
+)
+@pytest.mark.parametrize("output_format", ["csv", "both"])
+def test_core_detection_and_tracking_resume(
+    output_format: str,
+    detection_batch_size: int,
+    checkpoint_every_n_frames: int,
+    n_frames_to_fail: int,
+    tracking_interface_with_mock_detector: Callable,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test resuming an interrupted run produces the same output as an
+    uninterrupted run.
+    """
+    frames_to_keep = [0, 3, 6]
+
+    # Run tracking uninterrupted
+    tracker_reference = tracking_interface_with_mock_detector(
+        output_dir=str(tmp_path / "tracking_output_reference"),
+        save_frames=True,
+        output_format=output_format,
+    )
+    tracked_reference = tracker_reference.core_detection_and_tracking(
+        frames_to_keep=frames_to_keep
+    )
+
+    # Run tracking with checkpoints, and interrupt it
+    tracker_kwargs = {
+        "save_frames": True,
+        "detection_batch_size": detection_batch_size,
+        "checkpoint_every_n_frames": checkpoint_every_n_frames,
+        "output_format": output_format,
+    }
+    tracker = tracking_interface_with_mock_detector(**tracker_kwargs)
+    run_tracking = tracker.run_tracking
+    n_tracked_frames = []
+
+    def _run_tracking_and_fail(prediction_dict):
+        if len(n_tracked_frames) == n_frames_to_fail:
+            raise RuntimeError("interrupted")
+        n_tracked_frames.append(1)
+        return run_tracking(prediction_dict)
+
+    monkeypatch.setattr(tracker, "run_tracking", _run_tracking_and_fail)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        tracker.core_detection_and_tracking(frames_to_keep=frames_to_keep)
+    expected_start_frame_idx = (
+        n_frames_to_fail // tracker.checkpoint_every_n_frames
+    ) * tracker.checkpoint_every_n_frames
+    assert tracker.checkpoint_path.exists() == (expected_start_frame_idx > 0)
+
+    # Resume tracking in a new interface
+    tracker_resumed = tracking_interface_with_mock_detector(
+        resume=True, **tracker_kwargs
+    )
+    tracked_resumed = tracker_resumed.core_detection_and_tracking(
+        frames_to_keep=frames_to_keep
+    )
+
+    # Check output matches uninterrupted run
+    assert tracker_resumed.start_frame_idx == expected_start_frame_idx
+    assert tracker_resumed.trained_model.batch_sizes[0] == min(
+        detection_batch_size, 7 - expected_start_frame_idx
+    )
+    assert tracked_resumed.keys() == tracked_reference.keys()
+    for frame_idx, frame_data in tracked_resumed.items():
+        for key in ["tracked_boxes", "ids", "scores"]:
+            assert np.array_equal(
+                frame_data[key], tracked_reference[frame_idx][key]
+            )
+    assert (
+        Path(tracker_resumed.csv_file_path).read_bytes()
+        == Path(tracker_reference.csv_file_path).read_bytes()
+    )
+    if output_format == "both":
+        npz_resumed = read_tracks_npz(tracker_resumed.npz_file_path)
+        npz_reference = read_tracks_npz(tracker_reference.npz_file_path)
+        for key, value in npz_reference.items():
+            assert np.array_equal(npz_resumed[key], value, equal_nan=True)
+    frames_resumed = sorted(Path(tracker_resumed.frames_subdir).iterdir())
+    frames_reference = sorted(Path(tracker_reference.frames_subdir).iterdir())
+    assert [f.name for f in frames_resumed] == [
+        f.name for f in frames_reference
+    ]
+
+    # Check checkpoint is removed after tracking all frames
+    assert not tracker_resumed.checkpoint_path.exists()
+
+
+def test_resume_with_save_video(tracking_interface_with_mock_detector):
+    """Test resuming is not supported when saving the tracked video."""
+    with pytest.raises(ValueError, match="not supported"):
+        tracking_interface_with_mock_detector(resume=True, save_video=True)
+
+
+def test_prep_detector_from_bundle(
+    tracking_interface_with_mock_detector: Callable, tmp_path: Path
+):
+    """Test the detector is loaded from an inference bundle, rather than
+    from a Lightning checkpoint, if passed one.
+    """
+    model = fasterrcnn_resnet50_fpn_v2(
+        weights=None, weights_backbone=None, num_classes=2
+    )
+    bundle_path = tmp_path / "detector_bundle.pt"
+    save_detector_bundle(
+        model.state_dict(),
+        {"config": {"num_classes": 2}, "cli_args": {}, "run_name": "run_1"},
+        bundle_path,
+        dtype="float16",
+    )
+
+    tracker = tracking_interface_with_mock_detector(
+        trained_model_path=str(bundle_path)
+    )
+
+    assert isinstance(tracker.trained_model, type(model))
+    assert not tracker.trained_model.training
+
+
+@pytest.mark.parametrize("n_concurrent_videos", [1, 2])
+def test_main_multiple_videos(
+    n_concurrent_videos: int,
+    tracking_interface_with_mock_detector: Callable,
+    synthetic_video: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test several videos are tracked with a single load of the detector,
+    and each video is tracked with its own track IDs.
+    """
+    # Track one video as reference
+    tracker_reference = tracking_interface_with_mock_detector(
+        output_dir=str(tmp_path / "tracking_output_reference"),
+    )
+    tracker_reference.detect_and_track_video()
+
+    # Create directory with copies of the video
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    for video_name in ["video_a.avi", "video_b.avi", "video_c.avi"]:
+        (videos_dir / video_name).write_bytes(synthetic_video.read_bytes())
+
+    # Count detector loads
+    n_detector_loads = []
+
+    def _load_from_checkpoint(*args, **kwargs):
+        n_detector_loads.append(1)
+        return MockDetector()
+
+    monkeypatch.setattr(
+        "crabs.detector.models.FasterRCNN.load_from_checkpoint",
+        _load_from_checkpoint,
+    )
+
+    # Track all videos in directory
+    output_dir = tmp_path / "tracking_output"
+    main(
+        tracking_parse_args(
+            [
+                "--trained_model_path=path/to/model.ckpt",
+                "--video_path",
+                str(videos_dir),
+                "--config_file",
+                str(tracker_reference.config_file),
+                "--output_dir",
+                str(output_dir),
+                "--output_dir_no_timestamp",
+                "--accelerator=cpu",
+                f"--n_concurrent_videos={n_concurrent_videos}",
+            ]
+        )
+    )
+
+    # Check detector is loaded once and tracks match the reference
+    assert len(n_detector_loads) == 1
+    reference_tracks = Path(tracker_reference.csv_file_path).read_text()
+    for video_name in ["video_a", "video_b", "video_c"]:
+        csv_file_path = output_dir / f"{video_name}_tracks.csv"
+        assert csv_file_path.read_text() == reference_tracks
+
+
+def test_main_multiple_videos_with_annotations(
+    synthetic_video: Path,
+):
+    """Test ground truth annotations cannot be passed for several videos."""
+    other_video = synthetic_video.parent / "other_video.avi"
+    other_video.write_bytes(synthetic_video.read_bytes())
+    args = tracking_parse_args(
+        [
+            "--trained_model_path=path/to/model.ckpt",
+            "--video_path",
+            str(synthetic_video),
+            str(other_video),
+            "--annotations_file=path/to/annotations.csv",
+        ]
+    )
+    with pytest.raises(ValueError, match="single input video"):
+        main(args)
+
+
+@pytest.fixture()
+def annotations_file_from_tracks(
+    tracking_interface_with_mock_detector: Callable, tmp_path: Path
+) -> Path:
+    """Write ground truth annotations from the tracks of the mock
+    detector, with the boxes shifted away from the tracks from frame 3.
+    """
+    tracker = tracking_interface_with_mock_detector(
+        output_dir=str(tmp_path / "tracking_output_annotations"),
+    )
+    tracked_detections = tracker.core_detection_and_tracking(
+        frames_to_keep=range(7)
+    )
+    for frame_idx, frame_data in tracked_detections.items():
+        if frame_idx >= 3:
+            frame_data["tracked_boxes"] = frame_data["tracked_boxes"] + [
+                30,
+                0,
+                30,
+                0,
+            ]
+    annotations_file = tmp_path / "annotations.csv"
+    write_tracked_detections_to_csv(
+        annotations_file, tracked_detections, tracker.frame_name_format_str
+    )
+    return annotations_file
+
+
+@pytest.mark.parametrize(
+    "early_stop_mota, expected_n_frames",
+    [(None, 7), (0.5, 5)],
+)
+def test_detect_and_track_video_online_evaluation(
+    early_stop_mota: Optional[float],
+    expected_n_frames: int,
+    annotations_file_from_tracks: Path,
+    tracking_interface_with_mock_detector: Callable,
+):
+    """Test the tracks are evaluated during tracking with the same results
+    as evaluating the output file, and tracking stops early once the
+    running MOTA is below the threshold, keeping the checkpoint.
+    """
+    tracker = tracking_interface_with_mock_detector(
+        annotations_file=str(annotations_file_from_tracks),
+        early_stop_mota=early_stop_mota,
+        early_stop_min_frames=2,
+        checkpoint_every_n_frames=2,
+    )
+    tracker.detect_and_track_video()
+
+    # frames 0-2 have MOTA 1 and later frames MOTA -1, so the running
+    # MOTA is below 0.5 at frame 4
+    assert tracker.stopped_early == (early_stop_mota is not None)
+    assert tracker.checkpoint_path.exists() == tracker.stopped_early
+    with open(tracker.csv_file_path) as csv_file:
+        assert len(list(csv.reader(csv_file))) == 1 + expected_n_frames
+
+    evaluation = TrackerEvaluate(
+        str(annotations_file_from_tracks),
+        tracker.csv_file_path,
+        tracker.config["iou_threshold"],
+        tracker.tracking_output_dir,
+    )
+    ground_truth_dict = evaluation.get_ground_truth_data()
+    expected_results = evaluation.compute_mota_per_frame(
+        {k: v for k, v in ground_truth_dict.items() if k < expected_n_frames},
+        evaluation.get_predicted_data(ground_truth_dict.keys()),
+    )
+    metrics_df = pd.read_csv(
+        tracker.tracking_output_dir / "tracking_metrics_output.csv"
+    )
+    assert metrics_df.to_dict(orient="list") == expected_results
+    assert metrics_df["MOTA"].tolist() == [1, 1, 1] + [-1] * (
+        expected_n_frames - 3
+    )
+
+
+def test_core_detection_and_tracking_resume_online_evaluation(
+    annotations_file_from_tracks: Path,
+    tracking_interface_with_mock_detector: Callable,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test resuming an interrupted run restores the state of the online
+    evaluation from the checkpoint.
+    """
+
+    def _start_evaluation(tracker: Tracking) -> TrackerEvaluate:
+        evaluation = TrackerEvaluate(
+            str(annotations_file_from_tracks),
+            {},
+            tracker.config["iou_threshold"],
+            tracker.tracking_output_dir,
+        )
+        evaluation.start_online_evaluation()
+        return evaluation
+
+    # Run tracking uninterrupted
+    tracker_reference = tracking_interface_with_mock_detector(
+        output_dir=str(tmp_path / "tracking_output_reference"),
+        annotations_file=str(annotations_file_from_tracks),
+    )
+    evaluation_reference = _start_evaluation(tracker_reference)
+    tracker_reference.core_detection_and_tracking(
+        evaluation=evaluation_reference
+    )
+
+    # Run tracking with checkpoints, and interrupt it at frame 5
+    tracker_kwargs = {
+        "annotations_file": str(annotations_file_from_tracks),
+        "checkpoint_every_n_frames": 2,
+    }
+    tracker = tracking_interface_with_mock_detector(**tracker_kwargs)
+    run_tracking = tracker.run_tracking
+    n_tracked_frames = []
+
+    def _run_tracking_and_fail(prediction_dict):
+        if len(n_tracked_frames) == 5:
+            raise RuntimeError("interrupted")
+        n_tracked_frames.append(1)
+        return run_tracking(prediction_dict)
+
+    monkeypatch.setattr(tracker, "run_tracking", _run_tracking_and_fail)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        tracker.core_detection_and_tracking(
+            evaluation=_start_evaluation(tracker)
+        )
+
+    # Resume tracking in a new interface and evaluation
+    tracker_resumed = tracking_interface_with_mock_detector(
+        resume=True, **tracker_kwargs
+    )
+    evaluation_resumed = _start_evaluation(tracker_resumed)
+    tracker_resumed.core_detection_and_tracking(evaluation=evaluation_resumed)
+
+    assert tracker_resumed.start_frame_idx == 4
+    assert (
+        evaluation_resumed.online_state["results"]
+        == evaluation_reference.online_state["results"]
+    )
+
+
+def test_early_stop_without_annotations(
+    tracking_interface_with_mock_detector: Callable,
+):
+    """Test stopping early requires ground truth annotations."""
+    with pytest.raises(ValueError, match="requires --annotations_file"):
+        tracking_interface_with_mock_detector(early_stop_mota=0.5)
+
+
+@pytest.mark.parametrize("detect_every_n_frames", [1, 2])
+@pytest.mark.parametrize("save_frames", [False, True])
+def test_detection_only_and_tracking_only(
+    save_frames: bool,
+    detect_every_n_frames: int,
+    tracking_interface_with_mock_detector: Callable,
+    create_tracking_config_file: Callable,
+    tmp_path: Path,
+):
+    """Test tracking the stored detections of a detection-only run gives
+    the same output as running detection and tracking together, with any
+    frame stride of the detector.
+    """
+    # Create a mock checkpoint file to hash
+    trained_model_path = tmp_path / "model.ckpt"
+    trained_model_path.write_bytes(b"model weights")
+
+    # Create tracking config
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+    config_file = create_tracking_config_file(
+        {
+            "max_age": 10,
+            "min_hits": 1,
+            "iou_threshold": 0.1,
+            "score_threshold": 0.1,
+            "detect_every_n_frames": detect_every_n_frames,
+        },
+        config_dir,
+    )
+
+    # Run detection and tracking
+    tracker_reference = tracking_interface_with_mock_detector(
+        output_dir=str(tmp_path / "tracking_output_reference"),
+        trained_model_path=str(trained_model_path),
+        config_file=config_file,
+    )
+    tracker_reference.detect_and_track_video()
+
+    # Run detection only
+    tracker_detection = tracking_interface_with_mock_detector(
+        output_dir=str(tmp_path / "detection_output"),
+        trained_model_path=str(trained_model_path),
+        config_file=config_file,
+        detection_only=True,
+    )
+    tracker_detection.detect_and_track_video()
+    assert sum(tracker_detection.trained_model.batch_sizes) == 7
+    assert tracker_detection.detections_store_path.exists()
+    assert not Path(tracker_detection.csv_file_path).exists()
+
+    # Run tracking only, without a detector
+    tracker_tracking = tracking_interface_with_mock_detector(
+        output_dir=str(tmp_path / "tracking_output"),
+        trained_model_path=str(trained_model_path),
+        config_file=config_file,
+        tracking_only=True,
+        save_frames=save_frames,
+    )
+    del tracker_tracking.trained_model
+    tracker_tracking.detect_and_track_video()
+
+    # Check output is the same
+    assert not hasattr(tracker_tracking, "trained_model")
+    assert (
+        Path(tracker_tracking.csv_file_path).read_text()
+        == Path(tracker_reference.csv_file_path).read_text()
+    )
+    if save_frames:
+        assert len(list(Path(tracker_tracking.frames_subdir).iterdir())) == 7
+
+
+def test_checkpoint_hashed_once_per_run(
+    tracking_interface_with_mock_detector: Callable,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+):
+    """Test the trained model checkpoint is hashed once for all the
+    videos of a detection-only run.
+    """
+    trained_model_path = tmp_path / "model.ckpt"
+    trained_model_path.write_bytes(b"model weights")
+
+    hashed_paths = []
+
+    def _compute_file_hash(file_path, partial=False):
+        hashed_paths.append(file_path)
+        return compute_file_hash(file_path, partial)
+
+    monkeypatch.setattr(
+        "crabs.tracker.track_video.compute_file_hash", _compute_file_hash
+    )
+    tracker = tracking_interface_with_mock_detector(
+        trained_model_path=str(trained_model_path),
+        detection_only=True,
+    )
+    for _ in range(2):
+        tracker_video = tracker.for_video(tracker.input_video_path)
+        tracker_video.detect_and_track_video()
+        assert tracker_video.detections_store_path.exists()
+
+    assert hashed_paths == [str(trained_model_path)]
+
+
+def test_tracking_only_without_stored_detections(
+    tracking_interface_with_mock_detector: Callable,
+    tmp_path: Path,
+):
+    """Test tracking-only mode fails if there are no stored detections for
+    the trained model and video.
+    """
+    trained_model_path = tmp_path / "model.ckpt"
+    trained_model_path.write_bytes(b"model weights")
+    tracker = tracking_interface_with_mock_detector(
+        trained_model_path=str(trained_model_path),
+        tracking_only=True,
+    )
+
+    with pytest.raises(FileNotFoundError, match="--detection_only"):
+        tracker.detect_and_track_video()
+
+
+def test_detection_only_with_save_video(
+    tracking_interface_with_mock_detector: Callable,
+):
+    """Test detection-only mode does not support writing tracking output."""
+    with pytest.raises(ValueError, match="--detection_only does not support"):
+        tracking_interface_with_mock_detector(
+            detection_only=True, save_video=True
+        )
+
+
+@pytest.mark.parametrize("detection_batch_size", [1, 2])
+@pytest.mark.parametrize("detect_every_n_frames", [1, 2])
+def test_core_detection_and_tracking_frame_stride(
+    detect_every_n_frames: int,
+    detection_batch_size: int,
+    tracking_interface_with_mock_detector: Callable,
+    create_tracking_config_file: Callable,
+    tmp_path: Path,
+):
+    """Test the detector only runs every n frames, and that the tracked
+    boxes are output for all frames.
+    """
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+    tracker = tracking_interface_with_mock_detector(
+        config_file=create_tracking_config_file(
+            {
+                "max_age": 10,
+                "min_hits": 1,
+                "iou_threshold": 0.1,
+                "score_threshold": 0.1,
+                "detect_every_n_frames": detect_every_n_frames,
+            },
+            config_dir,
+        ),
+        detection_batch_size=detection_batch_size,
+    )
+    tracked_detections = tracker.core_detection_and_tracking(
+        frames_to_keep=range(7)
+    )
+
+    # Check detector only runs on every n-th frame
+    n_detected_frames = len(range(0, 7, detect_every_n_frames))
+    assert sum(tracker.trained_model.batch_sizes) == n_detected_frames
+    assert max(tracker.trained_model.batch_sizes) <= detection_batch_size
+
+    # Check the moving square is tracked in all frames with the same ID,
+    # has scores only in detected frames, and is predicted to move in
+    # skipped frames
+    assert sorted(tracked_detections.keys()) == list(range(7))
+    for frame_idx, frame_data in tracked_detections.items():
+        assert frame_data["ids"].tolist() == [1]
+        assert np.isnan(frame_data["scores"]).all() == (
+            frame_idx % detect_every_n_frames != 0
+        )
+    xmin_per_frame = [
+        tracked_detections[frame_idx]["tracked_boxes"][0, 0]
+        for frame_idx in range(7)
+    ]
+    # (the first prediction has no velocity estimate yet)
+    assert np.all(np.diff(xmin_per_frame) >= 0)
+    assert xmin_per_frame[-1] > xmin_per_frame[detect_every_n_frames]
+
+
+@pytest.mark.parametrize(
+    "inference_size_kwargs",
+    [{"inference_scale": 0.5}, {"max_inference_side": 32}],
+)
+def test_core_detection_and_tracking_reduced_inference_size(
+    inference_size_kwargs: dict,
+    tracking_interface_with_mock_detector: Callable,
+    tmp_path: Path,
+):
+    """Test the detector runs on downscaled frames, and that the tracked
+    boxes are in the coordinates of the original frames.
+    """
+    tracker_reference = tracking_interface_with_mock_detector(
+        output_dir=str(tmp_path / "tracking_output_reference"),
+    )
+    tracked_reference = tracker_reference.core_detection_and_tracking(
+        frames_to_keep=range(7)
+    )
+
+    tracker = tracking_interface_with_mock_detector(**inference_size_kwargs)
+    tracked_detections = tracker.core_detection_and_tracking(
+        frames_to_keep=range(7)
+    )
+
+    # Check the detector only sees frames at half the original size
+    assert tracker_reference.trained_model.image_sizes == {(3, 48, 64)}
+    assert tracker.trained_model.image_sizes == {(3, 24, 32)}
+
+    # Check the tracked boxes match those at full resolution, up to
+    # one pixel of the downscaled frames
+    for frame_idx, frame_data in tracked_detections.items():
+        assert frame_data["ids"].tolist() == [1]
+        assert np.allclose(
+            frame_data["tracked_boxes"],
+            tracked_reference[frame_idx]["tracked_boxes"],
+            atol=2,
+        )
+
+
+@pytest.mark.parametrize(
+    "inference_size_kwargs",
+    [
+        {"inference_scale": 0},
+        {"inference_scale": 1.5},
+        {"max_inference_side": 0},
+    ],
+)
+def test_invalid_inference_size(
+    inference_size_kwargs: dict,
+    tracking_interface_with_mock_detector: Callable,
+):
+    """Test an invalid inference resolution raises an error."""
+    with pytest.raises(ValueError, match="--inference_scale"):
+        tracking_interface_with_mock_detector(**inference_size_kwargs)
+
+
+@pytest.mark.parametrize("detection_batch_size", [0, -1])
+def test_invalid_detection_batch_size(
+    detection_batch_size: int,
+    tracking_interface_with_mock_detector: Callable,
+):
+    """Test a detection batch size below 1 raises an error."""
+    with pytest.raises(ValueError, match="--detection_batch_size"):
+        tracking_interface_with_mock_detector(
+            detection_batch_size=detection_batch_size
+        )
+
+
+@pytest.mark.parametrize(
+    "queue_size_kwargs",
+    [
+        {"decoded_frames_queue_size": 0},
+        {"detections_queue_size": 0},
+        {"detections_queue_size": -1},
+    ],
+)
+def test_invalid_queue_size(
+    queue_size_kwargs: dict,
+    tracking_interface_with_mock_detector: Callable,
+):
+    """Test a queue size below 1, which would make the queue unbounded,
+    raises an error.
+    """
+    with pytest.raises(ValueError, match="_queue_size"):
+        tracking_interface_with_mock_detector(**queue_size_kwargs)
+
+
+@pytest.mark.parametrize("detect_every_n_frames", [0, -2, 1.5])
+def test_invalid_detect_every_n_frames(
+    detect_every_n_frames: float,
+    tracking_interface_with_mock_detector: Callable,
+    create_tracking_config_file: Callable,
+    tmp_path: Path,
+):
+    """Test a frame stride of the detector that is not a positive integer
+    raises an error.
+    """
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+    config_file = create_tracking_config_file(
+        {
+            "max_age": 10,
+            "min_hits": 1,
+            "iou_threshold": 0.1,
+            "score_threshold": 0.1,
+            "detect_every_n_frames": detect_every_n_frames,
+        },
+        config_dir,
+    )
+    with pytest.raises(ValueError, match="detect_every_n_frames"):
+        tracking_interface_with_mock_detector(config_file=config_file)
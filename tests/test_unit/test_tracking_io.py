@@ -1,8 +1,23 @@
 import csv
+import os
+from pathlib import Path
 
+import cv2
 import numpy as np
+import pytest
 
-from crabs.tracker.utils.io import write_tracked_detections_to_csv
+from crabs.tracker.utils.io import (
+    TrackedDetectionsCSVWriter,
+    TrackedDetectionsNPZWriter,
+    get_via_tracks_frame_slices,
+    get_video_keyframe_indices,
+    get_video_paths,
+    read_tracks_npz,
+    read_via_tracks_csv,
+    read_video_frames,
+    write_tracked_detections_to_csv,
+)
+from crabs.tracker.utils.tracking import extract_bounding_box_info
 
 
 def test_write_tracked_detections_to_csv(tmp_path):
@@ -90,3 +105,333 @@ def test_write_tracked_detections_to_csv(tmp_path):
     # Assert the rows
     for i, expected_row in enumerate(expected_rows[1:], start=1):
         assert rows[i] == expected_row
+
+
+def test_tracked_detections_csv_writer_flush(tmp_path):
+    """Test rows are only written to disk every `flush_every_n_frames`
+    frames, and the remaining rows are written when closing the file.
+    """
+    csv_file_path = tmp_path / "test_output.csv"
+
+    def n_rows_on_disk():
+        with open(csv_file_path, newline="") as csvfile:
+            return len(list(csv.reader(csvfile)))
+
+    with TrackedDetectionsCSVWriter(
+        csv_file_path, flush_every_n_frames=2
+    ) as csv_writer:
+        # header is written on initialisation
+        assert n_rows_on_disk() == 1
+
+        for frame_idx in range(3):
+            csv_writer.write_frame(
+                frame_idx,
+                tracked_boxes=np.array([[10, 20, 30, 40]]),
+                ids=np.array([1]),
+                scores=np.array([0.9]),
+            )
+            assert n_rows_on_disk() == 1 + 2 * ((frame_idx + 1) // 2)
+
+    assert n_rows_on_disk() == 1 + 3
+
+
+def test_get_video_paths(tmp_path):
+    # Create video files and other files
+    for filename in ["b.mp4", "a.MOV", "c.avi", "notes.txt", "._a.mp4"]:
+        (tmp_path / filename).touch()
+    (tmp_path / "subdir").mkdir()
+    (tmp_path / "subdir" / "d.mp4").touch()
+
+    video_paths = get_video_paths(
+        [
+            str(tmp_path),
+            str(tmp_path / "subdir" / "*.mp4"),
+            str(tmp_path / "c.avi"),  # duplicate
+        ]
+    )
+
+    assert video_paths == [
+        str(tmp_path / "a.MOV"),
+        str(tmp_path / "b.mp4"),
+        str(tmp_path / "c.avi"),
+        str(tmp_path / "subdir" / "d.mp4"),
+    ]
+
+
+def test_get_video_paths_no_match(tmp_path):
+    with pytest.raises(ValueError, match="No video files found"):
+        get_video_paths([str(tmp_path / "*.mp4")])
+
+
+@pytest.fixture()
+def via_tracks_csv(tmp_path):
+    """Write a csv file in VIA tracks format with frames out of order."""
+    tracked_bboxes_dict = {
+        frame_idx: {
+            "tracked_boxes": np.array(
+                [[10.5, 20, 30, 40], [50, 60, 70.25, 80]]
+            )
+            + frame_idx,
+            "ids": np.array([1, 2]) + frame_idx,
+            "scores": np.array([0.9, 0.8]),
+        }
+        for frame_idx in [3, 0, 7]
+    }
+    csv_file_path = tmp_path / "tracks.csv"
+    write_tracked_detections_to_csv(csv_file_path, tracked_bboxes_dict)
+    return csv_file_path
+
+
+@pytest.mark.parametrize(
+    "csv_file",
+    ["via_tracks_csv", Path(__file__).parents[1] / "data" / "gt_test.csv"],
+)
+def test_read_via_tracks_csv(csv_file, request):
+    """Test the columnar arrays match the rows parsed one by one, sorted
+    by frame number.
+    """
+    if isinstance(csv_file, str):
+        csv_file = request.getfixturevalue(csv_file)
+    with open(csv_file, newline="") as csvfile:
+        csv_reader = csv.reader(csvfile)
+        next(csv_reader)
+        rows = [extract_bounding_box_info(row) for row in csv_reader]
+    rows = sorted(rows, key=lambda row: row["frame_number"])
+
+    via_tracks = read_via_tracks_csv(csv_file)
+
+    assert np.array_equal(
+        via_tracks["frame"], [row["frame_number"] for row in rows]
+    )
+    for column, key in [
+        ("x", "x"),
+        ("y", "y"),
+        ("w", "width"),
+        ("h", "height"),
+    ]:
+        assert np.array_equal(via_tracks[column], [row[key] for row in rows])
+    assert np.array_equal(via_tracks["id"], [float(row["id"]) for row in rows])
+    assert np.array_equal(
+        via_tracks["confidence"],
+        [float(row.get("confidence", np.nan)) for row in rows],
+        equal_nan=True,
+    )
+
+    # check the index of rows per frame
+    frame_slices = get_via_tracks_frame_slices(via_tracks)
+    assert list(frame_slices) == sorted({row["frame_number"] for row in rows})
+    for frame_number, frame_rows in frame_slices.items():
+        assert np.all(via_tracks["frame"][frame_rows] == frame_number)
+    assert sum(len(via_tracks["frame"][s]) for s in frame_slices.values()) == (
+        len(rows)
+    )
+
+
+def test_read_via_tracks_csv_cache(via_tracks_csv):
+    """Test the cache is written on the first read, used on later reads,
+    and ignored if the csv file changes.
+    """
+    cache_path = via_tracks_csv.with_name("tracks.csv.cache.npz")
+    via_tracks = read_via_tracks_csv(via_tracks_csv)
+    assert not cache_path.exists()
+
+    # first read writes the cache, second read uses it
+    read_via_tracks_csv(via_tracks_csv, use_cache=True)
+    assert cache_path.exists()
+    cached_via_tracks = read_via_tracks_csv(via_tracks_csv, use_cache=True)
+    assert cached_via_tracks.keys() == via_tracks.keys()
+    for key in via_tracks:
+        assert np.array_equal(
+            cached_via_tracks[key], via_tracks[key], equal_nan=True
+        )
+
+    # a modified csv file is parsed again
+    write_tracked_detections_to_csv(
+        via_tracks_csv,
+        {
+            5: {
+                "tracked_boxes": np.array([[1, 2, 3, 4]]),
+                "ids": np.array([9]),
+                "scores": np.array([0.5]),
+            }
+        },
+    )
+    stat = via_tracks_csv.stat()
+    os.utime(via_tracks_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert np.array_equal(
+        read_via_tracks_csv(via_tracks_csv, use_cache=True)["frame"], [5]
+    )
+
+
+def test_tracked_detections_npz_writer(tmp_path):
+    """Test the npz file has the same tracked detections as the csv file,
+    with an entry in the index for frames without tracked detections.
+    """
+    tracked_bboxes_dict = {
+        0: {
+            "tracked_boxes": np.array([[10, 20, 30, 40], [50, 60, 70, 80]]),
+            "ids": np.array([1, 2]),
+            "scores": np.array([0.5, 0.25]),
+        },
+        1: {
+            "tracked_boxes": np.empty((0, 4)),
+            "ids": np.empty(0),
+            "scores": np.empty(0),
+        },
+        2: {
+            "tracked_boxes": np.array([[15, 25, 35, 45]]),
+            "ids": np.array([1]),
+            "scores": np.array([0.75]),
+        },
+    }
+    csv_file_path = tmp_path / "tracks.csv"
+    npz_file_path = tmp_path / "tracks.npz"
+    write_tracked_detections_to_csv(csv_file_path, tracked_bboxes_dict)
+    with TrackedDetectionsNPZWriter(str(npz_file_path)) as npz_writer:
+        for frame_idx, frame_data in tracked_bboxes_dict.items():
+            npz_writer.write_frame(frame_idx, **frame_data)
+
+    via_tracks = read_via_tracks_csv(csv_file_path)
+    npz_tracks = read_tracks_npz(npz_file_path)
+
+    for column in ["frame", "id", "x", "y", "w", "h", "confidence"]:
+        assert np.array_equal(npz_tracks[column], via_tracks[column])
+    assert np.array_equal(npz_tracks["frame_numbers"], [0, 1, 2])
+    assert np.array_equal(npz_tracks["frame_offsets"], [0, 2, 2, 3])
+    assert get_via_tracks_frame_slices(npz_tracks)[1] == slice(2, 2)
+
+
+def test_tracked_detections_npz_writer_resume(tmp_path):
+    """Test resuming keeps only the frames saved before the returned
+    position, and frames must be added in order.
+    """
+    npz_file_path = tmp_path / "tracks.npz"
+    frame_data = {
+        "tracked_boxes": np.array([[10, 20, 30, 40]]),
+        "ids": np.array([1]),
+        "scores": np.array([0.9]),
+    }
+    npz_writer = TrackedDetectionsNPZWriter(str(npz_file_path))
+    npz_writer.write_frame(0, **frame_data)
+    assert npz_writer.tell() == 1
+    npz_writer.write_frame(1, **frame_data)
+    npz_writer.close()
+    assert len(read_tracks_npz(npz_file_path)["frame_numbers"]) == 2
+
+    npz_writer = TrackedDetectionsNPZWriter(
+        str(npz_file_path), resume_n_frames=1
+    )
+    with pytest.raises(ValueError, match="Expected .* frame 1, got frame 2"):
+        npz_writer.write_frame(2, **frame_data)
+    npz_writer.write_frame(1, **{**frame_data, "ids": np.array([5])})
+    npz_writer.close()
+
+    npz_tracks = read_tracks_npz(npz_file_path)
+    assert np.array_equal(npz_tracks["frame"], [0, 1])
+    assert np.array_equal(npz_tracks["id"], [1, 5])
+
+
+def test_tracked_detections_npz_writer_one_score_per_box(tmp_path):
+    """Test the tracked detections of a frame are rejected if there is not
+    one track ID and score per tracked box.
+    """
+    npz_writer = TrackedDetectionsNPZWriter(str(tmp_path / "tracks.npz"))
+    with pytest.raises(ValueError, match="got 1 boxes, 1 IDs and 2 scores"):
+        npz_writer.write_frame(
+            0,
+            tracked_boxes=np.array([[10, 20, 30, 40]]),
+            ids=np.array([1]),
+            scores=np.array([0.9, 0.1]),
+        )
+
+
+class SeekCountingVideoCapture:
+    """Wrap a video capture to count how many times its position is set."""
+
+    def __init__(self, video_path: str):
+        """Open the video."""
+        self.video_object = cv2.VideoCapture(video_path)
+        self.n_seeks = 0
+
+    def __getattr__(self, name):
+        """Get the other attributes from the wrapped video capture."""
+        return getattr(self.video_object, name)
+
+    def set(self, prop_id, value):
+        """Set a property, counting the changes of position."""
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            self.n_seeks += 1
+        return self.video_object.set(prop_id, value)
+
+
+@pytest.fixture()
+def indexed_video(tmp_path):
+    """Write a video whose frames are uniform images with intensity
+    frame index % 64 * 4, so that the index of a decoded frame can be
+    checked.
+    """
+    video_path = tmp_path / "indexed.avi"
+    writer = cv2.VideoWriter(
+        str(video_path), cv2.VideoWriter_fourcc(*"MJPG"), 25, (32, 32)
+    )
+    for frame_idx in range(300):
+        writer.write(np.full((32, 32, 3), frame_idx % 64 * 4, dtype=np.uint8))
+    writer.release()
+    return video_path
+
+
+@pytest.mark.parametrize(
+    "frame_indices, keyframe_indices, expected_n_seeks",
+    [
+        # without keyframes, seek to skip more than MAX_GRAB_GAP frames
+        ([2, 5, 5, 30, 31], None, 0),
+        ([0, 280], None, 1),
+        # with keyframes, seek to skip to a later keyframe
+        ([2, 5, 5, 30, 31], np.arange(0, 300, 10), 1),
+        ([2, 9, 12], np.arange(0, 300, 10), 0),
+        ([0, 280], np.array([0]), 0),
+        # going back always requires seeking
+        ([10, 20, 3], None, 1),
+    ],
+)
+def test_read_video_frames(
+    indexed_video, frame_indices, keyframe_indices, expected_n_seeks
+):
+    """Test the selected frames are read, seeking only to go back or to
+    skip to a later keyframe.
+    """
+    video_object = SeekCountingVideoCapture(str(indexed_video))
+
+    frames = list(
+        read_video_frames(video_object, frame_indices, keyframe_indices)
+    )
+    video_object.release()
+
+    assert [frame_idx for frame_idx, _ in frames] == frame_indices
+    for frame_idx, frame in frames:
+        assert abs(frame.mean() - frame_idx % 64 * 4) < 2
+    assert video_object.n_seeks == expected_n_seeks
+
+
+def test_read_video_frames_past_the_end(indexed_video):
+    """Test reading stops at the first frame that cannot be read."""
+    video_object = cv2.VideoCapture(str(indexed_video))
+
+    frames = list(read_video_frames(video_object, [298, 299, 300, 301]))
+    video_object.release()
+
+    assert [frame_idx for frame_idx, _ in frames] == [298, 299, 300]
+    assert frames[-1][1] is None
+
+
+def test_get_video_keyframe_indices(indexed_video, tmp_path):
+    """Test the keyframes of a video are found, and that None is returned
+    for a file that is not a video.
+    """
+    # all frames of a Motion JPEG video are keyframes
+    keyframe_indices = get_video_keyframe_indices(str(indexed_video))
+    assert np.array_equal(keyframe_indices, np.arange(300))
+
+    not_a_video = tmp_path / "not_a_video.mp4"
+    not_a_video.write_text("not a video")
+    assert get_video_keyframe_indices(str(not_a_video)) is None
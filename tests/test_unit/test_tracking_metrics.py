@@ -0,0 +1,116 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from crabs.tracker.utils.tracking_metrics import SparseCounter, TrackingMetrics
+
+
+@pytest.mark.parametrize("max_buffer_size", [1, 5, 1000])
+def test_sparse_counter(max_buffer_size: int):
+    """Test the counts do not depend on how often rows are merged."""
+    rng = np.random.default_rng(42)
+    rows = rng.integers(0, 4, size=(60, 2))
+
+    counter = SparseCounter(2, max_buffer_size)
+    for chunk in np.array_split(rows, 7):
+        counter.add(chunk)
+        assert counter.n_buffered <= max(max_buffer_size, len(chunk))
+    keys, counts = counter.get_counts()
+
+    expected_keys, expected_counts = np.unique(
+        rows, axis=0, return_counts=True
+    )
+    assert np.array_equal(keys, expected_keys)
+    assert np.array_equal(counts, expected_counts)
+
+
+def test_tracking_metrics_perfect():
+    """Test all metrics are 1 if the tracks match the ground truth."""
+    metrics = TrackingMetrics(iou_threshold=0.5)
+    for _ in range(5):
+        metrics.update(
+            np.array([1, 2]),
+            np.array([10, 20]),
+            np.eye(2),
+            np.array([[0, 0], [1, 1]]),
+        )
+
+    assert metrics.compute() == {
+        "MOTP": 1.0,
+        "IDF1": 1.0,
+        "IDP": 1.0,
+        "IDR": 1.0,
+        "HOTA": 1.0,
+        "DetA": 1.0,
+        "AssA": 1.0,
+    }
+
+
+def test_tracking_metrics_id_swap():
+    """Test the metrics of two tracks whose IDs swap halfway."""
+    metrics = TrackingMetrics(iou_threshold=0.5)
+    for frame_idx in range(4):
+        pred_ids = np.array([10, 20]) if frame_idx < 2 else np.array([20, 10])
+        metrics.update(
+            np.array([1, 2]),
+            pred_ids,
+            0.75 * np.eye(2),
+            np.array([[0, 0], [1, 1]]),
+        )
+
+    results = metrics.compute()
+
+    assert results["MOTP"] == 0.75
+    assert results["IDF1"] == results["IDP"] == results["IDR"] == 0.5
+    # each pair of IDs is matched in 2 of the 4 frames of each ID, in the
+    # 15 thresholds below 0.75
+    assert results["DetA"] == pytest.approx(15 / 19)
+    assert results["AssA"] == pytest.approx(15 / 19 * 2 / (4 + 4 - 2))
+    assert results["HOTA"] == pytest.approx(15 / 19 * np.sqrt(1 / 3))
+
+
+def test_tracking_metrics_idf1_brute_force():
+    """Test the IDF1 matches the best mapping of IDs found by brute
+    force.
+    """
+    rng = np.random.default_rng(42)
+    gt_ids, pred_ids = np.arange(4), np.arange(4) + 10
+    metrics = TrackingMetrics(iou_threshold=0.5, max_buffer_size=3)
+    frames = []
+    for _ in range(30):
+        gt_present = gt_ids[rng.uniform(size=4) > 0.2]
+        pred_present = rng.permutation(pred_ids)[: rng.integers(1, 5)]
+        iou_matrix = rng.uniform(size=(len(gt_present), len(pred_present))) * (
+            rng.uniform(size=(len(gt_present), len(pred_present))) > 0.5
+        )
+        metrics.update(gt_present, pred_present, iou_matrix)
+        frames.append((gt_present, pred_present, iou_matrix))
+
+    def count_id_true_positives(mapping: dict) -> int:
+        return sum(
+            int(iou_matrix[i, j] > 0.5)
+            for gt, pred, iou_matrix in frames
+            for i, g in enumerate(gt)
+            for j, p in enumerate(pred)
+            if mapping[g] == p
+        )
+
+    best_id_true_positives = max(
+        count_id_true_positives(dict(zip(gt_ids, perm)))
+        for perm in itertools.permutations(pred_ids)
+    )
+    n_gt = sum(len(gt) for gt, _, _ in frames)
+    n_pred = sum(len(pred) for _, pred, _ in frames)
+
+    assert metrics.compute()["IDF1"] == pytest.approx(
+        2 * best_id_true_positives / (n_gt + n_pred)
+    )
+
+
+def test_tracking_metrics_empty():
+    """Test the metrics are NaN if there are no boxes."""
+    metrics = TrackingMetrics(iou_threshold=0.5)
+    metrics.update(np.array([]), np.array([]), np.zeros((0, 0)))
+
+    assert all(np.isnan(value) for value in metrics.compute().values())
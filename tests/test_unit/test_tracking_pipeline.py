@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from crabs.tracker.utils.pipeline import (
+    PipelineStage,
+    PipelineStopped,
+    StageTimer,
+    get_from_queue,
+    put_in_queue,
+)
+
+
+def test_stage_timer():
+    timer = StageTimer("stage")
+
+    with timer.busy():
+        time.sleep(0.02)
+    with timer.waiting():
+        time.sleep(0.01)
+
+    assert timer.busy_time >= 0.02
+    assert 0.01 <= timer.waiting_time < timer.busy_time
+
+
+def test_put_and_get_from_queue():
+    bounded_queue: queue.Queue = queue.Queue(maxsize=1)
+    timer = StageTimer("stage")
+    stop_event = threading.Event()
+
+    put_in_queue(bounded_queue, "item", timer, stop_event)
+    assert get_from_queue(bounded_queue, timer, stop_event) == "item"
+
+
+@pytest.mark.parametrize("queue_operation", ["put", "get"])
+def test_queue_operation_raises_if_stopped(queue_operation):
+    """Test a stage blocked on a full or empty queue stops waiting
+    if the pipeline is stopped.
+    """
+    bounded_queue: queue.Queue = queue.Queue(maxsize=1)
+    timer = StageTimer("stage")
+    stop_event = threading.Event()
+    stop_event.set()
+
+    with pytest.raises(PipelineStopped):
+        if queue_operation == "put":
+            bounded_queue.put("item")  # fill queue
+            put_in_queue(bounded_queue, "item", timer, stop_event)
+        else:
+            get_from_queue(bounded_queue, timer, stop_event)
+    assert timer.waiting_time > 0
+
+
+def test_pipeline_stage_exception():
+    """Test an exception in a stage stops the pipeline and is re-raised
+    when joining the stage.
+    """
+    stop_event = threading.Event()
+
+    def _failing_target():
+        raise ValueError("stage failed")
+
+    stage = PipelineStage("stage", _failing_target, stop_event)
+    stage.start()
+
+    with pytest.raises(ValueError, match="stage failed"):
+        stage.join_and_raise()
+    assert stop_event.is_set()
+
+
+def test_pipeline_stage_stopped():
+    """Test a stage that stops because of another stage does not raise."""
+    stop_event = threading.Event()
+
+    def _stopped_target():
+        raise PipelineStopped()
+
+    stage = PipelineStage("stage", _stopped_target, stop_event)
+    stage.start()
+
+    stage.join_and_raise()
+    assert stage.exception is None
@@ -2,8 +2,10 @@ import pytest
 import torch
 
 from crabs.tracker.utils.tracking import (
+    compute_inference_frame_size,
     extract_bounding_box_info,
     format_and_filter_bbox_predictions_for_sort,
+    rescale_detections_to_frame_size,
 )
 
 
@@ -79,3 +81,54 @@ def test_format_bbox_predictions_for_sort(score_threshold, expected_output):
         torch.testing.assert_close(result, expected_output),
         f"Expected {expected_output}, but got {result}",
     )
+
+
+@pytest.mark.parametrize(
+    "inference_scale, max_inference_side, expected_size",
+    [
+        (1.0, None, None),
+        (0.5, None, (2048, 1080)),
+        (0.3, None, (1229, 648)),
+        (1.0, 1024, (1024, 540)),
+        (1.0, 8192, None),  # frames are never upscaled
+    ],
+)
+def test_compute_inference_frame_size(
+    inference_scale, max_inference_side, expected_size
+):
+    assert (
+        compute_inference_frame_size(
+            (4096, 2160), inference_scale, max_inference_side
+        )
+        == expected_size
+    )
+
+
+def test_rescale_detections_to_frame_size():
+    detections_dict = {
+        "boxes": torch.tensor([[0.0, 0.0, 1229.0, 648.0], [10, 20, 30, 40]]),
+        "scores": torch.tensor([0.9, 0.8]),
+        "labels": torch.tensor([1, 1]),
+    }
+
+    rescaled = rescale_detections_to_frame_size(
+        detections_dict, (1229, 648), (4096, 2160)
+    )
+
+    # the full inference frame maps exactly to the full original frame
+    assert torch.equal(
+        rescaled["boxes"][0], torch.tensor([0.0, 0.0, 4096.0, 2160.0])
+    )
+    assert torch.allclose(
+        rescaled["boxes"][1],
+        torch.tensor(
+            [
+                10 * 4096 / 1229,
+                20 * 2160 / 648,
+                30 * 4096 / 1229,
+                40 * 2160 / 648,
+            ]
+        ),
+    )
+    assert rescaled["scores"] is detections_dict["scores"]
+    assert rescaled["labels"] is detections_dict["labels"]